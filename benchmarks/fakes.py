@@ -0,0 +1,199 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator, Optional
+from urllib.parse import parse_qs
+
+import httpx
+
+from core.pipeline import LISTING_PAGE_SIZE
+
+# kinds of links the fake posts have, and what share of the posts have each one
+LINK_KINDS = {
+    "imgur_album": 0.3,
+    "imgur_image": 0.2,
+    "flickr": 0.1,
+    "direct": 0.3,
+    "unsupported": 0.1,
+}
+
+
+@dataclass
+class ServiceConfig:
+    """
+    How the fake services behave
+    :param latency: seconds each response takes to start
+    :param bandwidth: bytes per second each image is sent at, or None for no limit
+    :param error_rate: share of requests that fail with a 503
+    :param image_size: number of bytes in each image
+    :param album_size: number of images in each imgur album
+    :param imgur_quota: number of requests imgur reports as left when the run starts
+    :param page_latency: seconds each page of a listing takes to fetch
+    :param seed: seed for the random errors and link kinds, so runs can be repeated
+    """
+
+    latency: float = 0.05
+    bandwidth: Optional[float] = None
+    error_rate: float = 0.0
+    image_size: int = 16 * 1024
+    album_size: int = 3
+    imgur_quota: int = 12500
+    page_latency: float = 0.2
+    seed: int = 0
+
+
+class _ThrottledStream(httpx.AsyncByteStream):
+    """An image body that's sent no faster than the given bandwidth"""
+
+    CHUNK_SIZE = 16 * 1024
+
+    def __init__(self, size: int, bandwidth: Optional[float]):
+        self.size = size
+        self.bandwidth = bandwidth
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for start in range(0, self.size, self.CHUNK_SIZE):
+            chunk = b"\0" * min(self.CHUNK_SIZE, self.size - start)
+            if self.bandwidth:
+                await asyncio.sleep(len(chunk) / self.bandwidth)
+            yield chunk
+
+
+class FakeServices:
+    """
+    An httpx.MockTransport handler that stands in for imgur's API, flickr's API, and the
+    hosts that serve images
+    """
+
+    def __init__(self, config: ServiceConfig = ServiceConfig()):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.imgur_remaining = config.imgur_quota
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.config.latency)
+        if self.random.random() < self.config.error_rate:
+            return httpx.Response(503)
+        if request.url.host == "api.imgur.com":
+            return self._imgur(request)
+        if request.url.host == "www.flickr.com":
+            return self._flickr(request)
+        return self._image(request)
+
+    def _imgur(self, request: httpx.Request) -> httpx.Response:
+        self.imgur_remaining = max(self.imgur_remaining - 1, 0)
+        headers = {
+            "X-RateLimit-ClientRemaining": str(self.imgur_remaining),
+            "X-RateLimit-UserRemaining": str(self.imgur_remaining),
+            "X-RateLimit-UserReset": str(int(time.time()) + 3600),
+        }
+        endpoint, _, link_id = request.url.path.removeprefix("/3/").partition("/")
+        if endpoint == "album":
+            data = {
+                "images": [
+                    {"link": f"https://i.imgur.com/{link_id}{i}.jpg"}
+                    for i in range(self.config.album_size)
+                ]
+            }
+        else:
+            data = {"link": f"https://i.imgur.com/{link_id}.jpg"}
+        return httpx.Response(200, json={"data": data}, headers=headers)
+
+    def _flickr(self, request: httpx.Request) -> httpx.Response:
+        photo_id = parse_qs(request.url.query.decode())["photo_id"][0]
+        sizes = [
+            {
+                "width": width,
+                "height": width * 2 // 3,
+                "source": f"https://live.staticflickr.com/{photo_id}_{width}.jpg",
+            }
+            for width in (240, 1024, 2048)
+        ]
+        return httpx.Response(
+            200, json={"sizes": {"candownload": 1, "size": sizes}, "stat": "ok"}
+        )
+
+    def _image(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith(".html"):
+            return httpx.Response(200, headers={"Content-Type": "text/html"})
+        headers = {
+            "Content-Type": "image/jpeg",
+            "Content-Length": str(self.config.image_size),
+        }
+        if request.method == "HEAD":
+            return httpx.Response(200, headers=headers)
+        return httpx.Response(
+            200,
+            headers=headers,
+            stream=_ThrottledStream(self.config.image_size, self.config.bandwidth),
+        )
+
+
+class FakeReddit:
+    """Stands in for the praw Reddit instance that submissions are unsaved through"""
+
+    def post(self, path: str, data: Optional[dict] = None) -> None:
+        pass
+
+
+class FakeSubmission:
+    """Has the attributes of a praw Submission that PaperScraper uses"""
+
+    _reddit = FakeReddit()
+
+    def __init__(self, index: int, url: str):
+        self.id = f"{index:x}"
+        self.fullname = "t3_" + self.id
+        self.title = f"Post {index}"
+        self.subreddit = "fakesubreddit"
+        self.url = url
+        self.author = "fakeuser"
+        self.over_18 = False
+        self.score = 1
+        self.created_utc = 0.0
+
+
+class FakeListing:
+    """
+    Stands in for a redditor's saved posts or a subreddit's posts. Each page of
+    posts blocks for a while, like a request to reddit does
+    """
+
+    def __init__(self, posts: int, config: ServiceConfig = ServiceConfig()):
+        self.posts = posts
+        self.config = config
+
+    def _url(self, index: int, kind: str) -> str:
+        if kind == "imgur_album":
+            return f"https://imgur.com/a/album{index}"
+        if kind == "imgur_image":
+            return f"https://imgur.com/image{index}"
+        if kind == "flickr":
+            return f"https://www.flickr.com/photos/fakeuser/{index}/"
+        if kind == "direct":
+            return f"https://i.redd.it/image{index}.jpg"
+        return f"https://example.com/page{index}.html"
+
+    def __iter__(self) -> Iterator[FakeSubmission]:
+        kinds = random.Random(self.config.seed).choices(
+            list(LINK_KINDS), weights=list(LINK_KINDS.values()), k=self.posts
+        )
+        for index, kind in enumerate(kinds):
+            if index % LISTING_PAGE_SIZE == 0:
+                time.sleep(self.config.page_latency)
+            yield FakeSubmission(index, self._url(index, kind))
+
+    # used by from_saved
+    def saved(self, limit=None, **kwargs) -> "FakeListing":
+        return self
+
+    # used by from_subreddit
+    def subreddit(self, name: str) -> "FakeListing":
+        return self
+
+    @staticmethod
+    def sort_by(subreddit: "FakeListing", **kwargs) -> "FakeListing":
+        return subreddit
@@ -0,0 +1,251 @@
+"""
+Measures how fast PaperScraper gets through a large number of posts, without touching
+the network: reddit, imgur, flickr and image hosts are all replaced by local fakes.
+
+    python -m benchmarks.load_test --posts 10000 --latency 0.05 --bandwidth 1000000
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict
+
+# the parsers read their credentials when they're imported
+os.environ.setdefault("IMGUR_CLIENT_ID", "fake imgur client id")
+os.environ.setdefault("flickr_client_id", "fake flickr api key")
+
+import httpx  # noqa: E402
+
+from benchmarks.fakes import FakeListing, FakeServices, ServiceConfig  # noqa: E402
+from core import parsers  # noqa: E402
+from core.governor import Governor  # noqa: E402
+from core.metrics import Metrics, Recorder  # noqa: E402
+from core.pipeline import Pipeline, Stage  # noqa: E402
+from core.reddit import SubmissionWrapper, from_saved, from_subreddit  # noqa: E402
+from core.retry import Backoff, Retrier  # noqa: E402
+from core.scheduler import DEFAULT_HOST_LIMIT, DEFAULT_LIMIT, Scheduler  # noqa: E402
+
+
+def peak_rss() -> int:
+    """
+    :return: the most memory this process has used at once, in bytes. This never goes
+    down, so it only measures one run if that run has the process to itself
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def run(
+    posts: int,
+    config: ServiceConfig = ServiceConfig(),
+    source: str = "saved",
+    connections: int = DEFAULT_LIMIT,
+    host_connections: int = DEFAULT_HOST_LIMIT,
+    downloaders: int = 64,
+    rate_limits: bool = False,
+    attempts: int = Backoff.attempts,
+) -> Dict:
+    """
+    Resolves and downloads the given number of fake posts
+    :param config: how the fake services behave
+    :param source: "saved" to go through from_saved, "subreddit" to go through
+    from_subreddit
+    :param rate_limits: True to pace API requests with the real rate limits
+    :return: how long each step took, how much it got through, and how much memory
+    was used
+    """
+    metrics = Metrics()
+    services = FakeServices(config)
+    listing = FakeListing(posts, config)
+    transport: httpx.AsyncBaseTransport = Scheduler(
+        Recorder(httpx.MockTransport(services), metrics),
+        limit=connections,
+        host_limit=host_connections,
+        host_limits=parsers.HOST_LIMITS,
+    )
+    if rate_limits:
+        transport = Governor(transport, parsers.RATE_LIMITS)
+    transport = Retrier(transport, Backoff(attempts=attempts, base=config.latency))
+
+    with tempfile.TemporaryDirectory() as directory:
+        async with httpx.AsyncClient(transport=transport) as client:
+            start = time.perf_counter()
+            if source == "saved":
+                wrapped = await from_saved(listing, client, amount=posts)
+            else:
+                wrapped = await from_subreddit(
+                    listing,
+                    "r/fakesubreddit",
+                    FakeListing.sort_by,
+                    client,
+                    amount=posts,
+                )
+            resolved = time.perf_counter()
+
+            async def download(post: SubmissionWrapper) -> Dict:
+                return await post.download_all(
+                    directory, client, backoff=Backoff(attempts, base=config.latency)
+                )
+
+            downloads = await Pipeline(
+                Stage(download, workers=downloaders, name="download"), metrics=metrics
+            ).run(wrapped)
+            finished = time.perf_counter()
+
+    files = sum(path is not None for result in downloads for path in result.values())
+    received = sum(metrics.counters.get("response_bytes_total", dict()).values())
+    return {
+        "posts": posts,
+        "resolved_posts": len(wrapped),
+        "files": files,
+        "requests": services.requests,
+        "bytes": received,
+        "resolve_seconds": resolved - start,
+        "download_seconds": finished - resolved,
+        "seconds": finished - start,
+        "posts_per_second": posts / (finished - start),
+        "bytes_per_second": received / (finished - start),
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def _run_sync(posts: int, config: ServiceConfig, **kwargs) -> Dict:
+    return asyncio.run(run(posts, config, **kwargs))
+
+
+def run_in_process(
+    posts: int, config: ServiceConfig = ServiceConfig(), **kwargs
+) -> Dict:
+    """
+    Runs the benchmark in a fresh process, so its peak memory use isn't that of an
+    earlier run. Takes the same arguments as run
+    """
+    # spawned rather than forked, so the process doesn't start with this one's memory
+    with concurrent.futures.ProcessPoolExecutor(
+        1, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        return pool.submit(_run_sync, posts, config, **kwargs).result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks PaperScraper against local fake services"
+    )
+    parser.add_argument(
+        "--posts",
+        type=int,
+        nargs="+",
+        default=[1000],
+        help="number of posts to run through; give several to run several times",
+    )
+    parser.add_argument(
+        "--source",
+        choices=["saved", "subreddit"],
+        default="saved",
+        help="listing to use",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=ServiceConfig.latency,
+        help="seconds per response",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        default=ServiceConfig.bandwidth,
+        help="bytes per second each image is sent at (default: unlimited)",
+    )
+    parser.add_argument(
+        "--errorrate",
+        type=float,
+        default=ServiceConfig.error_rate,
+        help="share of requests that fail with a 503",
+    )
+    parser.add_argument(
+        "--imagesize",
+        type=int,
+        default=ServiceConfig.image_size,
+        help="bytes per image",
+    )
+    parser.add_argument(
+        "--albumsize",
+        type=int,
+        default=ServiceConfig.album_size,
+        help="images per imgur album",
+    )
+    parser.add_argument(
+        "--imgurquota",
+        type=int,
+        default=ServiceConfig.imgur_quota,
+        help="requests imgur reports as left at the start",
+    )
+    parser.add_argument(
+        "--pagelatency",
+        type=float,
+        default=ServiceConfig.page_latency,
+        help="seconds each page of the listing takes",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=DEFAULT_LIMIT,
+        help="max number of requests to make at once",
+    )
+    parser.add_argument(
+        "--hostconnections",
+        type=int,
+        default=DEFAULT_HOST_LIMIT,
+        help="max number of requests to make to any one host at once",
+    )
+    parser.add_argument(
+        "--downloaders",
+        type=int,
+        default=64,
+        help="max number of posts to download at once",
+    )
+    parser.add_argument(
+        "--ratelimits",
+        action="store_true",
+        help="pace API requests with imgur's and flickr's real rate limits",
+    )
+    parser.add_argument(
+        "--attempts",
+        type=int,
+        default=Backoff.attempts,
+        help="max number of times to try each request",
+    )
+    parser.add_argument("--seed", type=int, default=ServiceConfig.seed)
+    args = parser.parse_args()
+
+    service_config = ServiceConfig(
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.errorrate,
+        image_size=args.imagesize,
+        album_size=args.albumsize,
+        imgur_quota=args.imgurquota,
+        page_latency=args.pagelatency,
+        seed=args.seed,
+    )
+    for post_count in args.posts:
+        # each run gets its own process, so each one's peak memory use is its own
+        report = run_in_process(
+            post_count,
+            service_config,
+            source=args.source,
+            connections=args.connections,
+            host_connections=args.hostconnections,
+            downloaders=args.downloaders,
+            rate_limits=args.ratelimits,
+            attempts=args.attempts,
+        )
+        print(json.dumps(report))
@@ -1,2 +1,12 @@
+from .cache import Cache
 from .core import get_extension, retitle
-from .reddit import SortOption, SubmissionWrapper, from_saved, from_subreddit, sign_in
+from .reddit import (
+    SortOption,
+    SubmissionWrapper,
+    from_saved,
+    from_subreddit,
+    iter_saved,
+    iter_subreddit,
+    sign_in,
+)
+from .scheduler import Scheduler
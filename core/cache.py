@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+DEFAULT_TTL = timedelta(days=30)
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+class Cache:
+    """
+    A persistent key-value store backed by a single SQLite file. Values must be JSON
+    serializable, and expire once they're older than the cache's time-to-live
+    """
+
+    def __init__(
+        self,
+        path: str,
+        table: str = "cache",
+        ttl: timedelta = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        """
+        :param path: path to the SQLite file to store entries in
+        :param table: name of the table to store entries in, so that several caches can
+        share one file
+        :param ttl: how long entries are kept for before they expire
+        :param max_entries: number of entries to keep when the cache is evicted
+        """
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name {table!r}")
+        if max_entries < 1:
+            raise ValueError("max_entries must be a positive integer")
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, "
+            "value TEXT NOT NULL, "
+            "stored REAL NOT NULL, "
+            "expires REAL NOT NULL, "
+            "accessed REAL NOT NULL)"
+        )
+        self._connection.commit()
+        # when entries were last read, kept in memory until the next write so reading
+        #  doesn't have to wait for the disk
+        self._accessed: Dict[str, float] = dict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        :return: the value stored under the given key, or None if there is no
+        value or it has expired
+        """
+        now = time.time()
+        row = self._connection.execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND expires > ?",
+            (key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        self._accessed[key] = now
+        return json.loads(row[0])
+
+    def _flush_accessed(self) -> None:
+        """Writes when entries were last read; committed by the caller"""
+        if self._accessed:
+            self._connection.executemany(
+                f"UPDATE {self.table} SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def set(self, key: str, value: Any, ttl: Optional[timedelta] = None) -> None:
+        """
+        Stores the given value under the given key, replacing any existing value
+        :param ttl: how long this entry is kept for, if it differs from the cache's ttl
+        """
+        now = time.time()
+        expires = now + (ttl or self.ttl).total_seconds()
+        self._accessed.pop(key, None)
+        self._flush_accessed()
+        self._connection.execute(
+            f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps(value), now, expires, now),
+        )
+        self._connection.commit()
+
+    def evict(self) -> None:
+        """
+        Removes all expired entries, then the least recently used entries until at
+        most max_entries remain
+        """
+        self._flush_accessed()
+        self._connection.execute(
+            f"DELETE FROM {self.table} WHERE expires <= ?", (time.time(),)
+        )
+        self._connection.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f"SELECT key FROM {self.table} ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._connection.commit()
+
+    def __len__(self) -> int:
+        return self._connection.execute(
+            f"SELECT COUNT(*) FROM {self.table}"
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        """Evicts old entries and closes the underlying file"""
+        self.evict()
+        self._connection.close()
+
+    def __enter__(self) -> "Cache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
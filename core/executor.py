@@ -0,0 +1,79 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+
+class CPUExecutor:
+    """
+    Runs CPU-bound jobs (like hashing a downloaded file) in a pool of worker processes,
+    so they don't hold up the event loop while it's handling downloads. With no
+    workers, or if the pool can't be started or breaks, jobs run serially in the calling
+    thread instead. Jobs and their arguments must be picklable, so jobs have to be
+    module-level functions
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        """
+        :param workers: number of worker processes. None for one per CPU, or 0 to run
+        every job serially
+        """
+        if workers is not None and workers < 0:
+            raise ValueError("Workers can't be negative")
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+    @property
+    def parallel(self) -> bool:
+        """True if jobs run in worker processes, False if they run serially"""
+        return self.workers > 0
+
+    def _get_pool(self) -> Optional[concurrent.futures.ProcessPoolExecutor]:
+        if self._pool is None and self.parallel:
+            try:
+                # the pool's only started once there's work for it, by which point
+                #  other threads are running, and forking a process with threads can
+                #  deadlock it, so workers are spawned instead
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            except (OSError, NotImplementedError):
+                # e.g. the platform can't start processes
+                self.workers = 0
+        return self._pool
+
+    async def run(self, function: Callable, *arguments: Any) -> Any:
+        """
+        Runs a single job
+        :return: whatever the job returns
+        """
+        if (pool := self._get_pool()) is None:
+            return function(*arguments)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, function, *arguments
+            )
+        except BrokenProcessPool:
+            # a worker died (e.g. it was killed for using too much memory), so stop
+            #  relying on the pool
+            self.close()
+            self.workers = 0
+            return function(*arguments)
+
+    def close(self) -> None:
+        """Stops the worker processes once they've finished their jobs"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "CPUExecutor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+# runs every job in the calling thread; used wherever no executor is given
+SERIAL = CPUExecutor(workers=0)
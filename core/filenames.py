@@ -0,0 +1,65 @@
+import os
+import re
+import threading
+from typing import Dict, Set, Tuple
+
+# a filename that was numbered to keep it apart from others with the same title
+_NUMBERED = re.compile(r"(.*) \((\d+)\)")
+
+
+def _key(name: str) -> str:
+    # case-insensitive filesystems treat names that only differ in case as the same file
+    return os.path.normcase(name)
+
+
+class FilenameIndex:
+    """
+    Hands out filenames that aren't taken yet. Each directory is only listed the first
+    time a name is allocated in it; after that, every allocated name is tracked in memory
+    """
+
+    def __init__(self):
+        self._names: Dict[str, Set[str]] = dict()
+        # the next offset to try for each (directory, title, extension)
+        self._offsets: Dict[Tuple[str, str, str], int] = dict()
+        self._lock = threading.Lock()
+
+    def _taken(self, directory: str) -> Set[str]:
+        if directory not in self._names:
+            self._names[directory] = {_key(name) for name in os.listdir(directory)}
+        return self._names[directory]
+
+    def allocate(self, directory: str, title: str, extension: str) -> str:
+        """
+        Reserves a filename based on the given title and extension that isn't taken in
+        the given directory, e.g. "title.jpg", then "title (1).jpg", "title (2).jpg", ...
+        :return: the reserved filename
+        """
+        directory = _key(os.path.abspath(directory))
+        with self._lock:
+            taken = self._taken(directory)
+            offset = self._offsets.get((directory, title, extension), 0)
+            while True:
+                filename = (
+                    f"{title} ({offset}){extension}" if offset else title + extension
+                )
+                if _key(filename) not in taken:
+                    break
+                offset += 1
+            taken.add(_key(filename))
+            self._offsets[(directory, title, extension)] = offset + 1
+            return filename
+
+    def release(self, directory: str, filename: str) -> None:
+        """Frees a filename that was reserved but never written to"""
+        directory = _key(os.path.abspath(directory))
+        stem, extension = os.path.splitext(filename)
+        title, offset = stem, 0
+        if match := _NUMBERED.fullmatch(stem):
+            title, offset = match[1], int(match[2])
+        with self._lock:
+            self._names.get(directory, set()).discard(_key(filename))
+            # so the name can be handed out again
+            key = (directory, title, extension)
+            if key in self._offsets:
+                self._offsets[key] = min(self._offsets[key], offset)
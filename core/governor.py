@@ -0,0 +1,189 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    Describes how fast an API can be called, and how it reports how much of its quota
+    is left
+    :param rate: the most requests to send per second
+    :param burst: the most requests that can be sent at once after a quiet period
+    :param remaining_headers: headers holding the number of requests left before the
+    quota runs out. If there are several, the smallest one is used
+    :param reset_header: header holding when the quota is refilled
+    :param reset_is_timestamp: True if the reset header is a unix timestamp, False if
+    it's a number of seconds from now
+    :param default_reset: seconds to wait when the quota runs out and the API doesn't
+    say when it will be refilled
+    :param reserve: number of requests to leave unused, so other clients with the same
+    credentials aren't locked out
+    """
+
+    rate: float
+    burst: int = 1
+    remaining_headers: Tuple[str, ...] = ()
+    reset_header: Optional[str] = None
+    reset_is_timestamp: bool = False
+    default_reset: float = 60
+    reserve: int = 0
+
+
+class TokenBucket:
+    """
+    Paces requests to a single API. Requests are spaced out to stay under the API's
+    rate, and stop entirely once its quota is used up until the quota is refilled
+    """
+
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self.tokens = float(limit.burst)
+        self.updated = time.monotonic()
+        # the quota left, if the API has reported it
+        self.remaining: Optional[int] = None
+        # when the API last said its quota would be refilled, if it has
+        self.reset_at: Optional[float] = None
+        self.paused_until = 0.0
+        # True if the pause was only guessed from counting down the quota, rather than
+        #  reported by the API
+        self._guessed = False
+        # set when a guessed pause is called off, to wake up the requests waiting on it
+        self._unpaused = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.limit.burst, self.tokens + (now - self.updated) * self.limit.rate
+        )
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """Waits until another request can be sent"""
+        # the lock makes requests wait in the order they arrived
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self._unpaused.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._unpaused.wait(), self.paused_until - now
+                        )
+                    except TimeoutError:
+                        pass
+                    continue
+                if self.remaining is not None and self.remaining <= self.limit.reserve:
+                    # by our count the quota ran out, but requests that are still in
+                    #  flight may report otherwise. Until they do, wait for the reset
+                    #  the API last reported (or the default, if it hasn't)
+                    self.pause(
+                        (
+                            self.reset_at - now
+                            if self.reset_at is not None and self.reset_at > now
+                            else self.limit.default_reset
+                        ),
+                        guessed=True,
+                    )
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.limit.rate)
+
+    def pause(self, seconds: float, guessed: bool = False) -> None:
+        """
+        Stops any requests from being sent for the given number of seconds
+        :param guessed: True if the API didn't say to pause, so the pause is called off
+        as soon as the API reports that there's quota left
+        """
+        until = time.monotonic() + seconds
+        # what the API says always wins over a guess
+        if until > self.paused_until or (self._guessed and not guessed):
+            self.paused_until = until
+            self._guessed = guessed
+        # once the pause is over the quota has been refilled, but we don't know how much
+        #  of it there is until the API says so again
+        self.remaining = None
+
+    def _seconds_until_reset(self, headers: httpx.Headers) -> Optional[float]:
+        """:return: seconds until the API's quota is refilled, or None if it didn't say"""
+        value = (
+            headers.get(self.limit.reset_header) if self.limit.reset_header else None
+        )
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            return None
+        if self.limit.reset_is_timestamp:
+            seconds -= time.time()
+        return max(seconds, 0)
+
+    def update(self, response: httpx.Response) -> None:
+        """Updates the remaining quota from the rate limit headers of the given response"""
+        reset = self._seconds_until_reset(response.headers)
+        if reset is not None:
+            self.reset_at = time.monotonic() + reset
+        else:
+            reset = self.limit.default_reset
+
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After", "")
+            self.pause(float(retry_after) if retry_after.isdigit() else reset)
+            return
+
+        remaining = [
+            int(value)
+            for header in self.limit.remaining_headers
+            if (value := response.headers.get(header, "")).lstrip("-").isdigit()
+        ]
+        if not remaining:
+            return
+        if min(remaining) <= self.limit.reserve:
+            self.pause(reset)
+            return
+        self.remaining = min(remaining)
+        if self._guessed:
+            # the quota didn't run out after all, so stop waiting for it to be refilled
+            self.paused_until = 0.0
+            self._guessed = False
+            self._unpaused.set()
+
+
+class Governor(httpx.AsyncBaseTransport):
+    """
+    An httpx transport that paces requests to each rate limited API using its own
+    TokenBucket. Requests to other hosts are sent straight away
+    """
+
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        limits: Optional[Dict[str, RateLimit]] = None,
+    ):
+        """
+        :param transport: the transport that sends requests once they're allowed
+        :param limits: the rate limit of each host that has one
+        """
+        self._transport = transport or httpx.AsyncHTTPTransport()
+        self.buckets = {
+            host: TokenBucket(limit) for host, limit in (limits or dict()).items()
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        bucket = self.buckets.get(request.url.host)
+        if bucket is None:
+            return await self._transport.handle_async_request(request)
+        await bucket.acquire()
+        response = await self._transport.handle_async_request(request)
+        bucket.update(response)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
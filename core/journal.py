@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+# the stages each submission goes through during a run, in order
+RESOLVED = "resolved"
+DOWNLOADED = "downloaded"
+UNSAVED = "unsaved"
+# the submission was reported
+FINISHED = "finished"
+# the submission was dropped before it was resolved (e.g. it was under the karma
+#  threshold or had no urls), so it didn't count towards its listing's limit. Nothing
+#  else is done with it, so it counts as having reached every other stage
+SKIPPED = "skipped"
+STAGES = (RESOLVED, DOWNLOADED, UNSAVED, FINISHED, SKIPPED)
+
+
+class Journal:
+    """
+    A persistent record of how far a run got through its source: the last submission
+    taken from the listing, and the last stage each submission taken so far completed.
+    An interrupted run can then be resumed from where it stopped. Backed by a single
+    SQLite file
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path to the SQLite file to store the journal in
+        """
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS run (source TEXT NOT NULL, started REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            "position INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "fullname TEXT NOT NULL UNIQUE, "
+            "stage TEXT, "
+            "updated REAL NOT NULL, "
+            "listing TEXT)"
+        )
+        self._connection.commit()
+
+    @property
+    def source(self) -> Optional[str]:
+        """The source of the run that's been journaled, if any"""
+        row = self._connection.execute("SELECT source FROM run").fetchone()
+        return row[0] if row else None
+
+    def begin(self, source: str, resume: bool = False) -> bool:
+        """
+        Starts journaling a run
+        :param source: describes where the run's submissions come from, e.g. "saved"
+        :param resume: True to carry on from the journaled run if it had the same source,
+        False to forget it and start over
+        :return: True if the journaled run is being resumed, else False
+        """
+        if resume and self.source == source:
+            return True
+        self._connection.execute("DELETE FROM run")
+        self._connection.execute("DELETE FROM submissions")
+        self._connection.execute("INSERT INTO run VALUES (?, ?)", (source, time.time()))
+        self._connection.commit()
+        return False
+
+    def seen(self, fullname: str, listing: Optional[str] = None) -> None:
+        """
+        Records that the given submission was taken from the source. Submissions that
+        were already seen keep their place and stage
+        :param listing: which of the source's listings the submission was taken from, if
+        it has several
+        """
+        self._connection.execute(
+            "INSERT OR IGNORE INTO submissions (fullname, stage, updated, listing) "
+            "VALUES (?, NULL, ?, ?)",
+            (fullname, time.time(), listing),
+        )
+        self._connection.commit()
+
+    def record(self, fullname: str, stage: str) -> None:
+        """
+        Records that the given submission completed the given stage. Submissions that
+        already completed a later stage are left as they are
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage!r}")
+        if self.reached(fullname, stage):
+            return
+        self._connection.execute(
+            "UPDATE submissions SET stage = ?, updated = ? WHERE fullname = ?",
+            (stage, time.time(), fullname),
+        )
+        self._connection.commit()
+
+    def reached(self, fullname: str, stage: str) -> bool:
+        """
+        Returns True if the given submission completed the given stage (or a later one),
+        else False
+        """
+        row = self._connection.execute(
+            "SELECT stage FROM submissions WHERE fullname = ?", (fullname,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return False
+        return STAGES.index(row[0]) >= STAGES.index(stage)
+
+    def count(self, stage: str, listing: Optional[str] = None) -> int:
+        """
+        :param listing: if given, only count submissions taken from this listing
+        :return: the number of submissions that completed the given stage (or a later
+        one), not counting skipped ones
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage!r}")
+        first = STAGES.index(stage)
+        stages = [
+            later for i, later in enumerate(STAGES) if i >= first and later != SKIPPED
+        ]
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM submissions "
+            f"WHERE stage IN ({', '.join('?' * len(stages))}) "
+            "AND (? IS NULL OR listing = ?)",
+            (*stages, listing, listing),
+        ).fetchone()[0]
+
+    def cursor(self, listing: Optional[str] = None) -> Optional[str]:
+        """
+        :param listing: if given, only consider submissions taken from this listing
+        :return: the fullname of the last submission taken from the source, or None if
+        none have been
+        """
+        row = self._connection.execute(
+            "SELECT fullname FROM submissions "
+            "WHERE ? IS NULL OR listing = ? ORDER BY position DESC LIMIT 1",
+            (listing, listing),
+        ).fetchone()
+        return row[0] if row else None
+
+    def unfinished(self, listing: Optional[str] = None) -> List[str]:
+        """
+        :param listing: if given, only consider submissions taken from this listing
+        :return: the fullnames of the submissions that were taken from the source but
+        didn't finish (and weren't skipped), in the order they were taken
+        """
+        return [
+            fullname
+            for fullname, in self._connection.execute(
+                "SELECT fullname FROM submissions "
+                "WHERE (stage IS NULL OR stage NOT IN (?, ?)) "
+                "AND (? IS NULL OR listing = ?) "
+                "ORDER BY position",
+                (FINISHED, SKIPPED, listing, listing),
+            )
+        ]
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+# most records to write at once
+DEFAULT_BATCH_SIZE = 256
+# most records that can wait to be written before whoever's logging has to wait too
+DEFAULT_BUFFER = 4096
+
+
+class _Close:
+    """Marks the end of the records to write"""
+
+
+class LogSink:
+    """
+    Writes records to a JSON Lines file (one JSON object per line) from a background
+    task, so logging a record never waits for the disk. Records are written in batches,
+    and the file is rotated once it grows past a given size: log.txt is renamed to
+    log.txt.1, log.txt.1 to log.txt.2, and so on, with the oldest one deleted
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backups: int = DEFAULT_BACKUPS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        buffer: int = DEFAULT_BUFFER,
+    ):
+        """
+        :param path: path to the file to write records to
+        :param max_bytes: size the file can grow to before it's rotated
+        :param backups: number of rotated files to keep
+        :param batch_size: most records to write at once
+        :param buffer: most records that can wait to be written
+        """
+        if max_bytes < 1 or batch_size < 1 or buffer < 1:
+            raise ValueError("Sizes must be positive integers")
+        if backups < 0:
+            raise ValueError("Backups can't be negative")
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Starts writing records in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def log(self, record: Dict[str, Any]) -> None:
+        """
+        Queues the given record to be written. Only waits if the buffer is full
+        :param record: a JSON serializable dictionary
+        """
+        if self._task is None:
+            raise RuntimeError("LogSink hasn't been started")
+        if self._task.done():
+            # let whatever stopped the writer surface here instead of blocking forever
+            self._task.result()
+            raise RuntimeError("LogSink has been closed")
+        await self._queue.put(record)
+
+    async def close(self) -> None:
+        """Writes every queued record, then stops the background task"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.put(_Close())
+        await self._task
+
+    async def __aenter__(self) -> "LogSink":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            lines = []
+            for record in batch:
+                if isinstance(record, _Close):
+                    break
+                lines.append(json.dumps(record, default=str) + "\n")
+            if lines:
+                # the file is written in another thread, so the event loop keeps going
+                await asyncio.to_thread(self._write, lines)
+            if len(lines) < len(batch):
+                return
+
+    def _write(self, lines: List[str]) -> None:
+        data = "".join(lines).encode("utf-8")
+        if os.path.exists(self.path) and (
+            os.path.getsize(self.path) + len(data) > self.max_bytes
+        ):
+            self._rotate()
+        with open(self.path, "ab") as file:
+            file.write(data)
+
+    def _rotate(self) -> None:
+        if self.backups == 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(source := f"{self.path}.{i}"):
+                os.replace(source, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
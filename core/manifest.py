@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class DownloadRecord:
+    """Describes a file that a url was downloaded to"""
+
+    path: str
+    size: int
+    sha256: str
+
+    def exists(self) -> bool:
+        """Returns True if this file is still on disk and hasn't been truncated, else False"""
+        return os.path.isfile(self.path) and os.path.getsize(self.path) == self.size
+
+
+class Manifest:
+    """
+    A persistent record of which urls have been downloaded, indexed by submission id
+    and url, and which submissions have been downloaded completely. Backed by a single
+    SQLite file
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path to the SQLite file to store the manifest in
+        """
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            "id TEXT PRIMARY KEY, "
+            "completed REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS downloads ("
+            "submission_id TEXT NOT NULL, "
+            "url TEXT NOT NULL, "
+            "path TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "sha256 TEXT NOT NULL, "
+            "downloaded REAL NOT NULL, "
+            "PRIMARY KEY (submission_id, url))"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS downloads_url ON downloads (url)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS downloads_sha256 ON downloads (sha256)"
+        )
+        self._connection.commit()
+
+    def is_complete(self, submission_id: str) -> bool:
+        """
+        Returns True if every url of the given submission has been downloaded, else False
+        """
+        return (
+            self._connection.execute(
+                "SELECT 1 FROM submissions WHERE id = ?", (submission_id,)
+            ).fetchone()
+            is not None
+        )
+
+    def complete(self, submission_id: str) -> None:
+        """Marks every url of the given submission as downloaded"""
+        self._connection.execute(
+            "INSERT OR REPLACE INTO submissions VALUES (?, ?)",
+            (submission_id, time.time()),
+        )
+        self._connection.commit()
+
+    def get(self, submission_id: str, url: str) -> Optional[DownloadRecord]:
+        """
+        :return: where the given url of the given submission was downloaded to, or None
+        if it hasn't been downloaded
+        """
+        row = self._connection.execute(
+            "SELECT path, size, sha256 FROM downloads WHERE submission_id = ? AND url = ?",
+            (submission_id, url),
+        ).fetchone()
+        return DownloadRecord(*row) if row else None
+
+    def _find(self, column: str, value: str) -> Optional[DownloadRecord]:
+        for row in self._connection.execute(
+            f"SELECT path, size, sha256 FROM downloads WHERE {column} = ? "
+            "ORDER BY downloaded DESC",
+            (value,),
+        ):
+            if (download := DownloadRecord(*row)).exists():
+                return download
+        return None
+
+    def find_url(self, url: str) -> Optional[DownloadRecord]:
+        """
+        :return: a file that the given url was downloaded to for any submission and that
+        is still on disk, or None if there is no such file
+        """
+        return self._find("url", url)
+
+    def find_content(self, sha256: str) -> Optional[DownloadRecord]:
+        """
+        :return: a file on disk with the given SHA-256 hash, or None if no file that's
+        been downloaded has that hash
+        """
+        return self._find("sha256", sha256)
+
+    def record(self, submission_id: str, url: str, download: DownloadRecord) -> None:
+        """Records that the given url of the given submission was downloaded"""
+        self._connection.execute(
+            "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                submission_id,
+                url,
+                download.path,
+                download.size,
+                download.sha256,
+                time.time(),
+            ),
+        )
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "Manifest":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,270 @@
+import asyncio
+import bisect
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+# upper bounds (in seconds) of the latency histograms' buckets
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# prefix of every metric's name in the Prometheus export
+PREFIX = "paperscraper_"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Histogram:
+    """Counts how many observed values fell at or below each of a set of bounds"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # counts[i] is the number of values in (buckets[i - 1], buckets[i]], and the
+        #  last count is the number of values above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        :return: each bucket's upper bound (ending with "+Inf") and the number of values
+        at or below it
+        """
+        total = 0
+        result = []
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms describing a run, each identified by a name and
+    a set of labels (e.g. the host a request was sent to). Can be exported as JSON or
+    in Prometheus' text format
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        :param buckets: upper bounds of each histogram's buckets
+        """
+        self.buckets = buckets
+        self.started = time.time()
+        self.counters: Dict[str, Dict[Labels, float]] = dict()
+        self.gauges: Dict[str, Dict[Labels, float]] = dict()
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = dict()
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        """Adds the given amount to a counter"""
+        counter = self.counters.setdefault(name, dict())
+        key = _labels(labels)
+        counter[key] = counter.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Sets a gauge to the given value"""
+        self.gauges.setdefault(name, dict())[_labels(labels)] = value
+
+    def maximum(self, name: str, value: float, **labels) -> None:
+        """Sets a gauge to the given value if it's higher than the gauge's current value"""
+        gauge = self.gauges.setdefault(name, dict())
+        key = _labels(labels)
+        gauge[key] = max(gauge.get(key, value), value)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Adds the given value to a histogram"""
+        histograms = self.histograms.setdefault(name, dict())
+        key = _labels(labels)
+        if key not in histograms:
+            histograms[key] = Histogram(self.buckets)
+        histograms[key].observe(value)
+
+    def error(self, name: str, error: BaseException, **labels) -> None:
+        """Counts an error of the given kind"""
+        self.increment(name, error=type(error).__name__, **labels)
+
+    @contextmanager
+    def time(self, name: str, **labels) -> Iterator[None]:
+        """
+        Adds how many seconds the body of the with statement took to the name + "_seconds"
+        histogram. If it raises, the error is counted in the name + "_errors_total"
+        counter instead
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(name + "_errors_total", e, **labels)
+            raise
+        self.observe(name + "_seconds", time.perf_counter() - start, **labels)
+
+    def to_dict(self) -> Dict:
+        """:return: every metric as a JSON serializable dictionary"""
+        return {
+            "started": self.started,
+            "elapsed": time.time() - self.started,
+            "counters": {
+                name: [
+                    {"labels": dict(key), "value": value}
+                    for key, value in series.items()
+                ]
+                for name, series in self.counters.items()
+            },
+            "gauges": {
+                name: [
+                    {"labels": dict(key), "value": value}
+                    for key, value in series.items()
+                ]
+                for name, series in self.gauges.items()
+            },
+            "histograms": {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": dict(histogram.cumulative()),
+                    }
+                    for key, histogram in series.items()
+                ]
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """:return: every metric in Prometheus' text exposition format"""
+        lines = []
+
+        def sample(name: str, labels: Labels, value: float) -> None:
+            text = ",".join(
+                f'{label}="{_escape(label_value)}"' for label, label_value in labels
+            )
+            lines.append(f"{name}{{{text}}} {value}" if text else f"{name} {value}")
+
+        for name, series in sorted(self.counters.items()):
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for key, value in series.items():
+                sample(PREFIX + name, key, value)
+        for name, series in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            for key, value in series.items():
+                sample(PREFIX + name, key, value)
+        for name, series in sorted(self.histograms.items()):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for key, histogram in series.items():
+                for bound, count in histogram.cumulative():
+                    sample(f"{PREFIX}{name}_bucket", (*key, ("le", bound)), count)
+                sample(f"{PREFIX}{name}_sum", key, histogram.sum)
+                sample(f"{PREFIX}{name}_count", key, histogram.count)
+        return "\n".join(lines) + "\n"
+
+    def write(
+        self, json_path: Optional[str] = None, prometheus_path: Optional[str] = None
+    ) -> None:
+        """
+        Writes every metric to the given files. Each file is replaced in one step, so
+        nothing reading it ever sees half of it
+        """
+        if json_path is not None:
+            _replace(json_path, json.dumps(self.to_dict(), indent=2))
+        if prometheus_path is not None:
+            _replace(prometheus_path, self.to_prometheus())
+
+    async def write_every(
+        self,
+        interval: float,
+        json_path: Optional[str] = None,
+        prometheus_path: Optional[str] = None,
+    ) -> None:
+        """Writes every metric to the given files every interval seconds, until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            self.write(json_path, prometheus_path)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _replace(path: str, text: str) -> None:
+    if directory := os.path.dirname(path):
+        os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(path + ".tmp", path)
+
+
+# metrics of the current run, shared by everything that records them
+METRICS = Metrics()
+
+
+class _CountingStream(httpx.AsyncByteStream):
+    """Wraps a response body to count the bytes read from it"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, count):
+        self._stream = stream
+        self._count = count
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            self._count(len(chunk))
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+
+
+class Recorder(httpx.AsyncBaseTransport):
+    """
+    An httpx transport that records the number of requests to each host, how long each
+    took to respond, the bytes each response's body held, and the errors raised
+    """
+
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        metrics: Metrics = METRICS,
+    ):
+        """
+        :param transport: the transport that sends the requests
+        :param metrics: where to record each request
+        """
+        self._transport = transport or httpx.AsyncHTTPTransport()
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        try:
+            with self.metrics.time("request", host=host):
+                response = await self._transport.handle_async_request(request)
+        finally:
+            self.metrics.increment("requests_total", host=host)
+        self.metrics.increment(
+            "responses_total", host=host, status=response.status_code
+        )
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_CountingStream(
+                response.stream,
+                lambda size: self.metrics.increment(
+                    "response_bytes_total", size, host=host
+                ),
+            ),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
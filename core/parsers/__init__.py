@@ -1,3 +1,3 @@
 from requests.models import Response
 
-from .parsers import find_urls
+from .parsers import HOST_LIMITS, RATE_LIMITS, find_urls
@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from core.cache import Cache
+
+# how long an API response is reused before asking the API whether it has changed
+FRESHNESS = timedelta(days=1)
+
+
+async def get_api(
+    url: str,
+    client: httpx.AsyncClient,
+    parse: Callable[[httpx.Response], Optional[Any]],
+    cache: Optional[Cache] = None,
+    headers: Optional[Dict[str, str]] = None,
+    freshness: timedelta = FRESHNESS,
+    key: Optional[str] = None,
+) -> Optional[Any]:
+    """
+    Calls an API, keeping what it returned along with its ETag and Last-Modified
+    validators. Once the stored copy is older than freshness, the API is asked for the
+    response again only if it's changed, and the stored copy is reused if it hasn't
+    :param url: the API url to call
+    :param parse: turns a successful response into a JSON serializable value, or
+    returns None if the response isn't usable
+    :param cache: cache of previous API responses, if any
+    :param headers: headers to send with the request
+    :param freshness: how long the stored copy is used without asking the API at all
+    :param key: what the response is stored under, if not its url (e.g. because the
+    url holds credentials)
+    :return: the parsed response, or None if the API call failed
+    """
+    key = key or url
+    entry = cache.get(key) if cache is not None else None
+    if entry is not None and time.time() < entry["checked"] + freshness.total_seconds():
+        return entry["value"]
+
+    headers = dict(headers or {})
+    if entry is not None:
+        if entry["etag"] is not None:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"] is not None:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = await client.get(url, headers=headers)
+    if response.status_code == 304 and entry is not None:
+        value = entry["value"]
+    elif response.status_code == 200:
+        value = parse(response)
+    else:
+        return None
+
+    if cache is not None and value is not None:
+        cache.set(
+            key,
+            {
+                "value": value,
+                # a 304 may leave out validators that haven't changed
+                "etag": response.headers.get("ETag", entry and entry["etag"]),
+                "last_modified": response.headers.get(
+                    "Last-Modified", entry and entry["last_modified"]
+                ),
+                "checked": time.time(),
+            },
+        )
+    return value
@@ -1,40 +1,89 @@
-import json
 import os
 import re
 from typing import Optional, Set
 
 import httpx
 
+from core.cache import Cache
+from core.governor import RateLimit
+
+from .api import get_api
+
 # first group is user's name, second is image id
-FLICKR_REGEX = re.compile(r"flickr\.com/photos/(^/+)/(^/+)/")
+FLICKR_REGEX = re.compile(r"flickr\.com/photos/([^/]+)/(\d+)")
 
 # first group is the short image id, which needs to be converted
 #  before it can be used in the API
-SHORT_FLICKR_REGEX = re.compile(r"flic.kr/p/(^/+)")
+SHORT_FLICKR_REGEX = re.compile(r"flic\.kr/p/([^/?#]+)")
+
+# short image ids are the regular id written in this base-58 alphabet
+SHORT_ID_ALPHABET = "123456789abcdefghijkmnopqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ"
 
 API_ROOT = "https://www.flickr.com/services/rest/"
 
+# hosts (and their subdomains) that flickr_parser is responsible for
+HOSTS = {"flickr.com", "flic.kr"}
+
+API_HOST = "www.flickr.com"
+# flickr allows 3600 queries an hour per key, but doesn't report how many are left
+RATE_LIMIT = RateLimit(rate=1, burst=10, default_reset=3600)
+# the most requests to send to flickr at once, so that a subreddit full of flickr
+#  links doesn't take up every connection while it waits for the rate limit
+HOST_LIMIT = 4
+
+
+def _decode_short_id(short_id: str) -> Optional[str]:
+    """
+    :param short_id: the id at the end of a flic.kr/p/ link
+    :return: the regular id of the image, or None if the short id isn't valid
+    """
+    photo_id = 0
+    for character in short_id:
+        if (digit := SHORT_ID_ALPHABET.find(character)) < 0:
+            return None
+        photo_id = photo_id * len(SHORT_ID_ALPHABET) + digit
+    return str(photo_id) if short_id else None
+
 
 async def _get_flickr_photo_id(url: str, client: httpx.AsyncClient) -> Optional[str]:
     """
     :param url: url possibly linking to a flickr image
     :return: the regular id of the image, or None if no id could be found
     """
-    if SHORT_FLICKR_REGEX.match(url):
-        response = await client.get(url)
-        if response.status_code != 200:
-            return None
-        url = response.url
+    if m := SHORT_FLICKR_REGEX.search(url):
+        if (photo_id := _decode_short_id(m.group(1))) is not None:
+            return photo_id
+        # only the redirect's destination is needed, so don't follow it
+        response = await client.head(url, follow_redirects=False)
+        url = response.headers.get("Location", "")
 
-    if m := FLICKR_REGEX.match(url):
+    if m := FLICKR_REGEX.search(url):
         return m.group(2)
 
     return None
 
 
-async def flickr_parser(url: str, client: httpx.AsyncClient) -> Set[str]:
+def _parse_biggest_source(response: httpx.Response) -> Optional[str]:
+    """
+    :param response: flickr's API response listing a photo's sizes
+    :return: the link to the photo's biggest size, or None if it can't be downloaded
+    """
+    data = response.json()
+    if data.get("stat") != "ok" or data["sizes"]["candownload"] != 1:
+        return None
+
+    biggest_size = max(
+        data["sizes"]["size"], key=lambda size: int(size["width"]) * int(size["height"])
+    )
+    return biggest_size["source"]
+
+
+async def flickr_parser(
+    url: str, client: httpx.AsyncClient, cache: Optional[Cache] = None
+) -> Set[str]:
     """
     :param url: url possibly linking to a flickr image
+    :param cache: cache of previous API responses, if any
     :return: a set of urls of downloadable images
     """
     if (photo_id := await _get_flickr_photo_id(url, client)) is None:
@@ -43,21 +92,18 @@ async def flickr_parser(url: str, client: httpx.AsyncClient) -> Set[str]:
     parameters = {
         "api_key": os.environ["flickr_client_id"],
         "format": "json",
-        "method": "flickr.photos.getInfo",
+        "nojsoncallback": 1,
+        "method": "flickr.photos.getSizes",
         "photo_id": photo_id,
     }
-    response = await client.get(
-        API_ROOT + "?" + "&".join(f"{arg}={param}" for arg, param in parameters.items())
-    )
-    if response.status_code != 200:
-        return set()
-
-    data = json.loads(response.text.removeprefix("jsonFlickrApi(").removesuffix(")"))
-
-    if not data["sizes"]["candownload"] == 1:
-        return set()
-
-    biggest_size_name = max(
-        data["sizes"]["size"], key=lambda x: x["width"] * x["height"]
+    source = await get_api(
+        API_ROOT
+        + "?"
+        + "&".join(f"{arg}={param}" for arg, param in parameters.items()),
+        client,
+        _parse_biggest_source,
+        cache=cache,
+        # the url holds the api key, so the biggest size is stored under the photo id
+        key=f"flickr:{photo_id}",
     )
-    return {data["sizes"]["size"][biggest_size_name]["source"]}
+    return {source} if source else set()
@@ -1,19 +1,39 @@
 import os
 import re
-from typing import Dict, Optional, Set
+from typing import Dict, List, Optional, Set
 
 import httpx
 from dotenv import load_dotenv
 
-SINGLE_IMAGE_LINK = ""
-ALBUM_LINK = "a/"
-GALLERY_LINK = "gallery/"
+from core.cache import Cache
+from core.governor import RateLimit
+
+from .api import get_api
+
+SINGLE_IMAGE_LINK = "/"
+ALBUM_LINK = "/a/"
+GALLERY_LINK = "/gallery/"
 
 API_ROOT = "https://api.imgur.com/3/"
 IMAGE_API = API_ROOT + "image/"
 ALBUM_API = API_ROOT + "album/"
 GALLERY_API = API_ROOT + "gallery/"
 
+# hosts (and their subdomains) that imgur_parser is responsible for
+HOSTS = {"imgur.com"}
+
+API_HOST = "api.imgur.com"
+# imgur reports both the app's daily quota and the per-user hourly quota
+RATE_LIMIT = RateLimit(
+    rate=5,
+    burst=10,
+    remaining_headers=("X-RateLimit-ClientRemaining", "X-RateLimit-UserRemaining"),
+    reset_header="X-RateLimit-UserReset",
+    reset_is_timestamp=True,
+    default_reset=3600,
+    reserve=10,
+)
+
 IMGUR_REGEX = re.compile(
     r"(http(s)?://)?(www.)?"
     + r"(?P<direct_link>i\.)?"
@@ -26,33 +46,59 @@ load_dotenv()
 HEADERS = {"Authorization": f'Client-ID {os.environ["IMGUR_CLIENT_ID"]}'}
 
 
+def _parse_links(response: httpx.Response) -> List[str]:
+    """
+    :param response: imgur's API response for an image or album
+    :return: the links to every image in it
+    """
+    data = response.json()["data"]
+    if "images" in data:
+        return sorted({image["link"] for image in data["images"]})
+    return [data["link"]]
+
+
 def _split_imgur_url(url: str) -> Optional[Dict[str, str]]:
     m = IMGUR_REGEX.match(url)
     return m.groupdict() if m else None
 
 
-async def imgur_parser(url: str, client: httpx.AsyncClient) -> Set[str]:
+async def _api_links(
+    endpoint: str,
+    link_id: str,
+    client: httpx.AsyncClient,
+    cache: Optional[Cache] = None,
+) -> Set[str]:
     """
-    :param response: a GET response from an imgur (single image, album, or gallery) page
-    :return: a set of strings representing all scrape-able images on that page
+    Asks imgur's API for the links to the images in an image or album
+    :param endpoint: IMAGE_API or ALBUM_API
+    :param link_id: the id of the image or album
+    :param cache: cache of previous API responses, if any
+    :return: a set of links to images
     """
-    # TODO: might get redirected?
-    url = (await client.get(url)).url
+    links = await get_api(
+        endpoint + link_id, client, _parse_links, cache=cache, headers=HEADERS
+    )
+    return set(links or ())
+
 
+async def imgur_parser(
+    url: str, client: httpx.AsyncClient, cache: Optional[Cache] = None
+) -> Set[str]:
+    """
+    :param url: a link to an imgur (single image, album, or gallery) page
+    :param cache: cache of previous API responses, if any
+    :return: a set of strings representing all scrape-able images on that page
+    """
     if (match := _split_imgur_url(url)) is None:
-        return set()
+        # the url might redirect to an imgur page, which only takes headers to find out
+        url = str((await client.head(url, follow_redirects=True)).url)
+        if (match := _split_imgur_url(url)) is None:
+            return set()
 
     if match["link_type"] == SINGLE_IMAGE_LINK:
         if match["direct_link"]:
             return {url}
-        image_data = await client.get(IMAGE_API + match["link_id"], headers=HEADERS)
-        if image_data.status_code == 200:
-            return {image_data.json()["link"]}
+        return await _api_links(IMAGE_API, match["link_id"], client, cache)
     elif match["link_type"] in {ALBUM_LINK, GALLERY_LINK}:
-        album_response = await client.get(ALBUM_API + match["link_id"], headers=HEADERS)
-        if album_response.status_code == 200:
-            return {
-                image_data["link"]
-                for image_data in album_response.json()["data"]["images"]
-            }
+        return await _api_links(ALBUM_API, match["link_id"], client, cache)
     return set()
@@ -1,48 +1,143 @@
 # mypy: ignore-errors
-import asyncio
-from functools import reduce
-from typing import Callable, Set
+from typing import Awaitable, Callable, Dict, Optional, Set
+from urllib.parse import urlsplit
 
 import httpx
 
-from core import get_extension
+from core import Cache, get_extension
+from core.governor import RateLimit
+from core.metrics import METRICS, Metrics
 
+from . import flickr, imgur
+from .api import FRESHNESS
 from .flickr import flickr_parser
 from .imgur import imgur_parser
 
+# takes a url, a client, and optionally a cache of previous responses
+Parser = Callable[..., Awaitable[Set[str]]]
 
-async def single_image_parser(url: str, client: httpx.AsyncClient) -> Set[str]:
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif"}
+
+# status codes servers use to say they don't support HEAD requests
+HEAD_REJECTED = {405, 501}
+
+
+async def _probe(url: str, client: httpx.AsyncClient) -> httpx.Response:
+    """
+    Fetches only the headers of the given url, without downloading its body
+    :param url: a link to a webpage
+    :param client: the httpx.AsyncClient to use for the request
+    :return: a response whose headers (but not content) can be inspected
+    """
+    response = await client.head(url, follow_redirects=True)
+    if response.status_code in HEAD_REJECTED:
+        # the stream is closed as soon as the headers arrive, so the body is never read
+        async with client.stream("GET", url, follow_redirects=True) as response:
+            pass
+    return response
+
+
+async def single_image_parser(
+    url: str, client: httpx.AsyncClient, cache: Optional[Cache] = None
+) -> Set[str]:
     """
     :param response: A web page that has been recognized by this parser
     :returns: A list of all scrapeable urls found in the given webpage
     """
-    response = await client.get(url)
-    if response.status_code == 200 and get_extension(response).lower() in [
-        ".png",
-        ".jpg",
-        ".jpeg",
-        ".gif",
-    ]:
-        return {response.url}
+    response = await _probe(url, client)
+    if (
+        response.status_code == 200
+        and "Content-type" in response.headers
+        and get_extension(response).lower() in IMAGE_EXTENSIONS
+    ):
+        return {str(response.url)}
     return set()
 
 
-PARSERS: Callable[[str, httpx.AsyncClient], Set[str]] = {
-    single_image_parser,
-    imgur_parser,
-    flickr_parser,
+# maps each host to the only parser that can find images on it. Hosts that aren't
+#  listed here are handled by FALLBACK_PARSER
+PARSERS: Dict[str, Parser] = {
+    **{host: imgur_parser for host in imgur.HOSTS},
+    **{host: flickr_parser for host in flickr.HOSTS},
+}
+
+FALLBACK_PARSER: Parser = single_image_parser
+
+# rate limits of the APIs that the parsers use
+RATE_LIMITS: Dict[str, RateLimit] = {
+    imgur.API_HOST: imgur.RATE_LIMIT,
+    flickr.API_HOST: flickr.RATE_LIMIT,
+}
+
+
+# the most requests that can be sent to each of the parsers' hosts at once, where that
+#  differs from the scheduler's default
+HOST_LIMITS: Dict[str, int] = {
+    flickr.API_HOST: flickr.HOST_LIMIT,
+    **{host: flickr.HOST_LIMIT for host in flickr.HOSTS},
 }
 
 
-async def find_urls(url: str, client: httpx.AsyncClient) -> Set[str]:
+def _hostname(url: str) -> str:
+    """
+    :param url: a link to a webpage, with or without its scheme
+    :return: the lowercase hostname of the given url, or an empty string if it has none
+    """
+    if "//" not in url:
+        url = "//" + url
+    return (urlsplit(url).hostname or "").lower()
+
+
+def get_parser(url: str) -> Parser:
+    """
+    Finds the parser responsible for the given url based on its host
+    :param url: a link to a webpage
+    :return: the registered parser for the url's host (or the closest parent domain
+    that has one), otherwise FALLBACK_PARSER
+    """
+    labels = _hostname(url).split(".")
+    for i in range(len(labels) - 1):
+        if (parser := PARSERS.get(".".join(labels[i:]))) is not None:
+            return parser
+    return FALLBACK_PARSER
+
+
+def _parser_name(parser: Parser) -> str:
+    return getattr(parser, "__name__", type(parser).__name__)
+
+
+async def find_urls(
+    url: str,
+    client: httpx.AsyncClient,
+    cache: Optional[Cache] = None,
+    metrics: Metrics = METRICS,
+) -> Set[str]:
     """
     Attempts to find images on a linked page
-    Currently supports directly linked images and imgur pages
+    Currently supports directly linked images, imgur pages, and flickr pages
     :param url: a link to a webpage
+    :param cache: cache of urls that have been resolved before (and of the parsers'
+    responses), if any
+    :param metrics: where to record how long each parser takes and what it finds
     :return: a list of direct links to images found on that webpage
     """
-    return reduce(
-        set.union,
-        await asyncio.gather(*(parser(url, client) for parser in PARSERS)),
-        set(),
+    parser = get_parser(url)
+    name = _parser_name(parser)
+    if cache is not None and (cached := cache.get(url)) is not None:
+        metrics.increment("find_urls_total", parser=name, outcome="cached")
+        return set(cached)
+    with metrics.time("find_urls", parser=name):
+        urls = await parser(url, client, cache=cache)
+    metrics.increment(
+        "find_urls_total", parser=name, outcome="found" if urls else "empty"
     )
+    metrics.increment("urls_found_total", len(urls), parser=name)
+    # pages where nothing was found aren't cached, since the request may have just failed
+    if cache is not None and urls:
+        # parsers that use an API ask it whether their results have changed once
+        #  they're no longer fresh, so those results are only reused while they are
+        cache.set(
+            url, sorted(urls), ttl=None if parser is FALLBACK_PARSER else FRESHNESS
+        )
+    return urls
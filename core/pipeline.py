@@ -0,0 +1,323 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Union,
+)
+
+from core.metrics import METRICS, Metrics
+
+
+@dataclass
+class Stage:
+    """
+    One step of a Pipeline
+    :param function: coroutine function that's called on each item that reaches this
+    stage. Whatever it returns is passed to the next stage, unless it returns None, in
+    which case the item is dropped
+    :param workers: how many items this stage can work on at once
+    :param limit: if given, the most items that can pass through this stage. Once it's
+    reached, the pipeline stops taking items from its source
+    :param buffer: how many items can wait for this stage before earlier stages have to
+    wait for it to catch up. Defaults to twice the number of workers
+    :param name: what this stage's metrics are labelled with. Defaults to its position
+    in the pipeline
+    :param errors: if given, called with the item and the exception whenever function
+    raises one, and whatever it returns is used in place of function's output, so one
+    bad item doesn't stop the others. Otherwise, the exception stops the pipeline
+    """
+
+    function: Callable[[Any], Awaitable[Any]]
+    workers: int = 1
+    limit: Optional[int] = None
+    buffer: Optional[int] = None
+    name: Optional[str] = None
+    errors: Optional[Callable[[Any, Exception], Any]] = None
+
+    def __post_init__(self):
+        if self.workers < 1:
+            raise ValueError("A stage must have at least one worker")
+        if self.limit is not None and self.limit < 1:
+            raise ValueError("Limit must be a positive integer")
+
+
+async def _aiter(source: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if isinstance(source, AsyncIterable):
+        try:
+            async for item in source:
+                yield item
+        finally:
+            if hasattr(source, "aclose"):
+                await source.aclose()
+    else:
+        for item in source:
+            yield item
+
+
+# number of items that PRAW fetches per request to a listing
+LISTING_PAGE_SIZE = 100
+
+
+class _Done:
+    """Marks the end of a prefetched iterable"""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+async def prefetch(
+    iterable: Iterable, buffer: int = LISTING_PAGE_SIZE
+) -> AsyncIterator:
+    """
+    Iterates over a blocking iterable (like one of PRAW's listings) in a separate thread,
+    so the event loop can keep running while it waits. The thread keeps up to buffer
+    items ready ahead of time, so e.g. the next page of a listing is fetched while the
+    current page is still being used
+    """
+    if buffer < 1:
+        raise ValueError("Buffer must be a positive integer")
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+    stopped = threading.Event()
+
+    def put(item) -> None:
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce() -> None:
+        try:
+            try:
+                for item in iterable:
+                    if stopped.is_set():
+                        return
+                    put(item)
+            except Exception as e:
+                put(_Done(e))
+            else:
+                put(_Done())
+        except RuntimeError:
+            # the event loop was closed before the iterable was used up
+            pass
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while not isinstance(item := await queue.get(), _Done):
+            yield item
+        if item.error is not None:
+            raise item.error
+    finally:
+        stopped.set()
+        # make room for an item the thread may be waiting to put, so it can stop
+        while not queue.empty():
+            queue.get_nowait()
+
+
+class _Exhausted:
+    """Marks the end of one of the sources being interleaved"""
+
+
+async def _next(iterator: AsyncIterator) -> Any:
+    try:
+        return await anext(iterator)
+    except StopAsyncIteration:
+        return _Exhausted
+
+
+async def interleave(*sources: AsyncIterable) -> AsyncIterator:
+    """
+    Yields items from each of the given sources in turn, so each one gets an equal
+    share. A source that has nothing ready yet (e.g. it's waiting for the next page of a
+    listing) is skipped until it does, instead of holding back the others
+    """
+    iterators = [aiter(source) for source in sources]
+    pending = {
+        i: asyncio.ensure_future(_next(iterator))
+        for i, iterator in enumerate(iterators)
+    }
+    turn = 0
+    try:
+        while pending:
+            await asyncio.wait(pending.values(), return_when=asyncio.FIRST_COMPLETED)
+            # starting from whichever source's turn it is, take from the first source
+            #  that has an item ready
+            i = min(
+                (i for i, task in pending.items() if task.done()),
+                key=lambda i: (i - turn) % len(iterators),
+            )
+            item = pending.pop(i).result()
+            if item is _Exhausted:
+                continue
+            pending[i] = asyncio.ensure_future(_next(iterators[i]))
+            turn = i + 1
+            yield item
+    finally:
+        for task in pending.values():
+            task.cancel()
+        await asyncio.gather(*pending.values(), return_exceptions=True)
+        for iterator in iterators:
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+
+
+class Pipeline:
+    """
+    Runs items through a series of stages that are connected by bounded queues, so that
+    each item moves on to the next stage as soon as it's done with the current one
+    instead of waiting for every other item to catch up
+    """
+
+    def __init__(self, *stages: Stage, metrics: Metrics = METRICS):
+        """
+        :param stages: the stages each item goes through, in order
+        :param metrics: where to record how long each stage takes, how many items pass
+        through or are dropped by it, and how many items wait for it
+        """
+        if not stages:
+            raise ValueError("A pipeline must have at least one stage")
+        self.stages = stages
+        self.metrics = metrics
+
+    async def run(self, source: Union[Iterable, AsyncIterable]) -> List[Any]:
+        """
+        Feeds every item from the given source through each stage in turn
+        :return: everything returned by the last stage, in the order it finished
+        """
+        results: List[Any] = []
+
+        async def collect(output: Any) -> None:
+            results.append(output)
+
+        await self._run(source, collect)
+        return results
+
+    async def stream(self, source: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+        """
+        Feeds every item from the given source through each stage in turn, and yields
+        whatever the last stage returns as soon as it's returned. If the caller stops
+        iterating early, every stage is stopped and nothing more is read from the source
+        """
+        last = self.stages[-1]
+        # the last stage waits for the caller once this many of its results are unread
+        outputs: asyncio.Queue = asyncio.Queue(maxsize=last.buffer or 2 * last.workers)
+        task = asyncio.create_task(self._run(source, outputs.put))
+        try:
+            while True:
+                getter = asyncio.ensure_future(outputs.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                yield getter.result()
+            # the stages are done, so nothing else will be added
+            while not outputs.empty():
+                yield outputs.get_nowait()
+            task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    async def _run(
+        self,
+        source: Union[Iterable, AsyncIterable],
+        emit: Callable[[Any], Awaitable[None]],
+    ) -> None:
+        """
+        Feeds every item from the given source through each stage in turn, and hands
+        whatever the last stage returns to emit
+        """
+        queues = [
+            asyncio.Queue(maxsize=stage.buffer or 2 * stage.workers)
+            for stage in self.stages
+        ]
+        passed = [0] * len(self.stages)
+        # stages up to and including this index have reached their limit and drop
+        #  anything else they're given
+        stopped = -1
+
+        async def feed() -> None:
+            items = _aiter(source)
+            # checked before each item is taken, so that nothing more is read from the
+            #  source once a limit is reached
+            try:
+                while stopped < 0:
+                    try:
+                        item = await anext(items)
+                    except StopAsyncIteration:
+                        break
+                    await queues[0].put(item)
+            finally:
+                await items.aclose()
+
+        names = [stage.name or str(i) for i, stage in enumerate(self.stages)]
+
+        async def work(i: int) -> None:
+            nonlocal stopped
+            stage = self.stages[i]
+            while True:
+                item = await queues[i].get()
+                try:
+                    if i <= stopped:
+                        continue
+                    self.metrics.maximum(
+                        "queue_depth_peak", queues[i].qsize() + 1, stage=names[i]
+                    )
+                    outcome = None
+                    try:
+                        with self.metrics.time("stage", stage=names[i]):
+                            output = await stage.function(item)
+                    except Exception as e:
+                        if stage.errors is None:
+                            raise
+                        output = stage.errors(item, e)
+                        outcome = "failed"
+                    self.metrics.increment(
+                        "stage_items_total",
+                        stage=names[i],
+                        outcome=outcome or ("dropped" if output is None else "passed"),
+                    )
+                    if output is None or i <= stopped:
+                        continue
+                    passed[i] += 1
+                    if stage.limit is not None and passed[i] >= stage.limit:
+                        stopped = max(stopped, i)
+                    if i + 1 < len(queues):
+                        await queues[i + 1].put(output)
+                    else:
+                        await emit(output)
+                finally:
+                    queues[i].task_done()
+
+        async def drain(
+            feeder: asyncio.Task, workers: List[List[asyncio.Task]]
+        ) -> None:
+            await feeder
+            # once a stage's queue is empty and its workers are idle, nothing else can
+            #  reach the next stage
+            for queue, stage_workers in zip(queues, workers):
+                await queue.join()
+                for worker in stage_workers:
+                    worker.cancel()
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                feeder = group.create_task(feed())
+                workers = [
+                    [group.create_task(work(i)) for _ in range(stage.workers)]
+                    for i, stage in enumerate(self.stages)
+                ]
+                group.create_task(drain(feeder, workers))
+        except BaseExceptionGroup as errors:
+            if len(errors.exceptions) == 1:
+                raise errors.exceptions[0]
+            raise
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import METRICS, Metrics
+
+# seconds a callback can hold the event loop before it counts as blocking it
+DEFAULT_THRESHOLD = 0.1
+# most frames of each blocking call site's stack to keep
+STACK_DEPTH = 12
+
+# the message asyncio logs in debug mode when a callback takes too long
+_SLOW_CALLBACK_MESSAGE = "Executing %s took %.3f seconds"
+
+
+@dataclass
+class Blocked:
+    """How often, and for how long, one call site blocked the event loop"""
+
+    count: int = 0
+    seconds: float = 0.0
+    longest: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.longest = max(self.longest, seconds)
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Catches asyncio's slow callback warnings and hands them to a StallMonitor"""
+
+    def __init__(self, monitor: "StallMonitor"):
+        super().__init__()
+        self.monitor = monitor
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.msg == _SLOW_CALLBACK_MESSAGE and len(record.args) == 2:
+            handle, seconds = record.args
+            self.monitor.slow_callback(str(handle), float(seconds))
+
+
+class StallMonitor:
+    """
+    Finds what blocks the event loop. Runs the loop in debug mode, so every callback
+    (e.g. each step of a coroutine) that takes longer than the threshold is recorded.
+    A watchdog thread also checks that the loop keeps ticking, and while it's stalled,
+    records the stack of whatever call is blocking it (e.g. a synchronous request
+    made by PRAW, or a file being written)
+    """
+
+    def __init__(
+        self, threshold: float = DEFAULT_THRESHOLD, metrics: Metrics = METRICS
+    ):
+        """
+        :param threshold: seconds the loop can be held before it counts as blocked
+        :param metrics: where to record how long the loop was blocked for
+        """
+        if threshold <= 0:
+            raise ValueError("Threshold must be positive")
+        self.threshold = threshold
+        self.metrics = metrics
+        # callbacks that ran for too long, by the coroutine or function they ran
+        self.slow_callbacks: Dict[str, Blocked] = dict()
+        # stalls the watchdog caught, by the stack of the call that was blocking
+        self.stalls: Dict[Tuple[str, ...], Blocked] = dict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # the loop's settings before it was monitored, to restore afterwards
+        self._debug = False
+        self._slow_callback_duration = 0.0
+        self._handler = _SlowCallbackHandler(self)
+        self._heartbeat = time.monotonic()
+        self._stopped = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Starts monitoring the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._debug = self._loop.get_debug()
+        self._slow_callback_duration = self._loop.slow_callback_duration
+        self._loop.set_debug(True)
+        self._loop.slow_callback_duration = self.threshold
+        logging.getLogger("asyncio").addHandler(self._handler)
+        self._beat()
+        self._stopped.clear()
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(threading.get_ident(),), daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        """Stops monitoring the event loop"""
+        self._stopped.set()
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+        logging.getLogger("asyncio").removeHandler(self._handler)
+        if self._loop is not None:
+            self._loop.set_debug(self._debug)
+            self._loop.slow_callback_duration = self._slow_callback_duration
+            self._loop = None
+
+    async def __aenter__(self) -> "StallMonitor":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.stop()
+
+    def slow_callback(self, callback: str, seconds: float) -> None:
+        """Records that the given callback held the event loop for the given time"""
+        with self._lock:
+            self.slow_callbacks.setdefault(callback, Blocked()).add(seconds)
+        self.metrics.observe("slow_callback_seconds", seconds)
+
+    def _beat(self) -> None:
+        self._heartbeat = time.monotonic()
+        if not self._stopped.is_set():
+            self._loop.call_later(self.threshold / 2, self._beat)
+
+    def _watch(self, loop_thread: int) -> None:
+        stalled_since: Optional[float] = None
+        stack: Tuple[str, ...] = ()
+        while not self._stopped.wait(self.threshold / 2):
+            late = time.monotonic() - self._heartbeat
+            if late > self.threshold:
+                if stalled_since is None:
+                    stalled_since = self._heartbeat
+                    # whatever the loop's thread is running now is what's blocking it
+                    frame = sys._current_frames().get(loop_thread)
+                    stack = _format_stack(frame) if frame is not None else ()
+            elif stalled_since is not None:
+                self._stalled(stack, self._heartbeat - stalled_since)
+                stalled_since = None
+        if stalled_since is not None:
+            self._stalled(stack, time.monotonic() - stalled_since)
+
+    def _stalled(self, stack: Tuple[str, ...], seconds: float) -> None:
+        with self._lock:
+            self.stalls.setdefault(stack, Blocked()).add(seconds)
+        self.metrics.observe("loop_stall_seconds", seconds)
+
+    def report(self) -> Dict:
+        """
+        :return: the call sites that blocked the event loop, those that blocked it for
+        longest first, as a JSON serializable dictionary
+        """
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "stalls": [
+                    {"stack": list(stack), **vars(blocked)}
+                    for stack, blocked in _longest_first(self.stalls)
+                ],
+                "slow_callbacks": [
+                    {"callback": callback, **vars(blocked)}
+                    for callback, blocked in _longest_first(self.slow_callbacks)
+                ],
+            }
+
+    def write(self, path: str) -> None:
+        """Writes the report to the given file"""
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+
+
+def _format_stack(frame) -> Tuple[str, ...]:
+    """:return: the innermost frames of the given frame's stack, innermost first"""
+    return tuple(
+        f"{summary.filename}:{summary.lineno} in {summary.name}"
+        for summary in reversed(traceback.extract_stack(frame, limit=STACK_DEPTH))
+    )
+
+
+def _longest_first(blocked: Dict) -> List:
+    return sorted(blocked.items(), key=lambda item: item[1].seconds, reverse=True)
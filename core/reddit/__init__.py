@@ -4,5 +4,10 @@ from .reddit import (
     from_saved,
     from_subreddit,
     has_urls,
+    iter_saved,
+    iter_subreddit,
+    resolve,
+    saved_listing,
     sign_in,
+    subreddit_listing,
 )
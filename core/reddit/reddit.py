@@ -1,12 +1,15 @@
-import asyncio
-import itertools
+import functools
 import os
 from datetime import timedelta
-from typing import Callable, Iterable, List
+from typing import AsyncIterator, Callable, Iterable, List, Optional
 
 import httpx
 import praw
-from praw.models import ListingGenerator, Redditor
+from praw.models import ListingGenerator, Redditor, Submission
+
+from core.cache import Cache
+from core.manifest import Manifest
+from core.pipeline import Pipeline, Stage, prefetch
 
 from .sortoption import SortOption
 from .submission_wrapper import SubmissionWrapper
@@ -40,39 +43,152 @@ def has_urls(wrapped: SubmissionWrapper) -> bool:
     return len(wrapped.urls) > 0
 
 
+async def resolve(
+    submission: Submission,
+    client: httpx.AsyncClient,
+    dry: bool = True,
+    criteria: Callable[[SubmissionWrapper], bool] = has_urls,
+    cache: Optional[Cache] = None,
+    manifest: Optional[Manifest] = None,
+) -> Optional[SubmissionWrapper]:
+    """
+    Wraps the given submission and finds its urls
+    :param cache: cache of urls that have been resolved on previous runs, if any
+    :param manifest: record of previous downloads; submissions that were completely
+    downloaded on a previous run aren't resolved again, and are only returned if they
+    can still be unsaved
+    :return: the wrapped submission, or None if it doesn't meet the given criteria or has
+    already been downloaded and can't be unsaved
+    """
+    if manifest is not None and manifest.is_complete(submission.id):
+        if dry:
+            return None
+        # downloaded on a previous run that didn't unsave it (e.g. a dry run), so it's
+        #  returned without any urls, to be unsaved without being downloaded again
+        return SubmissionWrapper(submission, client, dry=dry)
+    wrapped = SubmissionWrapper(submission, client, dry=dry)
+    await wrapped.find_urls(client, cache=cache)
+    return wrapped if criteria(wrapped) else None
+
+
+# most posts to resolve at once while looking for posts that meet the criteria
+DEFAULT_LOOKAHEAD = 32
+
+
+async def _iter_source(
+    source: ListingGenerator,
+    client: httpx.AsyncClient,
+    amount: int = 10,
+    dry: bool = True,
+    criteria: Callable[[SubmissionWrapper], bool] = has_urls,
+    cache: Optional[Cache] = None,
+    manifest: Optional[Manifest] = None,
+    lookahead: int = DEFAULT_LOOKAHEAD,
+) -> AsyncIterator[SubmissionWrapper]:
+    """
+    Yields at most amount number of SubmissionWrappers, created from posts from the given
+    source, as soon as each one's urls are found
+    :param cache: cache of urls that have been resolved on previous runs, if any
+    :param manifest: record of previous downloads; submissions that were completely
+    downloaded on a previous run are skipped, unless they can still be unsaved
+    :param lookahead: most posts to resolve at once
+    """
+    if amount < 1:
+        raise ValueError("Amount must be a positive integer")
+    if lookahead < 1:
+        raise ValueError("Lookahead must be a positive integer")
+    # resolve up to 2 * amount posts at once (but no more than the lookahead), and stop
+    #  taking posts from the source as soon as enough of them meet the criteria. The
+    #  source is read in another thread, since fetching each page of a listing blocks
+    async for wrapped in Pipeline(
+        Stage(
+            functools.partial(
+                resolve,
+                client=client,
+                dry=dry,
+                criteria=criteria,
+                cache=cache,
+                manifest=manifest,
+            ),
+            workers=min(2 * amount, lookahead),
+            limit=amount,
+            name="resolve",
+        )
+    ).stream(prefetch(source)):
+        yield wrapped
+
+
 async def _from_source(
     source: ListingGenerator,
     client: httpx.AsyncClient,
     amount: int = 10,
     dry: bool = True,
     criteria: Callable[[SubmissionWrapper], bool] = has_urls,
+    cache: Optional[Cache] = None,
+    manifest: Optional[Manifest] = None,
+    lookahead: int = DEFAULT_LOOKAHEAD,
 ) -> List[SubmissionWrapper]:
     """
     Returns a list containing at most amount number of SubmissionWrappers,
     created from posts from the given source
+    :param cache: cache of urls that have been resolved on previous runs, if any
+    :param manifest: record of previous downloads; submissions that were completely
+    downloaded on a previous run are skipped, unless they can still be unsaved
+    :param lookahead: most posts to resolve at once
     """
-    if amount < 1:
-        raise ValueError("Amount must be a positive integer")
-    # get batches of 2 * amount and filter out the ones that don't have urls
-    #  until we have enough. Worst case (for a single iteration) is that we only need 1
-    #  additional post to reach the desired amount but try_amount is large
-    try_amount = 2 * amount
-    batch: List[SubmissionWrapper] = []
-    exhausted = False
-    while (not exhausted) and len(batch) < amount:
-        prospective = [
-            SubmissionWrapper(submission, client, dry=dry)
-            for submission in itertools.islice(source, try_amount)
-        ]
-        # await all the urls
-        await asyncio.gather(
-            *(submission.find_urls(client) for submission in prospective)
+    return [
+        wrapped
+        async for wrapped in _iter_source(
+            source,
+            client,
+            amount=amount,
+            dry=dry,
+            criteria=criteria,
+            cache=cache,
+            manifest=manifest,
+            lookahead=lookahead,
         )
-        if len(prospective) <= try_amount:
-            exhausted = True
+    ]
+
+
+def _after(fullname: Optional[str]) -> dict:
+    """
+    :return: keyword arguments that make a listing start after the given submission
+    """
+    return {"params": {"after": fullname}} if fullname else dict()
+
 
-        batch += list(filter(criteria, prospective))
-    return batch[:amount]
+def saved_listing(
+    redditor: Redditor,
+    score: int = None,
+    age: timedelta = None,
+    after: Optional[str] = None,
+) -> ListingGenerator:
+    """
+    Returns a listing of all of the given user's saved posts
+    :param after: fullname of a saved post; if given, the listing starts after it
+    """
+    return redditor.saved(limit=None, score=score, age=age, **_after(after))
+
+
+def subreddit_listing(
+    reddit: praw.Reddit,
+    subreddit_name: str,
+    sort_by: SortOption,
+    score: int = None,
+    age: timedelta = None,
+    after: Optional[str] = None,
+) -> ListingGenerator:
+    """
+    Returns a listing of the given subreddit's posts, sorted in the given way
+    :param after: fullname of a post in the listing; if given, the listing starts after it
+    """
+    return sort_by(
+        reddit.subreddit(subreddit_name.removeprefix("r/")),
+        score=score,
+        age=age,
+        **_after(after),
+    )
 
 
 async def from_saved(
@@ -83,16 +199,20 @@ async def from_saved(
     amount: int = 10,
     dry: bool = True,
     criteria: Callable[[SubmissionWrapper], bool] = has_urls,
+    cache: Optional[Cache] = None,
+    manifest: Optional[Manifest] = None,
 ) -> List[SubmissionWrapper]:
     """Generates a batch of at most (amount) SubmissionWrappers from the given users' saved posts"""
     if amount < 1:
         raise ValueError("Amount must be a positive integer")
     return await _from_source(
-        redditor.saved(limit=None, score=score, age=age),
+        saved_listing(redditor, score=score, age=age),
         client,
         amount=amount,
         dry=dry,
         criteria=criteria,
+        cache=cache,
+        manifest=manifest,
     )
 
 
@@ -105,16 +225,81 @@ async def from_subreddit(
     age: timedelta = None,
     amount: int = 10,
     criteria: Callable[[SubmissionWrapper], bool] = has_urls,
+    cache: Optional[Cache] = None,
+    manifest: Optional[Manifest] = None,
 ) -> Iterable[SubmissionWrapper]:
     """Generates a batch of at most (amount) SubmissionWrappers from the given subreddit"""
     if amount < 1:
         raise ValueError("Amount must be a positive integer")
     return await _from_source(
-        sort_by(
-            reddit.subreddit(subreddit_name.removeprefix("r/")), score=score, age=age
-        ),
+        subreddit_listing(reddit, subreddit_name, sort_by, score=score, age=age),
+        client,
+        amount=amount,
+        dry=True,  # Can't/shouldn't unsave posts from subreddits
+        criteria=criteria,
+        cache=cache,
+        manifest=manifest,
+    )
+
+
+def iter_saved(
+    redditor: Redditor,
+    client: httpx.AsyncClient,
+    score: int = None,
+    age: timedelta = None,
+    amount: int = 10,
+    dry: bool = True,
+    criteria: Callable[[SubmissionWrapper], bool] = has_urls,
+    cache: Optional[Cache] = None,
+    manifest: Optional[Manifest] = None,
+    lookahead: int = DEFAULT_LOOKAHEAD,
+) -> AsyncIterator[SubmissionWrapper]:
+    """
+    Yields at most (amount) SubmissionWrappers from the given users' saved posts, as soon
+    as each one is ready
+    :param lookahead: most posts to resolve at once
+    """
+    if amount < 1:
+        raise ValueError("Amount must be a positive integer")
+    return _iter_source(
+        saved_listing(redditor, score=score, age=age),
+        client,
+        amount=amount,
+        dry=dry,
+        criteria=criteria,
+        cache=cache,
+        manifest=manifest,
+        lookahead=lookahead,
+    )
+
+
+def iter_subreddit(
+    reddit: praw.Reddit,
+    subreddit_name: str,
+    sort_by: SortOption,
+    client: httpx.AsyncClient,
+    score: int = None,
+    age: timedelta = None,
+    amount: int = 10,
+    criteria: Callable[[SubmissionWrapper], bool] = has_urls,
+    cache: Optional[Cache] = None,
+    manifest: Optional[Manifest] = None,
+    lookahead: int = DEFAULT_LOOKAHEAD,
+) -> AsyncIterator[SubmissionWrapper]:
+    """
+    Yields at most (amount) SubmissionWrappers from the given subreddit, as soon as each
+    one is ready
+    :param lookahead: most posts to resolve at once
+    """
+    if amount < 1:
+        raise ValueError("Amount must be a positive integer")
+    return _iter_source(
+        subreddit_listing(reddit, subreddit_name, sort_by, score=score, age=age),
         client,
         amount=amount,
         dry=True,  # Can't/shouldn't unsave posts from subreddits
         criteria=criteria,
+        cache=cache,
+        manifest=manifest,
+        lookahead=lookahead,
     )
@@ -1,3 +1,4 @@
+import functools
 from enum import Enum
 
 from praw.models.subreddits import Subreddit
@@ -33,3 +34,19 @@ class SortOption(Enum):
 
     def __call__(self, *args, **kwargs):
         self.value(*args, **kwargs)
+
+
+# the ways a subreddit's submissions can be sorted, by the name they're given on the
+#  command line and in sources files
+SORTS = {
+    "hot": Subreddit.hot,
+    "new": Subreddit.new,
+    "rising": Subreddit.rising,
+    "controversial": Subreddit.controversial,
+    "gilded": Subreddit.gilded,
+    "top": functools.partial(Subreddit.top, time_filter="all"),
+    **{
+        f"top_{period}": functools.partial(Subreddit.top, time_filter=period)
+        for period in ("hour", "day", "week", "month", "year")
+    },
+}
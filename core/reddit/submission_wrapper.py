@@ -1,62 +1,390 @@
 import asyncio
+import functools
+import hashlib
 import json
 import os
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Set, Tuple
+import sys
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
 
 import httpx
+import praw
+from praw.endpoints import API_PATH
 from praw.models import Submission
 
 import core
 from core import parsers
+from core.executor import SERIAL, CPUExecutor
+from core.filenames import FilenameIndex
+from core.manifest import DownloadRecord, Manifest
+from core.metrics import METRICS, Metrics
+from core.retry import RETRY_EXCEPTIONS, Backoff, retry
 
+# number of bytes of a download to hold in memory at once
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
-async def urls_responses(
-    urls: str, client: httpx.AsyncClient
-) -> Tuple[str, httpx.Response]:
-    return asyncio.gather(*((url, await client.get(url, timeout=10)) for url in urls))
+# names of the files in each download directory, shared by every SubmissionWrapper
+FILENAMES = FilenameIndex()
 
 
-@dataclass
+def _link_duplicate(
+    duplicate: DownloadRecord,
+    directory: str,
+    title: str,
+    link: bool = True,
+    filenames: FilenameIndex = FILENAMES,
+) -> Optional[DownloadRecord]:
+    """
+    Reuses a file that's already on disk instead of saving another copy of it
+    :param duplicate: the file that's already on disk
+    :param link: True to hardlink the file into the given directory under a name based on
+    the given title, False to just reuse the existing file
+    :return: the reused file, or None if it couldn't be linked
+    """
+    if not link:
+        return duplicate
+    extension = os.path.splitext(duplicate.path)[1]
+    while True:
+        filename = filenames.allocate(directory, title, extension)
+        destination = os.path.join(directory, filename)
+        try:
+            os.link(duplicate.path, destination)
+        except FileExistsError:
+            # another process took the name since the directory was listed
+            continue
+        except OSError:
+            # e.g. the file is on another drive, or the filesystem doesn't support
+            #  hardlinks
+            filenames.release(directory, filename)
+            return None
+        return DownloadRecord(destination, duplicate.size, duplicate.sha256)
+
+
+def _move_into_place(
+    path: str,
+    directory: str,
+    title: str,
+    extension: str,
+    filenames: FilenameIndex = FILENAMES,
+) -> str:
+    """
+    Moves the given file into the given directory, under a name based on the given title
+    that no other file has
+    :return: the file's new path
+    """
+    while True:
+        destination = os.path.join(
+            directory, filenames.allocate(directory, title, extension)
+        )
+        try:
+            # the index only knows about names taken when the directory was listed, and
+            #  unlike os.replace, linking fails rather than overwriting a file another
+            #  process made since. Either way, the file appears under its name whole
+            os.link(path, destination)
+        except FileExistsError:
+            continue
+        except OSError:
+            # e.g. the filesystem doesn't support hardlinks
+            if os.path.exists(destination):
+                continue
+            os.replace(path, destination)
+            return destination
+        os.remove(path)
+        return destination
+
+
+# suffix of the files that unfinished downloads are kept in, so they can be resumed
+PART_SUFFIX = ".part"
+
+
+class DownloadInterrupted(httpx.TransportError):
+    """
+    Raised when a response's body is cut off partway through. The request itself
+    succeeded (and was already retried by the client if it had to be), so trying again
+    resumes the download from its .part file rather than starting over
+    """
+
+
+# locks for the .part files being written to, so the same url isn't downloaded into the
+#  same file twice at once
+_PART_LOCKS: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _part_path(directory: str, url: str) -> str:
+    """
+    :return: the path of the file that the given url's unfinished download is kept in
+    """
+    return os.path.join(
+        directory, "." + hashlib.sha256(url.encode()).hexdigest()[:32] + PART_SUFFIX
+    )
+
+
+def _validator(response: httpx.Response) -> Optional[str]:
+    """
+    :return: the response's strong ETag, or its Last-Modified date if it has none, or
+    None if there's no way to tell whether a later response will have the same content
+    """
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        # ranges would count bytes of the encoded content, which isn't what's saved
+        return None
+    etag = response.headers.get("ETag")
+    if etag is not None and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def _load_part(path: str, url: str) -> Optional[Dict]:
+    """
+    :param path: the path of a .part file
+    :return: the url, expected length, validator and extension recorded for the .part
+    file along with its current size, or None if it doesn't hold a download of the given
+    url that can be resumed
+    """
+    try:
+        with open(path + ".json", encoding="utf-8") as file:
+            part = json.load(file)
+        part["size"] = os.path.getsize(path)
+    except (OSError, ValueError):
+        return None
+    if part.get("url") != url or part.get("validator") is None or part["size"] == 0:
+        return None
+    return part
+
+
+def _remove_part(path: str) -> None:
+    for leftover in (path, path + ".json"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+def _range_start(response: httpx.Response) -> Optional[int]:
+    """
+    :return: the first byte of the range the given 206 response holds, or None if it
+    doesn't say
+    """
+    content_range = response.headers.get("Content-Range", "")
+    unit, _, byte_range = content_range.partition(" ")
+    start = byte_range.partition("-")[0]
+    return int(start) if unit == "bytes" and start.isdigit() else None
+
+
+def _hash_file(path: str, chunk_size: int) -> Any:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            sha256.update(chunk)
+    return sha256
+
+
+def _sha256(path: str, chunk_size: int) -> str:
+    """:return: the sha256 hash of the given file, as hex"""
+    return _hash_file(path, chunk_size).hexdigest()
+
+
+async def _stream_to_part(
+    url: str,
+    path: str,
+    client: httpx.AsyncClient,
+    chunk_size: int,
+    executor: CPUExecutor = SERIAL,
+) -> Optional[Tuple[str, int, str]]:
+    """
+    Streams the given url into the given .part file. If an earlier attempt left part of
+    the file behind, only the rest of it is requested, as long as the server supports
+    ranges and the file hasn't changed since. If the server can't send the rest of it,
+    the file is requested again from the start
+    :param executor: where to hash the file. If it runs jobs in other processes, the
+    file is hashed there once it's complete, instead of chunk by chunk as it arrives
+    :return: the file's extension, size and sha256 hash, or None if the download failed
+    """
+    part = _load_part(path, url)
+    if part is not None and part["size"] == part["length"]:
+        # an earlier attempt got the whole file, but stopped before it was moved
+        os.remove(path + ".json")
+        return (
+            part["extension"],
+            part["size"],
+            await executor.run(_sha256, path, chunk_size),
+        )
+
+    headers = dict()
+    if part is not None:
+        headers = {"Range": f"bytes={part['size']}-", "If-Range": part["validator"]}
+
+    restart = False
+    async with client.stream("GET", url, headers=headers, timeout=10) as response:
+        if (
+            response.status_code == 206
+            and part is not None
+            and _range_start(response) == part["size"]
+        ):
+            mode = "ab"
+            sha256 = None if executor.parallel else _hash_file(path, chunk_size)
+            size = part["size"]
+        elif response.status_code == 200:
+            # the server sent the whole file, so anything left behind is out of date
+            mode = "wb"
+            sha256 = None if executor.parallel else hashlib.sha256()
+            size = 0
+            validator = _validator(response)
+            length = response.headers.get("Content-Length", "")
+            part = {
+                "url": url,
+                "length": int(length) if validator and length.isdigit() else None,
+                "validator": validator,
+                "extension": core.get_extension(response),
+            }
+            with open(path + ".json", "w", encoding="utf-8") as file:
+                json.dump(part, file)
+        elif part is not None and response.status_code in (206, 416):
+            # the server can't send the rest of the .part file (or sent a different
+            #  range of it), so start over without it
+            restart = True
+        else:
+            return None
+
+        if not restart:
+            with open(path, mode) as file:
+                try:
+                    async for chunk in response.aiter_bytes(chunk_size):
+                        file.write(chunk)
+                        if sha256 is not None:
+                            sha256.update(chunk)
+                        size += len(chunk)
+                except BaseException as e:
+                    if part["validator"] is None:
+                        # the next attempt can't tell if it would get the same file, so
+                        #  it has to start over anyway
+                        file.close()
+                        _remove_part(path)
+                    if isinstance(e, RETRY_EXCEPTIONS):
+                        raise DownloadInterrupted(
+                            f"Download of {url} was interrupted after {size} bytes: {e!r}"
+                        ) from e
+                    raise
+
+    if restart:
+        _remove_part(path)
+        return await _stream_to_part(url, path, client, chunk_size, executor)
+    if part["length"] is not None and size != part["length"]:
+        raise DownloadInterrupted(
+            f"Expected {part['length']} bytes from {url}, got {size}"
+        )
+    os.remove(path + ".json")
+    if sha256 is None:
+        return part["extension"], size, await executor.run(_sha256, path, chunk_size)
+    return part["extension"], size, sha256.hexdigest()
+
+
+async def _download(
+    url: str,
+    directory: str,
+    title: str,
+    client: httpx.AsyncClient,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    manifest: Optional[Manifest] = None,
+    link_duplicates: bool = True,
+    filenames: FilenameIndex = FILENAMES,
+    executor: CPUExecutor = SERIAL,
+) -> Optional[DownloadRecord]:
+    """
+    Streams the given url into a .part file in the given directory, then moves it to its
+    final name once the download is complete. If the download is interrupted, the .part
+    file is kept so that the next attempt (or the next run) can resume it
+    :param manifest: record of previous downloads; if the url or its content has
+    already been downloaded, that file is reused instead of saving another copy
+    :param link_duplicates: True to hardlink reused files into the given directory,
+    False to skip them
+    :param filenames: index of the names already taken in the given directory
+    :param executor: where to hash the downloaded file
+    :return: the file the url was downloaded to, or None if the download failed
+    """
+    if manifest is not None and (duplicate := manifest.find_url(url)) is not None:
+        if linked := _link_duplicate(
+            duplicate, directory, title, link_duplicates, filenames
+        ):
+            return linked
+
+    path = _part_path(directory, url)
+    async with _PART_LOCKS.setdefault(path, asyncio.Lock()):
+        if (
+            downloaded := await _stream_to_part(url, path, client, chunk_size, executor)
+        ) is None:
+            return None
+        extension, size, sha256 = downloaded
+
+        if (
+            manifest is not None
+            and (duplicate := manifest.find_content(sha256)) is not None
+            and (
+                linked := _link_duplicate(
+                    duplicate, directory, title, link_duplicates, filenames
+                )
+            )
+        ):
+            os.remove(path)
+            return linked
+
+        destination = _move_into_place(path, directory, title, extension, filenames)
+    return DownloadRecord(destination, size, sha256)
+
+
+@dataclass(slots=True)
 class SubmissionWrapper:
-    """Wraps Submission objects to provide extra functionality"""
+    """
+    Wraps Submission objects to provide extra functionality. Only the fields PaperScraper
+    uses are copied out of the submission, so the submission itself (and everything PRAW
+    fetched with it) can be freed as soon as it's wrapped
+    """
 
-    _submission: Submission
+    id: str
+    fullname: str
     title: str
     subreddit: str
     url: str
     author: str
     nsfw: bool
     score: int
-    # created_utc: ???
+    created_utc: float
     urls: Set[str]
-    response: httpx.Response
     can_unsave: bool
+    # the reddit instance the submission came from, shared by every submission, to
+    #  unsave it with
+    _reddit: praw.Reddit = field(compare=False, repr=False)
 
     def __init__(
         self, submission: Submission, client: httpx.AsyncClient, dry: bool = True
     ):
-        self._submission = submission
-
         # relevant to user
+        self.id = submission.id
+        self.fullname = submission.fullname
         self.title = submission.title
-        self.subreddit = str(submission.subreddit)
+        # the same few subreddits and authors come up again and again, so share them
+        self.subreddit = sys.intern(str(submission.subreddit))
         self.url = submission.url
-        self.author = str(submission.author)
+        self.author = sys.intern(str(submission.author))
         self.nsfw = submission.over_18
         self.score = submission.score
         self.created_utc = submission.created_utc
         self.urls = set()
 
-        # relevant to parsing
-        self.base_file_title = core.retitle(self._submission.title)
-        self.response: httpx.Response = None
-
         # whether this post can be unsaved or not
         self.can_unsave = not dry
+        self._reddit = submission._reddit
 
-    async def find_urls(self, client: httpx.AsyncClient) -> None:
-        self.urls = await parsers.find_urls(self.url, client)
+    @property
+    def base_file_title(self) -> str:
+        """This post's title, made safe to use as a filename"""
+        return core.retitle(self.title)
+
+    async def find_urls(
+        self, client: httpx.AsyncClient, cache: Optional[core.Cache] = None
+    ) -> None:
+        self.urls = await parsers.find_urls(self.url, client, cache=cache)
 
     async def download_all(
         self,
@@ -64,6 +392,13 @@ class SubmissionWrapper:
         client: httpx.AsyncClient,
         title: str = None,
         organize: bool = False,
+        chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+        manifest: Optional[Manifest] = None,
+        link_duplicates: bool = True,
+        filenames: FilenameIndex = FILENAMES,
+        backoff: Backoff = Backoff(),
+        metrics: Metrics = METRICS,
+        executor: CPUExecutor = SERIAL,
     ) -> Dict[str, Optional[str]]:
         """
         Downloads all urls and bundles them with their results
@@ -71,6 +406,17 @@ class SubmissionWrapper:
         :client: the httpx.AsyncClient to use for downloading
         :param title: title that the final file should have
         :param organize: whether or not to organize the download directory by subreddit
+        :param chunk_size: number of bytes of each file to hold in memory at a time
+        :param manifest: record of previous downloads; urls that are recorded there and
+        still on disk aren't downloaded again, and files that were already downloaded for
+        another submission aren't saved twice
+        :param link_duplicates: True to hardlink files that were already downloaded for
+        another submission into the download directory, False to skip them
+        :param filenames: index of the names already taken in each download directory
+        :param backoff: how many times to try each download if its body is cut off partway
+        :param metrics: where to record how long each download takes, and how it went
+        :param executor: where to run CPU-bound work on each downloaded file, like
+        hashing it
         :return: a dictionary where the keys are this submission's urls and the values are the
         filepaths to which those images were downloaded or None if the download failed
         """
@@ -82,50 +428,69 @@ class SubmissionWrapper:
         os.makedirs(directory, exist_ok=True)
         if not title:
             title = self.title
-        urls_filepaths: Dict[str, Optional[str]] = dict()
-        filename = title + core.get_extension(self.response)
 
-        async def zip_result(url: str) -> Tuple[str, httpx.Response]:
-            return (url, await client.get(url, timeout=10))
+        async def zip_result(url: str) -> Tuple[str, Optional[str]]:
+            if manifest is not None:
+                previous = manifest.get(self.id, url)
+                if previous is not None and previous.exists():
+                    metrics.increment("downloads_total", outcome="reused")
+                    return (url, previous.path)
+            host = urlsplit(url).hostname or ""
+            with metrics.time("download", host=host):
+                # the client retries failed requests, so only errors partway through a
+                #  body are tried again here
+                download = await retry(
+                    functools.partial(
+                        _download,
+                        url,
+                        directory,
+                        title,
+                        client,
+                        chunk_size,
+                        manifest=manifest,
+                        link_duplicates=link_duplicates,
+                        filenames=filenames,
+                        executor=executor,
+                    ),
+                    backoff,
+                    exceptions=(DownloadInterrupted,),
+                )
+            if download is None:
+                metrics.increment("downloads_total", outcome="failed")
+                return (url, None)
+            metrics.increment("downloads_total", outcome="saved")
+            metrics.increment("download_bytes_total", download.size, host=host)
+            if manifest is not None:
+                manifest.record(self.id, url, download)
+            return (url, download.path)
 
-        urls_responses: List[Tuple[str, Optional[httpx.Response]]] = (
+        urls_filepaths: Dict[str, Optional[str]] = dict(
             await asyncio.gather(*(zip_result(url) for url in self.urls))
         )
-
-        offset = 0
-        for url, response in urls_responses:
-            if response is None or response.status_code != 200:
-                urls_filepaths[url] = None
-                continue
-
-            # Determine filename
-            while filename in os.listdir(directory):
-                offset += 1
-                filename = f"{title} ({offset}){core.get_extension(self.response)}"
-
-            destination = os.path.join(directory, filename)
-            with open(destination, "wb") as image_file:
-                image_file.write(response.content)
-            urls_filepaths[url] = destination
-
+        if manifest is not None and None not in urls_filepaths.values():
+            manifest.complete(self.id)
         return urls_filepaths
 
+    def log_record(self, exception: str = "") -> Dict[str, Any]:
+        """
+        :param exception: the exception that was raised while handling this post, if any
+        :return: a JSON serializable summary of this post for the log
+        """
+        return {
+            "title": self.title,
+            "id": self.id,
+            "url": self.url,
+            "recognized_urls": sorted(self.urls),
+            "exception": exception,
+        }
+
     def log(self, file: str, exception: str = "") -> None:
         """
-        Writes the given post's title and url to the specified file
+        Writes the given post's title and url to the specified file, as a line of JSON
         :param file: log file path
         """
         with open(file, "a", encoding="utf-8") as logfile:
-            json.dump(
-                {
-                    "title": self._submission.title,
-                    "id": self._submission.id,
-                    "url": self._submission.url,
-                    "recognized_urls": self.urls,
-                    "exception": exception,
-                },
-                logfile,
-            )
+            logfile.write(json.dumps(self.log_record(exception)) + "\n")
 
     def __str__(self) -> str:
         """
@@ -138,7 +503,10 @@ class SubmissionWrapper:
 
     def summary_string(self) -> str:
         """Generates a string that summarizes this post"""
-        return self.format("%t\n   r/%s\n   %u\n   Saved %p / %f image(s) so far.")
+        return (
+            f"{self.title}\n   r/{self.subreddit}\n   {self.url}\n"
+            f"   Found {len(self.urls)} image(s)."
+        )
 
     def unsave(self, force=False) -> bool:
         """
@@ -147,6 +515,7 @@ class SubmissionWrapper:
         :return: True if the submission was unsaved, else False
         """
         if force or self.can_unsave:
-            self._submission.unsave()
+            # the same request Submission.unsave makes, without needing the submission
+            self._reddit.post(API_PATH["unsave"], data={"id": self.fullname})
             return True
         return False
@@ -0,0 +1,127 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+# responses that mean the same request might succeed if it's sent again later
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# requests that have the same effect no matter how many times they're sent
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# errors that might not happen again, like timeouts and dropped connections
+RETRY_EXCEPTIONS = (
+    httpx.TimeoutException,
+    httpx.NetworkError,
+    httpx.RemoteProtocolError,
+)
+
+
+@dataclass(frozen=True)
+class Backoff:
+    """
+    How many times to try something, and how long to wait between tries
+    :param attempts: the most times to try, including the first
+    :param base: seconds to wait (at most) after the first try. This doubles after
+    each try that fails
+    :param cap: the most seconds to wait between tries
+    """
+
+    attempts: int = 4
+    base: float = 0.5
+    cap: float = 30
+
+    def __post_init__(self):
+        if self.attempts < 1:
+            raise ValueError("Attempts must be a positive integer")
+
+    def delay(self, attempt: int) -> float:
+        """
+        :param attempt: the number of tries that have failed so far, minus one
+        :return: a random number of seconds to wait before trying again, so that clients
+        that failed at the same time don't all try again at the same time
+        """
+        return random.uniform(0, min(self.cap, self.base * 2**attempt))
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    :return: the number of seconds the given response says to wait before trying again,
+    or None if it doesn't say
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+async def retry(
+    function: Callable[[], Awaitable[T]],
+    backoff: Backoff = Backoff(),
+    exceptions: Tuple[Type[BaseException], ...] = RETRY_EXCEPTIONS,
+) -> T:
+    """
+    Calls the given coroutine function until it doesn't raise a transient network error
+    :param exceptions: the errors that are worth trying again after
+    :return: whatever the function returned
+    """
+    for attempt in range(backoff.attempts - 1):
+        try:
+            return await function()
+        except exceptions:
+            await asyncio.sleep(backoff.delay(attempt))
+    return await function()
+
+
+class Retrier(httpx.AsyncBaseTransport):
+    """
+    An httpx transport that sends idempotent requests again when they fail with an
+    error or response that might not happen the second time. Retry-After headers are
+    honoured
+    """
+
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        backoff: Backoff = Backoff(),
+    ):
+        """
+        :param transport: the transport that sends each try
+        :param backoff: how many times to try each request, and how long to wait between
+        """
+        self._transport = transport or httpx.AsyncHTTPTransport()
+        self.backoff = backoff
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method not in IDEMPOTENT_METHODS:
+            return await self._transport.handle_async_request(request)
+
+        for attempt in range(self.backoff.attempts - 1):
+            try:
+                response = await self._transport.handle_async_request(request)
+            except RETRY_EXCEPTIONS:
+                await asyncio.sleep(self.backoff.delay(attempt))
+                continue
+            wait = retry_after(response) or 0
+            # if the server wants us to wait longer than we're willing to, give up now
+            if response.status_code not in RETRY_STATUSES or wait > self.backoff.cap:
+                return response
+            delay = max(self.backoff.delay(attempt), wait)
+            await response.aclose()
+            await asyncio.sleep(delay)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
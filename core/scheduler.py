@@ -0,0 +1,94 @@
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import httpx
+
+DEFAULT_LIMIT = 32
+DEFAULT_HOST_LIMIT = 8
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Wraps a response body so that a callback runs once the body is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class Scheduler(httpx.AsyncBaseTransport):
+    """
+    An httpx transport that limits how many requests are in flight at once, both in
+    total and to each host. Requests over either limit wait for an earlier request to
+    finish, and a request only finishes once its response body has been closed, so
+    streamed downloads hold their slot until they're done
+    """
+
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        limit: int = DEFAULT_LIMIT,
+        host_limit: int = DEFAULT_HOST_LIMIT,
+        host_limits: Optional[Dict[str, int]] = None,
+    ):
+        """
+        :param transport: the transport that sends requests once they're scheduled
+        :param limit: the most requests that can be in flight at once
+        :param host_limit: the most requests that can be in flight to one host at once
+        :param host_limits: limits for specific hosts that override host_limit
+        """
+        if limit < 1 or host_limit < 1:
+            raise ValueError("Limits must be positive integers")
+        self._transport = transport or httpx.AsyncHTTPTransport()
+        self._limit = asyncio.Semaphore(limit)
+        self.host_limit = host_limit
+        self.host_limits = host_limits or dict()
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = dict()
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(
+                self.host_limits.get(host, self.host_limit)
+            )
+        return self._host_semaphores[host]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host_semaphore = self._host_semaphore(request.url.host)
+        # always acquired host first, so a request waiting on a busy host doesn't hold
+        #  up requests to other hosts
+        await host_semaphore.acquire()
+        try:
+            await self._limit.acquire()
+        except BaseException:
+            host_semaphore.release()
+            raise
+
+        def release() -> None:
+            self._limit.release()
+            host_semaphore.release()
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
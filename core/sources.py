@@ -0,0 +1,105 @@
+import shlex
+from dataclasses import dataclass, replace
+from typing import Iterable, List, Optional
+
+from core.reddit.sortoption import SORTS
+
+# the name of the source that holds the signed in user's saved posts
+SAVED = "saved"
+
+DEFAULT_SORT = "hot"
+DEFAULT_POST_LIMIT = 1000
+
+
+@dataclass(frozen=True)
+class Source:
+    """
+    A listing to take posts from during a run, and how to take them
+    :param name: "saved" for the signed in user's saved posts, or "r/<subreddit>"
+    :param sortby: how to sort the subreddit's posts; ignored for saved posts
+    :param limit: most posts to download from this source
+    :param karma: least score a post must have to be downloaded, if any
+    """
+
+    name: str
+    sortby: str = DEFAULT_SORT
+    limit: int = DEFAULT_POST_LIMIT
+    karma: Optional[int] = None
+
+    def __post_init__(self):
+        if self.name != SAVED and not self.name.startswith("r/"):
+            raise ValueError(
+                f'Expected source to be "{SAVED}" or a subreddit beginning with "r/", '
+                f"got {self.name}"
+            )
+        if self.sortby not in SORTS:
+            raise ValueError(f"Unknown sort {self.sortby!r}")
+        if self.limit < 1:
+            raise ValueError("Limit must be a positive integer")
+
+    @property
+    def is_subreddit(self) -> bool:
+        return self.name != SAVED
+
+    @property
+    def key(self) -> str:
+        """Identifies this source's listing, e.g. "saved" or "r/pics/top_week" """
+        return f"{self.name}/{self.sortby}" if self.is_subreddit else self.name
+
+
+def parse_source(line: str, defaults: Source = Source(SAVED)) -> Source:
+    """
+    Parses a source from a line like "r/pics sortby=top_week limit=50 karma=100"
+    :param defaults: where the options that aren't given on the line are taken from
+    :raises ValueError: if the line isn't a valid source
+    """
+    name, *options = shlex.split(line)
+    source = replace(defaults, name=name.lower())
+    for option in options:
+        key, separator, value = option.partition("=")
+        if not separator:
+            raise ValueError(f"Expected an option like key=value, got {option!r}")
+        if key == "sortby":
+            source = replace(source, sortby=value.lower())
+        elif key == "limit":
+            source = replace(source, limit=int(value))
+        elif key == "karma":
+            source = replace(source, karma=int(value))
+        else:
+            raise ValueError(f"Unknown option {key!r}")
+    return source
+
+
+def parse_sources(
+    lines: Iterable[str], defaults: Source = Source(SAVED)
+) -> List[Source]:
+    """
+    Parses one source from each line. Blank lines and lines starting with # are skipped
+    :param defaults: where the options that aren't given on a line are taken from
+    :raises ValueError: if a line isn't a valid source, or a source is given twice
+    """
+    sources: List[Source] = []
+    for number, line in enumerate(lines, start=1):
+        if not (line := line.strip()) or line.startswith("#"):
+            continue
+        try:
+            sources.append(parse_source(line, defaults))
+        except ValueError as e:
+            raise ValueError(f"Line {number}: {e}") from e
+    check_unique(sources)
+    return sources
+
+
+def read_sources(path: str, defaults: Source = Source(SAVED)) -> List[Source]:
+    """Parses the sources in the given file, one per line"""
+    with open(path, encoding="utf-8") as file:
+        return parse_sources(file, defaults)
+
+
+def check_unique(sources: Iterable[Source]) -> None:
+    """:raises ValueError: if the same listing is given more than once"""
+    seen = set()
+    for source in sources:
+        if source.key in seen:
+            raise ValueError(f"Source {source.key} was given more than once")
+        seen.add(source.key)
@@ -0,0 +1,180 @@
+import asyncio
+from collections import Counter
+from typing import AsyncIterator, Iterable, Optional, Set, Tuple
+
+import httpx
+from praw.models import Submission
+
+from core.cache import Cache
+from core.journal import DOWNLOADED, FINISHED, RESOLVED, SKIPPED, UNSAVED, Journal
+from core.logsink import LogSink
+from core.manifest import Manifest
+from core.metrics import METRICS, Metrics
+from core.reddit import SubmissionWrapper, resolve
+from core.sources import Source
+
+
+def resolved_counts(
+    journal: Journal, sources: Iterable[Source], resuming: bool = False
+) -> Counter:
+    """
+    :param resuming: True if the journaled run is being resumed, so the posts it
+    resolved still count towards each source's limit
+    :return: the number of posts resolved from each source so far
+    """
+    if not resuming:
+        return Counter()
+    return Counter(
+        {source.key: journal.count(RESOLVED, source.key) for source in sources}
+    )
+
+
+async def journaled(
+    submissions: AsyncIterator[Submission],
+    journal: Journal,
+    source: Source,
+    resolved: Counter,
+) -> AsyncIterator[Tuple[Source, Submission]]:
+    """
+    Records each submission in the journal as it's taken from the given source, and
+    stops taking new ones once enough of the source's posts were resolved. Submissions
+    that come up more than once (e.g. an unfinished post that's still saved) are only
+    taken the first time
+    :param resolved: number of posts resolved from each source so far
+    """
+    taken: Set[str] = set()
+    try:
+        async for submission in submissions:
+            if resolved[source.key] >= source.limit and not journal.reached(
+                submission.fullname, RESOLVED
+            ):
+                # posts that were resolved on a run that's being resumed already count
+                #  towards the limit, so they're still taken
+                return
+            if submission.fullname in taken:
+                continue
+            taken.add(submission.fullname)
+            journal.seen(submission.fullname, source.key)
+            yield source, submission
+    finally:
+        await submissions.aclose()
+
+
+async def resolve_post(
+    item: Tuple[Source, Submission],
+    client: httpx.AsyncClient,
+    resolved: Counter,
+    cache: Optional[Cache],
+    manifest: Optional[Manifest],
+    journal: Journal,
+    dry: bool = True,
+) -> Optional[Tuple[SubmissionWrapper, str]]:
+    """
+    Finds the given submission's urls, unless it finished on a run that's being resumed,
+    or enough posts were already resolved from its source
+    :param resolved: number of posts resolved from each source so far
+    :param dry: True to leave saved posts saved
+    :return: the wrapped submission and an empty exception, or None if it doesn't need
+    to go any further
+    """
+    source, submission = item
+    if journal.reached(submission.fullname, FINISHED):
+        return None
+    # a post resolved on a run that's being resumed was already counted
+    counted = journal.reached(submission.fullname, RESOLVED)
+    if not counted and resolved[source.key] >= source.limit:
+        # left unfinished, so a resumed run with a higher limit picks it up
+        return None
+    if source.karma is not None and submission.score < source.karma:
+        journal.record(submission.fullname, SKIPPED)
+        return None
+    if journal.reached(submission.fullname, DOWNLOADED):
+        # it's in the manifest, but still has to be unsaved and reported
+        manifest = None
+    # Can't/shouldn't unsave posts from subreddits
+    dry = True if source.is_subreddit else dry
+    wrapped = await resolve(submission, client, dry=dry, cache=cache, manifest=manifest)
+    if wrapped is None:
+        journal.record(submission.fullname, SKIPPED)
+        return None
+    if not counted:
+        if resolved[source.key] >= source.limit:
+            # other posts from the same source filled its limit while this one was
+            #  resolved
+            return None
+        resolved[source.key] += 1
+        journal.record(submission.fullname, RESOLVED)
+    return wrapped, ""
+
+
+def resolve_failed(
+    item: Tuple[Source, Submission], error: Exception, client: httpx.AsyncClient
+) -> Tuple[SubmissionWrapper, str]:
+    """
+    Turns an exception raised while resolving a submission into its result, so the rest
+    of the run carries on. It isn't recorded as finished, so a resumed run tries again
+    :return: the wrapped submission, without any urls, and the exception
+    """
+    _, submission = item
+    return SubmissionWrapper(submission, client), str(error)
+
+
+def failed(
+    result: Tuple[SubmissionWrapper, str], error: Exception
+) -> Tuple[SubmissionWrapper, str]:
+    """Turns an exception raised while handling a submission into its result"""
+    wrapped, _ = result
+    return wrapped, str(error)
+
+
+async def unsave(
+    result: Tuple[SubmissionWrapper, str],
+    journal: Optional[Journal] = None,
+    metrics: Metrics = METRICS,
+) -> Tuple[SubmissionWrapper, str]:
+    """Unsaves the given submission if it was downloaded without any exceptions"""
+    wrapped, exception = result
+    if exception or (
+        journal is not None and journal.reached(wrapped.fullname, UNSAVED)
+    ):
+        return wrapped, exception
+    if wrapped.can_unsave:
+        try:
+            with metrics.time("unsave"):
+                # PRAW is synchronous, so unsave in another thread to keep downloads going
+                await asyncio.to_thread(wrapped.unsave)
+        except Exception as e:
+            return wrapped, str(e)
+    if journal is not None:
+        journal.record(wrapped.fullname, UNSAVED)
+    return wrapped, exception
+
+
+async def report(
+    result: Tuple[SubmissionWrapper, str],
+    log_sink: Optional[LogSink] = None,
+    journal: Optional[Journal] = None,
+) -> str:
+    """
+    Logs the given submission and summarizes what happened to it. It's only recorded as
+    finished if nothing went wrong, so a resumed run tries it again otherwise
+    """
+    wrapped, exception = result
+    if not exception:
+        try:
+            summary = wrapped.summary_string()
+        except Exception as e:
+            exception = str(e)
+    if log_sink is not None:
+        await log_sink.log(wrapped.log_record(exception))
+    if journal is not None and not exception:
+        journal.record(wrapped.fullname, FINISHED)
+    if exception:
+        return f"Encountered exception parsing {wrapped.url}:\n{exception}"
+    return summary
+
+
+def report_failed(result: Tuple[SubmissionWrapper, str], error: Exception) -> str:
+    """Summarizes a submission that couldn't be reported"""
+    wrapped, _ = result
+    return f"Encountered exception parsing {wrapped.url}:\n{error}"
@@ -1,36 +1,220 @@
 import argparse
 import asyncio
+import cProfile
+import functools
 import getpass
+import itertools
 import os
-from typing import Iterable
+from dataclasses import replace
+from typing import List, Optional, Tuple
 
 import httpx
+import praw
 from dotenv import load_dotenv
+from praw.models import ListingGenerator
 
-from core import SortOption, sign_in
-from core.reddit import SubmissionWrapper, from_saved, from_subreddit
+from core import Cache, Scheduler, parsers, sign_in
+from core.executor import SERIAL, CPUExecutor
+from core.governor import Governor
+from core.journal import DOWNLOADED, Journal
+from core.logsink import LogSink
+from core.manifest import Manifest
+from core.metrics import METRICS, Recorder
+from core.pipeline import Pipeline, Stage, interleave, prefetch
+from core.profiling import DEFAULT_THRESHOLD, StallMonitor
+from core.reddit import SubmissionWrapper, saved_listing, subreddit_listing
+from core.reddit.sortoption import SORTS
+from core.reddit.submission_wrapper import DOWNLOAD_CHUNK_SIZE
+from core.retry import Backoff, Retrier
+from core.scheduler import DEFAULT_HOST_LIMIT, DEFAULT_LIMIT
+from core.sources import (
+    DEFAULT_POST_LIMIT,
+    DEFAULT_SORT,
+    SAVED,
+    Source,
+    check_unique,
+    read_sources,
+)
+from core.stages import (
+    failed,
+    journaled,
+    report,
+    report_failed,
+    resolve_failed,
+    resolve_post,
+    resolved_counts,
+    unsave,
+)
 
 LOG_PATH = os.path.join("Logs", "log.txt")
+CACHE_PATH = os.path.join("Cache", "cache.sqlite3")
+MANIFEST_PATH = os.path.join("Cache", "manifest.sqlite3")
+JOURNAL_PATH = os.path.join("Cache", "journal.sqlite3")
+METRICS_JSON_PATH = os.path.join("Logs", "metrics.json")
+METRICS_PROMETHEUS_PATH = os.path.join("Logs", "metrics.prom")
+STALLS_PATH = os.path.join("Logs", "stalls.json")
+PROFILE_PATH = os.path.join("Logs", "profile.pstats")
 
 
-async def main() -> None:
+async def main(sources: List[Source]) -> None:
     """Scrapes and downloads any images from posts in the user's saved posts category on Reddit"""
 
     os.makedirs(args.directory, exist_ok=True)
     os.chdir(args.directory)
 
-    async with httpx.AsyncClient() as client:
-        batch = await get_source(client)
-        results = await asyncio.gather(
-            handle_wrapped(wrapped, client) for wrapped in batch
+    monitor = StallMonitor(args.profile) if args.profile else None
+    if monitor is not None:
+        monitor.start()
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        await scrape(sources)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(os.path.dirname(PROFILE_PATH), exist_ok=True)
+            profiler.dump_stats(PROFILE_PATH)
+        if monitor is not None:
+            monitor.stop()
+            monitor.write(STALLS_PATH)
+
+
+async def scrape(sources: List[Source]) -> None:
+    """Runs every post from every source through the pipeline"""
+    cache = None if args.nocache else Cache(CACHE_PATH)
+    manifest = None if args.redownload else Manifest(MANIFEST_PATH)
+    journal = Journal(JOURNAL_PATH)
+    # files are hashed as they're downloaded unless there are processes to hash them in
+    executor = CPUExecutor(args.cpuworkers)
+    resuming = journal.begin(
+        ",".join(source.key for source in sources), resume=args.resume
+    )
+    scheduler = Scheduler(
+        # requests are timed once they've been scheduled, so waiting for a connection
+        #  doesn't count towards a host's latency
+        Recorder(),
+        limit=args.connections,
+        host_limit=args.hostconnections,
+        host_limits=parsers.HOST_LIMITS,
+    )
+    # requests wait for their API's rate limit before they take up a connection
+    governor = Governor(scheduler, parsers.RATE_LIMITS)
+    # each retry waits for its API's rate limit again
+    retrier = Retrier(governor, Backoff(attempts=args.attempts))
+    # every source shares one client, and so one set of connections and rate limits
+    async with httpx.AsyncClient(transport=retrier) as client:
+        reddit = sign_in_for(sources)
+        # number of posts resolved from each source so far, including on the run that's
+        #  being resumed
+        resolved = resolved_counts(journal, sources, resuming)
+        streams = []
+        for source in sources:
+            # finished posts drop out of the saved listing once they're unsaved, and
+            #  reddit returns nothing after a post that isn't in the listing anymore,
+            #  so saved posts are always taken from the top
+            cursor = (
+                journal.cursor(source.key) if resuming and source.is_subreddit else None
+            )
+            listing = get_listing(reddit, source, after=cursor)
+            # posts that were still in progress when the last run stopped go first
+            unfinished = journal.unfinished(source.key) if resuming else []
+            submissions = itertools.chain(
+                reddit.info(fullnames=unfinished) if unfinished else (), listing
+            )
+            streams.append(journaled(prefetch(submissions), journal, source, resolved))
+        # records are written in the background, and whatever's queued is still written
+        #  if the run stops early
+        log_sink = LogSink(LOG_PATH) if args.logging else None
+        if log_sink is not None:
+            log_sink.start()
+        reporter = (
+            asyncio.create_task(
+                METRICS.write_every(
+                    args.metricsinterval, METRICS_JSON_PATH, METRICS_PROMETHEUS_PATH
+                )
+            )
+            if args.metricsinterval
+            else None
         )
+        # each post moves on to the next stage as soon as it's ready, so downloads start
+        #  while later posts are still being resolved
+        try:
+            results = await Pipeline(
+                Stage(
+                    functools.partial(
+                        resolve_post,
+                        client=client,
+                        resolved=resolved,
+                        cache=cache,
+                        manifest=manifest,
+                        journal=journal,
+                        dry=args.dry,
+                    ),
+                    workers=args.resolvers,
+                    name="resolve",
+                    errors=functools.partial(resolve_failed, client=client),
+                ),
+                Stage(
+                    functools.partial(
+                        download,
+                        client=client,
+                        manifest=manifest,
+                        journal=journal,
+                        executor=executor,
+                    ),
+                    workers=args.downloaders,
+                    name="download",
+                    errors=failed,
+                ),
+                Stage(
+                    functools.partial(unsave, journal=journal),
+                    workers=args.unsavers,
+                    name="unsave",
+                    errors=failed,
+                ),
+                Stage(
+                    functools.partial(report, log_sink=log_sink, journal=journal),
+                    name="report",
+                    errors=report_failed,
+                ),
+                # each source takes turns, so a long listing can't starve the others
+            ).run(interleave(*streams))
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            executor.close()
+            METRICS.write(METRICS_JSON_PATH, METRICS_PROMETHEUS_PATH)
+            if cache is not None:
+                cache.close()
+            if manifest is not None:
+                manifest.close()
+            journal.close()
+            # last, since it raises whatever stopped the log from being written, and
+            #  everything else still has to be cleaned up
+            if log_sink is not None:
+                await log_sink.close()
 
     for i, result in enumerate(results):
         print(f"({i}) {result}")
 
 
-async def handle_wrapped(wrapped: SubmissionWrapper, client: httpx.AsyncClient) -> str:
-    exception = ""
+async def download(
+    result: Tuple[SubmissionWrapper, str],
+    client: httpx.AsyncClient,
+    manifest: Optional[Manifest] = None,
+    journal: Optional[Journal] = None,
+    executor: CPUExecutor = SERIAL,
+) -> Tuple[SubmissionWrapper, str]:
+    """
+    Downloads all of the given submission's urls
+    :return: the submission, and the exception that was raised while downloading it (if any)
+    """
+    wrapped, exception = result
+    if exception or (
+        journal is not None and journal.reached(wrapped.fullname, DOWNLOADED)
+    ):
+        return wrapped, exception
     try:
         download_dir = "" if not args.organize else wrapped.subreddit
         await wrapped.download_all(
@@ -38,44 +222,55 @@ async def handle_wrapped(wrapped: SubmissionWrapper, client: httpx.AsyncClient)
             client,
             title=args.title,
             organize=args.organize,
+            chunk_size=args.chunksize,
+            manifest=manifest,
+            link_duplicates=not args.skipduplicates,
+            backoff=Backoff(attempts=args.attempts),
+            executor=executor,
         )
-        if wrapped.can_unsave:
-            wrapped.unsave()
-        return wrapped.summary_string()
     except Exception as e:
-        exception = str(e)
-        return f"Encountered exception parsing {wrapped.url}:\n{exception}"
-    finally:
-        if args.logging:
-            wrapped.log(LOG_PATH, exception=exception)
+        return wrapped, str(e)
+    if journal is not None:
+        journal.record(wrapped.fullname, DOWNLOADED)
+    return wrapped, ""
 
 
-async def get_source(client: httpx.AsyncClient) -> Iterable[SubmissionWrapper]:
-    """Gets the program's submission source based on user args"""
-    source_name = args.source.lower()
-    if source_name == "saved":
-        return await from_saved(
-            sign_in(input("Username: "), getpass.getpass("Password: ")),
-            client,
-            amount=args.limit,
-            score=args.karma,
-            age=args.age,
-            dry=args.dry,
-        )
-    if source_name.startswith("r/"):
-        return await from_subreddit(
-            sign_in(),
-            source_name,
-            args.sortby,
-            client,
-            score=args.karma,
-            age=args.age,
-            amount=args.limit,
-        )
-    raise ValueError(
-        f'Expected source to be "saved" or a subreddit\
-        beginning with "r/", got {args.source}'
-    )
+def get_sources() -> List[Source]:
+    """
+    Gets the sources to take posts from, based on user args. Sources given on the
+    command line use the --sortby, --limit and --karma flags; those in a sources file
+    can override them
+    """
+    defaults = Source(SAVED, sortby=args.sortby, limit=args.limit, karma=args.karma)
+    sources = [replace(defaults, name=name.lower()) for name in args.source]
+    if args.sources is not None:
+        sources.extend(read_sources(args.sources, defaults))
+    if not sources:
+        raise ValueError("Expected at least one source, or a sources file")
+    check_unique(sources)
+    return sources
+
+
+def sign_in_for(sources: List[Source]) -> praw.Reddit:
+    """
+    Signs in to reddit once for every source. Only asks for a username and password if
+    a source needs them
+    """
+    if any(not source.is_subreddit for source in sources):
+        return sign_in(input("Username: "), getpass.getpass("Password: "))
+    return sign_in()
+
+
+def get_listing(
+    reddit: praw.Reddit, source: Source, after: Optional[str] = None
+) -> ListingGenerator:
+    """
+    Gets a listing of the given source's submissions
+    :param after: fullname of the post the listing should start after, if any
+    """
+    if source.is_subreddit:
+        return subreddit_listing(reddit, source.name, SORTS[source.sortby], after=after)
+    return saved_listing(reddit.user.me(), after=after)
 
 
 if __name__ == "__main__":
@@ -90,12 +285,23 @@ if __name__ == "__main__":
     parser.add_argument(
         "source",
         type=str,
+        nargs="*",
         help="specify where posts should be taken from. choices are:"
         "saved: user saved posts"
         "r/<subreddit>: posts from <>",
     )
     parser.add_argument(
-        "--limit", type=int, default=1000, help="max number of images to download"
+        "--sources",
+        type=str,
+        help="file listing more sources, one per line, each optionally followed by "
+        "sortby=, limit= and karma= to override the flags for that source, e.g. "
+        '"r/pics sortby=top_week limit=50"',
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=DEFAULT_POST_LIMIT,
+        help="max number of posts to download from each source",
     )
     parser.add_argument(
         "--directory",
@@ -124,8 +330,8 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--sortby",
-        choices=SortOption,
-        default="hot",
+        choices=SORTS,
+        default=DEFAULT_SORT,
         help="specify how to sort the given source if it's a subreddit",
     )
     parser.add_argument(
@@ -139,6 +345,94 @@ if __name__ == "__main__":
         action="store_false",
         help="organize images from saved into folders by subreddit",
     )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=DOWNLOAD_CHUNK_SIZE,
+        help="number of bytes of each download to hold in memory at a time",
+    )
+    parser.add_argument(
+        "--nocache",
+        action="store_true",
+        help="resolve every post's urls again instead of reusing those found on previous runs",
+    )
+    parser.add_argument(
+        "--redownload",
+        action="store_true",
+        help="download posts again even if they were completely downloaded on a previous run",
+    )
+    parser.add_argument(
+        "--skipduplicates",
+        action="store_true",
+        help="don't link images that were already downloaded into the download directory",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=DEFAULT_LIMIT,
+        help="max number of requests to make at once",
+    )
+    parser.add_argument(
+        "--hostconnections",
+        type=int,
+        default=DEFAULT_HOST_LIMIT,
+        help="max number of requests to make to any one website at once",
+    )
+    parser.add_argument(
+        "--cpuworkers",
+        type=int,
+        default=0,
+        help="number of processes to hash downloaded files in, or 0 to hash them as "
+        "they're downloaded (default: 0)",
+    )
+    parser.add_argument(
+        "--resolvers",
+        type=int,
+        default=16,
+        help="max number of posts to find images in at once",
+    )
+    parser.add_argument(
+        "--downloaders",
+        type=int,
+        default=8,
+        help="max number of posts to download images from at once",
+    )
+    parser.add_argument(
+        "--unsavers",
+        type=int,
+        default=1,
+        help="max number of posts to unsave at once",
+    )
+    parser.add_argument(
+        "--attempts",
+        type=int,
+        default=Backoff.attempts,
+        help="max number of times to try each request if it fails temporarily",
+    )
+    parser.add_argument(
+        "--metricsinterval",
+        type=float,
+        default=0,
+        help="also write the run's metrics every this many seconds, instead of only at the end",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="carry on from where the last run with the same source stopped",
+    )
+    parser.add_argument(
+        "--profile",
+        type=float,
+        nargs="?",
+        const=DEFAULT_THRESHOLD,
+        help="record what blocks the event loop for longer than this many seconds "
+        f"(default: {DEFAULT_THRESHOLD}) and write it to {STALLS_PATH}",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help=f"profile the event loop's thread with cProfile and write it to {PROFILE_PATH}",
+    )
     """
     parser.add_argument(
         "--age",
@@ -149,8 +443,13 @@ if __name__ == "__main__":
     """
 
     args = parser.parse_args()
+    # checked before anything is created, and before the sources file's path would be
+    #  taken relative to the download directory
+    try:
+        sources = get_sources()
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
 
     # endregion
 
-    with asyncio.get_event_loop() as loop:
-        loop.run_until_complete(main())
+    asyncio.run(main(sources))
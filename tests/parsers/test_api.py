@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+
+import httpx
+
+from core import Cache
+from core.parsers.api import get_api
+
+URL = "https://api.example.com/album/XYz4zyX"
+
+
+def parse(response):
+    return response.json()["links"]
+
+
+class Server:
+    """MockTransport handler for an API that supports ETags and Last-Modified"""
+
+    def __init__(self, links):
+        self.links = links
+        self.etag = '"v1"'
+        self.last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(
+            200,
+            json={"links": self.links},
+            headers={"ETag": self.etag, "Last-Modified": self.last_modified},
+        )
+
+
+class TestGetApi(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = Cache(os.path.join(self.directory.name, "cache.sqlite3"))
+        self.server = Server(["link1"])
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(self.server))
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        self.cache.close()
+        self.directory.cleanup()
+
+    async def test_reuses_fresh_response(self):
+        self.assertEqual(
+            await get_api(URL, self.client, parse, cache=self.cache), ["link1"]
+        )
+        self.assertEqual(
+            await get_api(URL, self.client, parse, cache=self.cache), ["link1"]
+        )
+        self.assertEqual(len(self.server.requests), 1)
+
+    async def test_revalidates_stale_response(self):
+        await get_api(URL, self.client, parse, cache=self.cache, freshness=timedelta())
+        result = await get_api(
+            URL, self.client, parse, cache=self.cache, freshness=timedelta()
+        )
+        self.assertEqual(result, ["link1"])
+        self.assertEqual(len(self.server.requests), 2)
+        revalidation = self.server.requests[1]
+        self.assertEqual(revalidation.headers["If-None-Match"], '"v1"')
+        self.assertEqual(
+            revalidation.headers["If-Modified-Since"], self.server.last_modified
+        )
+
+    async def test_replaces_changed_response(self):
+        await get_api(URL, self.client, parse, cache=self.cache, freshness=timedelta())
+        self.server.links = ["link1", "link2"]
+        self.server.etag = '"v2"'
+        result = await get_api(
+            URL, self.client, parse, cache=self.cache, freshness=timedelta()
+        )
+        self.assertEqual(result, ["link1", "link2"])
+        self.assertEqual(self.cache.get(URL)["etag"], '"v2"')
+
+    async def test_sends_given_headers(self):
+        await get_api(URL, self.client, parse, headers={"Authorization": "mock"})
+        self.assertEqual(self.server.requests[0].headers["Authorization"], "mock")
+
+    async def test_failed_call_is_not_cached(self):
+        client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(404))
+        )
+        async with client:
+            self.assertIsNone(await get_api(URL, client, parse, cache=self.cache))
+        self.assertIsNone(self.cache.get(URL))
+
+
+if __name__ == "__main__":
+    unittest.main()
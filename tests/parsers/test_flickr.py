@@ -1,19 +1,95 @@
 import unittest
-from unittest.mock import patch  # MagicMock,
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from core.parsers.flickr import flickr_parser  # _get_flickr_photo_id,
+import httpx
+
+from core.parsers.flickr import (
+    FLICKR_REGEX,
+    SHORT_FLICKR_REGEX,
+    _decode_short_id,
+    _get_flickr_photo_id,
+    flickr_parser,
+)
+
+
+def mock_sizes_response(sizes, candownload=1, stat="ok"):
+    return httpx.Response(
+        200,
+        json={"sizes": {"candownload": candownload, "size": sizes}, "stat": stat},
+    )
+
+
+SIZES = [
+    {"label": "Small", "width": 240, "height": 160, "source": "small source"},
+    {"label": "Original", "width": "2400", "height": "1600", "source": "big source"},
+    {"label": "Medium", "width": 500, "height": 333, "source": "medium source"},
+]
 
 
 class TestFlickrRegex(unittest.TestCase):
-    # TODO
-    pass
+    def test_matches_photo_page(self):
+        m = FLICKR_REGEX.search("https://www.flickr.com/photos/mock_user/1234567/")
+        self.assertEqual(m.groups(), ("mock_user", "1234567"))
+        m = FLICKR_REGEX.search("flickr.com/photos/mock_user/1234567/in/album-1")
+        self.assertEqual(m.groups(), ("mock_user", "1234567"))
+
+    def test_matches_short_link(self):
+        m = SHORT_FLICKR_REGEX.search("https://flic.kr/p/2aB3c")
+        self.assertEqual(m.group(1), "2aB3c")
+
+    def test_does_not_match_other(self):
+        self.assertIsNone(FLICKR_REGEX.search("https://www.flickr.com/photos/user/"))
+        self.assertIsNone(SHORT_FLICKR_REGEX.search("https://flic.kr/s/2aB3c"))
 
 
-class TestGetFlickrPhotoID(unittest.TestCase):
-    # TODO
-    pass
+class TestGetFlickrPhotoID(unittest.IsolatedAsyncioTestCase):
+    def test_decodes_short_id(self):
+        self.assertEqual(_decode_short_id("2"), "1")
+        self.assertEqual(_decode_short_id("21"), "58")
+        self.assertEqual(_decode_short_id("Z"), "57")
+        # 0, O, I, and l aren't in the alphabet
+        self.assertIsNone(_decode_short_id("0l"))
+        self.assertIsNone(_decode_short_id(""))
 
+    async def test_reads_photo_page_without_requests(self):
+        client = MagicMock()
+        photo_id = await _get_flickr_photo_id(
+            "https://www.flickr.com/photos/mock_user/1234567/", client
+        )
+        self.assertEqual(photo_id, "1234567")
+        client.head.assert_not_called()
+        client.get.assert_not_called()
 
+    async def test_decodes_short_link_without_requests(self):
+        client = MagicMock()
+        self.assertEqual(
+            await _get_flickr_photo_id("https://flic.kr/p/21", client), "58"
+        )
+        client.head.assert_not_called()
+        client.get.assert_not_called()
+
+    async def test_reads_location_of_undecodable_short_link(self):
+        client = MagicMock()
+        client.head = AsyncMock(
+            return_value=httpx.Response(
+                301, headers={"Location": "https://www.flickr.com/photos/user/42/"}
+            )
+        )
+        self.assertEqual(
+            await _get_flickr_photo_id("https://flic.kr/p/0", client), "42"
+        )
+        client.head.assert_awaited_once_with(
+            "https://flic.kr/p/0", follow_redirects=False
+        )
+        client.get.assert_not_called()
+
+    async def test_returns_none_for_other_links(self):
+        self.assertIsNone(
+            await _get_flickr_photo_id("https://www.flickr.com/", MagicMock())
+        )
+
+
+@patch.dict("os.environ", {"flickr_client_id": "mock key"})
 class TestFlickrParser(unittest.IsolatedAsyncioTestCase):
     @patch("core.parsers.flickr._get_flickr_photo_id")
     async def test_returns_empty_set_if_no_id(self, mock_get_flickr_photo_id):
@@ -22,9 +98,34 @@ class TestFlickrParser(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(await result, set())
         mock_get_flickr_photo_id.assert_called_once_with("mock url", "mock client")
 
-    def test_makes_api_call(self):
-        # TODO
-        pass
+    async def test_makes_api_call(self):
+        client = MagicMock()
+        client.get = AsyncMock(return_value=mock_sizes_response(SIZES))
+        result = await flickr_parser("https://flic.kr/p/21", client)
+        self.assertEqual(result, {"big source"})
+        url = client.get.call_args.args[0]
+        self.assertIn("method=flickr.photos.getSizes", url)
+        self.assertIn("photo_id=58", url)
+
+    async def test_handles_undownloadable_photo(self):
+        client = MagicMock()
+        client.get = AsyncMock(return_value=mock_sizes_response(SIZES, candownload=0))
+        self.assertEqual(await flickr_parser("https://flic.kr/p/21", client), set())
+
+    async def test_handles_failed_api_call(self):
+        client = MagicMock()
+        client.get = AsyncMock(return_value=mock_sizes_response([], stat="fail"))
+        self.assertEqual(await flickr_parser("https://flic.kr/p/21", client), set())
+
+    async def test_caches_biggest_size_by_photo_id(self):
+        cache = MagicMock()
+        cache.get.return_value = None
+        client = MagicMock()
+        client.get = AsyncMock(return_value=mock_sizes_response(SIZES))
+        await flickr_parser("https://flic.kr/p/21", client, cache=cache)
+        key, entry = cache.set.call_args.args
+        self.assertEqual(key, "flickr:58")
+        self.assertEqual(entry["value"], "big source")
 
 
 if __name__ == "__main__":
@@ -1,7 +1,14 @@
+import time
 import unittest
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
-from core.parsers.imgur import _split_imgur_url, imgur_parser
+from core.parsers.imgur import (
+    ALBUM_API,
+    HEADERS,
+    IMAGE_API,
+    _split_imgur_url,
+    imgur_parser,
+)
 
 
 class TestSplitImgurURL(unittest.TestCase):
@@ -117,6 +124,14 @@ class TestSplitImgurURL(unittest.TestCase):
         self.assertIsNone(_split_imgur_url(""))
 
 
+def mock_api_response(data, status_code=200):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {}
+    response.json.return_value = {"data": data}
+    return response
+
+
 class TestImgurParser(unittest.IsolatedAsyncioTestCase):
     """
     Because this relies on the structure of imgur's website,
@@ -125,33 +140,105 @@ class TestImgurParser(unittest.IsolatedAsyncioTestCase):
     take snapshots of the responses and use those to test
     """
 
-    def test_handles_single_image(self):
-        # TODO
-        pass
-
-    def test_handles_album(self):
-        # TODO
-        pass
-
-    def test_handles_gallery(self):
-        # TODO
-        pass
+    async def test_handles_direct_link(self):
+        client = MagicMock()
+        result = await imgur_parser("https://i.imgur.com/aB12c3.jpg", client)
+        self.assertEqual(result, {"https://i.imgur.com/aB12c3.jpg"})
+        # direct links don't need any requests at all
+        client.get.assert_not_called()
+        client.head.assert_not_called()
+
+    async def test_handles_single_image(self):
+        client = MagicMock()
+        client.get = AsyncMock(
+            return_value=mock_api_response({"link": "https://i.imgur.com/aB12c3.png"})
+        )
+        result = await imgur_parser("https://imgur.com/aB12c3", client)
+        self.assertEqual(result, {"https://i.imgur.com/aB12c3.png"})
+        client.get.assert_awaited_once_with(IMAGE_API + "aB12c3", headers=HEADERS)
+        client.head.assert_not_called()
+
+    async def test_handles_album(self):
+        client = MagicMock()
+        client.get = AsyncMock(
+            return_value=mock_api_response(
+                {"images": [{"link": "mock link 1"}, {"link": "mock link 2"}]}
+            )
+        )
+        result = await imgur_parser("https://imgur.com/a/XYz4zyX", client)
+        self.assertEqual(result, {"mock link 1", "mock link 2"})
+        client.get.assert_awaited_once_with(ALBUM_API + "XYz4zyX", headers=HEADERS)
+
+    async def test_handles_gallery(self):
+        client = MagicMock()
+        client.get = AsyncMock(
+            return_value=mock_api_response({"images": [{"link": "mock link"}]})
+        )
+        result = await imgur_parser("https://imgur.com/gallery/XYz4zyX", client)
+        self.assertEqual(result, {"mock link"})
+        client.get.assert_awaited_once_with(ALBUM_API + "XYz4zyX", headers=HEADERS)
+
+    async def test_handles_failed_api_call(self):
+        client = MagicMock()
+        client.get = AsyncMock(return_value=mock_api_response(None, status_code=404))
+        self.assertEqual(
+            await imgur_parser("https://imgur.com/a/XYz4zyX", client), set()
+        )
+
+    async def test_follows_redirects_with_head(self):
+        client = MagicMock()
+        redirect = MagicMock()
+        redirect.url = "https://i.imgur.com/aB12c3.jpg"
+        client.head = AsyncMock(return_value=redirect)
+        result = await imgur_parser("https://m.imgur.com/aB12c3.jpg?x", client)
+        self.assertEqual(result, {"https://i.imgur.com/aB12c3.jpg"})
+        client.head.assert_awaited_once_with(
+            "https://m.imgur.com/aB12c3.jpg?x", follow_redirects=True
+        )
+        client.get.assert_not_called()
+
+    async def test_uses_cache(self):
+        cache = MagicMock()
+        cache.get.return_value = {
+            "value": ["cached link"],
+            "etag": None,
+            "last_modified": None,
+            "checked": time.time(),
+        }
+        client = MagicMock()
+        result = await imgur_parser("https://imgur.com/a/XYz4zyX", client, cache=cache)
+        self.assertEqual(result, {"cached link"})
+        cache.get.assert_called_once_with(ALBUM_API + "XYz4zyX")
+        client.get.assert_not_called()
+
+    async def test_fills_cache(self):
+        cache = MagicMock()
+        cache.get.return_value = None
+        client = MagicMock()
+        client.get = AsyncMock(
+            return_value=mock_api_response({"images": [{"link": "mock link"}]})
+        )
+        await imgur_parser("https://imgur.com/a/XYz4zyX", client, cache=cache)
+        key, entry = cache.set.call_args.args
+        self.assertEqual(key, ALBUM_API + "XYz4zyX")
+        self.assertEqual(entry["value"], ["mock link"])
 
     async def test_ignores_non_imgur(self):
         mock_client = AsyncMock()
 
-        async def mock_get(url):
+        async def mock_head(url, **kwargs):
             mock_response = AsyncMock()
             mock_response.url = url
             return mock_response
 
-        mock_client.get = mock_get
+        mock_client.head = mock_head
         result = await imgur_parser("https://example.com", mock_client)
         self.assertEqual(result, set())
         result = await imgur_parser("http://google.com", mock_client)
         self.assertEqual(result, set())
         result = await imgur_parser("https://i.reddit.com", mock_client)
         self.assertEqual(result, set())
+        mock_client.get.assert_not_called()
 
 
 if __name__ == "__main__":
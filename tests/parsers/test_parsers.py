@@ -1,14 +1,160 @@
 import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
 
+from core.metrics import Metrics
+from core.parsers.api import FRESHNESS
+from core.parsers.flickr import flickr_parser
+from core.parsers.imgur import imgur_parser
+from core.parsers.parsers import (
+    FALLBACK_PARSER,
+    find_urls,
+    get_parser,
+    single_image_parser,
+)
 
-class TestParsers(unittest.TestCase):
-    def test_single_image_parser(self):
-        # TODO
-        pass
 
-    def test_find_urls(self):
-        # TODO
-        pass
+def mock_response(status_code=200, content_type="image/png", url="mock url"):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {"Content-type": content_type} if content_type else {}
+    response.url = url
+    return response
+
+
+class TestSingleImageParser(unittest.IsolatedAsyncioTestCase):
+    async def test_uses_head_request(self):
+        client = MagicMock()
+        client.head = AsyncMock(return_value=mock_response())
+        self.assertEqual(await single_image_parser("mock url", client), {"mock url"})
+        client.head.assert_awaited_once_with("mock url", follow_redirects=True)
+        client.get.assert_not_called()
+        client.stream.assert_not_called()
+
+    async def test_falls_back_to_streamed_get_when_head_rejected(self):
+        client = MagicMock()
+        client.head = AsyncMock(return_value=mock_response(status_code=405))
+        client.stream.return_value.__aenter__ = AsyncMock(
+            return_value=mock_response(content_type="image/jpeg")
+        )
+        client.stream.return_value.__aexit__ = AsyncMock(return_value=False)
+        self.assertEqual(await single_image_parser("mock url", client), {"mock url"})
+        client.stream.assert_called_once_with("GET", "mock url", follow_redirects=True)
+        client.get.assert_not_called()
+
+    async def test_ignores_non_images(self):
+        client = MagicMock()
+        client.head = AsyncMock(return_value=mock_response(content_type="text/html"))
+        self.assertEqual(await single_image_parser("mock url", client), set())
+        client.head = AsyncMock(return_value=mock_response(content_type=None))
+        self.assertEqual(await single_image_parser("mock url", client), set())
+        client.head = AsyncMock(return_value=mock_response(status_code=404))
+        self.assertEqual(await single_image_parser("mock url", client), set())
+
+
+class TestGetParser(unittest.TestCase):
+    def test_routes_imgur(self):
+        self.assertIs(get_parser("https://imgur.com/a/XYz4zyX"), imgur_parser)
+        self.assertIs(get_parser("https://i.imgur.com/aB12c3.jpg"), imgur_parser)
+        self.assertIs(get_parser("www.imgur.com/gallery/XYz4zyX"), imgur_parser)
+        self.assertIs(get_parser("HTTPS://IMGUR.COM/aB12c3"), imgur_parser)
+
+    def test_routes_flickr(self):
+        self.assertIs(
+            get_parser("https://www.flickr.com/photos/user/12345/"), flickr_parser
+        )
+        self.assertIs(get_parser("https://flic.kr/p/abc123"), flickr_parser)
+
+    def test_unknown_hosts_use_fallback(self):
+        self.assertIs(FALLBACK_PARSER, single_image_parser)
+        self.assertIs(
+            get_parser("https://i.redd.it/1u3xx7t7tmra1.png"), FALLBACK_PARSER
+        )
+        self.assertIs(get_parser("https://notimgur.com/a/XYz4zyX"), FALLBACK_PARSER)
+        self.assertIs(get_parser("https://example.com/imgur.com"), FALLBACK_PARSER)
+        self.assertIs(get_parser(""), FALLBACK_PARSER)
+
+
+class TestFindUrls(unittest.IsolatedAsyncioTestCase):
+    async def test_find_urls_only_calls_routed_parser(self):
+        imgur_mock = AsyncMock(return_value={"imgur result"})
+        fallback_mock = AsyncMock(return_value={"fallback result"})
+
+        with patch.dict(
+            "core.parsers.parsers.PARSERS", {"imgur.com": imgur_mock}
+        ), patch("core.parsers.parsers.FALLBACK_PARSER", fallback_mock):
+            result = await find_urls("https://imgur.com/a/XYz4zyX", "mock client")
+
+        self.assertEqual(result, {"imgur result"})
+        imgur_mock.assert_awaited_once_with(
+            "https://imgur.com/a/XYz4zyX", "mock client", cache=None
+        )
+        fallback_mock.assert_not_awaited()
+
+    async def test_find_urls_uses_cache(self):
+        cache = MagicMock()
+        cache.get.return_value = ["url1", "url2"]
+        fallback_mock = AsyncMock()
+
+        with patch("core.parsers.parsers.FALLBACK_PARSER", fallback_mock):
+            result = await find_urls("mock url", "mock client", cache=cache)
+
+        self.assertEqual(result, {"url1", "url2"})
+        cache.get.assert_called_once_with("mock url")
+        fallback_mock.assert_not_awaited()
+
+    async def test_find_urls_fills_cache(self):
+        cache = MagicMock()
+        cache.get.return_value = None
+
+        with patch(
+            "core.parsers.parsers.FALLBACK_PARSER",
+            AsyncMock(return_value={"url2", "url1"}),
+        ):
+            result = await find_urls("mock url", "mock client", cache=cache)
+        self.assertEqual(result, {"url1", "url2"})
+        cache.set.assert_called_once_with("mock url", ["url1", "url2"], ttl=None)
+
+        # nothing is cached when no urls are found
+        cache.reset_mock()
+        with patch(
+            "core.parsers.parsers.FALLBACK_PARSER", AsyncMock(return_value=set())
+        ):
+            result = await find_urls("mock url", "mock client", cache=cache)
+        self.assertEqual(result, set())
+        cache.set.assert_not_called()
+
+    async def test_find_urls_records_metrics(self):
+        metrics = Metrics()
+
+        async def mock_parser(url, client, cache=None):
+            return {"url1", "url2"}
+
+        with patch("core.parsers.parsers.FALLBACK_PARSER", mock_parser):
+            await find_urls("mock url", "mock client", metrics=metrics)
+        self.assertEqual(
+            metrics.counters["find_urls_total"],
+            {(("outcome", "found"), ("parser", "mock_parser")): 1},
+        )
+        self.assertEqual(
+            metrics.counters["urls_found_total"], {(("parser", "mock_parser"),): 2}
+        )
+        self.assertEqual(
+            metrics.histograms["find_urls_seconds"][(("parser", "mock_parser"),)].count,
+            1,
+        )
+
+    async def test_find_urls_caches_api_results_while_fresh(self):
+        cache = MagicMock()
+        cache.get.return_value = None
+
+        with patch.dict(
+            "core.parsers.parsers.PARSERS",
+            {"imgur.com": AsyncMock(return_value={"url1"})},
+        ):
+            await find_urls("https://imgur.com/a/XYz4zyX", "mock client", cache=cache)
+        cache.set.assert_called_once_with(
+            "https://imgur.com/a/XYz4zyX", ["url1"], ttl=FRESHNESS
+        )
 
 
 if __name__ == "__main__":
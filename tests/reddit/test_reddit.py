@@ -1,3 +1,4 @@
+import json
 import unittest
 from unittest.mock import MagicMock, mock_open, patch
 
@@ -5,7 +6,7 @@ import pytest
 
 import core
 from core import SubmissionWrapper
-from core.reddit.reddit import _from_source
+from core.reddit.reddit import _from_source, _iter_source
 from tests import SubmissionMockFactory, SubmissionWrapperFactory
 
 
@@ -49,42 +50,54 @@ class TestSignIn(unittest.TestCase):
 
 class TestLog(unittest.TestCase):
     @patch("builtins.open", new_callable=mock_open, read_data="data")
-    @patch("json.dump")
-    def test_log(self, mock_json_dump, mock_file):
-        wrapper = SubmissionWrapperFactory()
+    def test_log(self, mock_file):
+        submission = SubmissionMockFactory(id="mock id")
+        wrapper = SubmissionWrapperFactory(submission)
         wrapper.log("foo.file")
         mock_file.assert_called_with("foo.file", "a", encoding="utf-8")
-        mock_json_dump.assert_called_with(
-            {
-                "title": wrapper._submission.title,
-                "id": wrapper._submission.id,
-                "url": wrapper._submission.url,
-                "recognized_urls": wrapper.urls,
-                "exception": "",
-            },
-            mock_file(),
+        mock_file().write.assert_called_once_with(
+            json.dumps(
+                {
+                    "title": submission.title,
+                    "id": submission.id,
+                    "url": submission.url,
+                    "recognized_urls": [],
+                    "exception": "",
+                }
+            )
+            + "\n"
         )
 
     @patch("builtins.open", new_callable=mock_open, read_data="data")
-    @patch("json.dump")
-    def test_log_with_exception(self, mock_json_dump, mock_file):
-        wrapper = SubmissionWrapperFactory()
+    def test_log_with_exception(self, mock_file):
+        submission = SubmissionMockFactory(id="mock id")
+        wrapper = SubmissionWrapperFactory(submission)
+        wrapper.urls = {"url2", "url1"}
         wrapper.log("foo.file", exception="mock exception")
         mock_file.assert_called_once_with("foo.file", "a", encoding="utf-8")
-        mock_json_dump.assert_called_with(
-            {
-                "title": wrapper._submission.title,
-                "id": wrapper._submission.id,
-                "url": wrapper._submission.url,
-                "recognized_urls": wrapper.urls,
-                "exception": "mock exception",
-            },
-            mock_file(),
+        mock_file().write.assert_called_once_with(
+            json.dumps(
+                {
+                    "title": submission.title,
+                    "id": submission.id,
+                    "url": submission.url,
+                    "recognized_urls": ["url1", "url2"],
+                    "exception": "mock exception",
+                }
+            )
+            + "\n"
         )
 
     def test_summary_string(self):
-        # TODO
-        pass
+        wrapper = SubmissionWrapperFactory()
+        wrapper.title = "mock title"
+        wrapper.subreddit = "mock subreddit"
+        wrapper.url = "mock url"
+        wrapper.urls = {"mock url 1", "mock url 2"}
+        self.assertEqual(
+            wrapper.summary_string(),
+            "mock title\n   r/mock subreddit\n   mock url\n   Found 2 image(s).",
+        )
 
 
 class TestFromSource(unittest.IsolatedAsyncioTestCase):
@@ -106,10 +119,10 @@ class TestFromSource(unittest.IsolatedAsyncioTestCase):
         mock_source = iter([mock_valid_1, mock_invalid_1, mock_valid_2, mock_invalid_2])
         mock_client = "mock client"
 
-        async def mock_find_urls(wrapper, client):
-            if wrapper._submission == mock_valid_1:
+        async def mock_find_urls(wrapper, client, cache=None):
+            if wrapper.id == mock_valid_1.id:
                 wrapper.urls = {"mock url 1"}
-            if wrapper._submission == mock_valid_2:
+            if wrapper.id == mock_valid_2.id:
                 wrapper.urls = {"mock url 2"}
 
         with patch("core.SubmissionWrapper.find_urls", mock_find_urls):
@@ -146,10 +159,10 @@ class TestFromSource(unittest.IsolatedAsyncioTestCase):
         mock_invalid_5 = SubmissionMockFactory()
         mock_client = "mock client"
 
-        async def mock_find_urls(wrapper, client):
-            if wrapper._submission == mock_valid_1:
+        async def mock_find_urls(wrapper, client, cache=None):
+            if wrapper.id == mock_valid_1.id:
                 wrapper.urls = {"mock url 1"}
-            if wrapper._submission == mock_valid_2:
+            if wrapper.id == mock_valid_2.id:
                 wrapper.urls = {"mock url 2"}
 
         # amount is 3, list generates 7 before exhaustion but only 2 are valid
@@ -183,6 +196,133 @@ class TestFromSource(unittest.IsolatedAsyncioTestCase):
             [expected1, expected2],
         )
 
+    async def test_skips_completed_submissions(self):
+        mock_complete = SubmissionMockFactory(id="complete")
+        mock_incomplete = SubmissionMockFactory(id="incomplete")
+        mock_source = iter([mock_complete, mock_incomplete])
+        manifest = MagicMock()
+        manifest.is_complete.side_effect = lambda submission_id: (
+            submission_id == "complete"
+        )
+        found = []
+
+        async def mock_find_urls(wrapper, client, cache=None):
+            found.append(wrapper.id)
+            wrapper.urls = {"mock url"}
+
+        with patch("core.SubmissionWrapper.find_urls", mock_find_urls):
+            result = await _from_source(
+                source=mock_source, amount=10, client="mock client", manifest=manifest
+            )
+
+        self.assertEqual(found, ["incomplete"])
+        self.assertEqual([wrapper.id for wrapper in result], ["incomplete"])
+
+    async def test_completed_submissions_are_still_unsaved(self):
+        mock_complete = SubmissionMockFactory(id="complete")
+        mock_incomplete = SubmissionMockFactory(id="incomplete")
+        mock_source = iter([mock_complete, mock_incomplete])
+        manifest = MagicMock()
+        manifest.is_complete.side_effect = lambda submission_id: (
+            submission_id == "complete"
+        )
+        found = []
+
+        async def mock_find_urls(wrapper, client, cache=None):
+            found.append(wrapper.id)
+            wrapper.urls = {"mock url"}
+
+        with patch("core.SubmissionWrapper.find_urls", mock_find_urls):
+            result = await _from_source(
+                source=mock_source,
+                amount=10,
+                client="mock client",
+                dry=False,
+                manifest=manifest,
+            )
+
+        # it isn't resolved (or downloaded) again, but it's still there to be unsaved
+        self.assertEqual(found, ["incomplete"])
+        complete = next(wrapper for wrapper in result if wrapper.id == "complete")
+        self.assertEqual(complete.urls, set())
+        self.assertTrue(complete.can_unsave)
+
+
+class TestIterSource(unittest.IsolatedAsyncioTestCase):
+    async def test_yields_before_source_is_exhausted(self):
+        submissions = [SubmissionMockFactory(id=str(i)) for i in range(10)]
+        taken = []
+
+        def mock_source():
+            for submission in submissions:
+                taken.append(submission)
+                yield submission
+
+        async def mock_find_urls(wrapper, client, cache=None):
+            wrapper.urls = {"mock url"}
+
+        with patch("core.SubmissionWrapper.find_urls", mock_find_urls):
+            stream = _iter_source(mock_source(), "mock client", amount=10, lookahead=1)
+            first = await anext(stream)
+            self.assertLess(len(taken), 10)
+            rest = [wrapper async for wrapper in stream]
+
+        self.assertCountEqual(
+            [wrapper.id for wrapper in [first, *rest]], [str(i) for i in range(10)]
+        )
+
+    async def test_stops_at_amount(self):
+        taken = []
+
+        def mock_source():
+            for i in range(1000):
+                taken.append(i)
+                yield SubmissionMockFactory(id=str(i))
+
+        async def mock_find_urls(wrapper, client, cache=None):
+            wrapper.urls = {"mock url"}
+
+        with patch("core.SubmissionWrapper.find_urls", mock_find_urls):
+            result = [
+                wrapper
+                async for wrapper in _iter_source(
+                    mock_source(), "mock client", amount=5, lookahead=4
+                )
+            ]
+
+        self.assertEqual(len(result), 5)
+        self.assertLess(len(taken), 1000)
+
+    async def test_requires_positive_lookahead(self):
+        with pytest.raises(ValueError):
+            await anext(_iter_source(iter([]), "mock client", lookahead=0))
+
+
+class TestIterSaved(unittest.TestCase):
+    @patch("core.reddit.reddit._iter_source")
+    def test_iter_saved(self, mock_iter_source):
+        mock_redditor = MagicMock()
+        mock_client = MagicMock()
+
+        result = core.iter_saved(mock_redditor, mock_client, amount=5, lookahead=2)
+
+        mock_redditor.saved.assert_called_once_with(limit=None, score=None, age=None)
+        mock_iter_source.assert_called_once_with(
+            mock_redditor.saved.return_value,
+            mock_client,
+            amount=5,
+            dry=True,
+            criteria=core.reddit.has_urls,
+            cache=None,
+            manifest=None,
+            lookahead=2,
+        )
+        self.assertEqual(result, mock_iter_source.return_value)
+
+    def test_requires_positive_amount(self):
+        with pytest.raises(ValueError):
+            core.iter_saved(MagicMock(), "mock client", amount=0)
+
 
 class TestFromSaved(unittest.IsolatedAsyncioTestCase):
 
@@ -210,11 +350,35 @@ class TestFromSaved(unittest.IsolatedAsyncioTestCase):
             amount=expected_amount,
             dry=True,
             criteria=core.reddit.has_urls,
+            cache=None,
+            manifest=None,
         )
 
         self.assertEqual(result, mock_from_source.return_value)
 
 
+class TestListings(unittest.TestCase):
+    def test_saved_listing_starts_after_cursor(self):
+        mock_redditor = MagicMock()
+        core.reddit.saved_listing(mock_redditor, after="t3_mock")
+        mock_redditor.saved.assert_called_once_with(
+            limit=None, score=None, age=None, params={"after": "t3_mock"}
+        )
+
+    def test_subreddit_listing_starts_after_cursor(self):
+        mock_reddit = MagicMock()
+        mock_sort_by = MagicMock()
+        core.reddit.subreddit_listing(
+            mock_reddit, "r/mock_subreddit", mock_sort_by, after="t3_mock"
+        )
+        mock_sort_by.assert_called_once_with(
+            mock_reddit.subreddit.return_value,
+            score=None,
+            age=None,
+            params={"after": "t3_mock"},
+        )
+
+
 class TestFromSubreddit(unittest.IsolatedAsyncioTestCase):
     @patch("core.reddit.reddit._from_source")
     async def test_from_subreddit(self, mock_from_source):
@@ -236,6 +400,8 @@ class TestFromSubreddit(unittest.IsolatedAsyncioTestCase):
             mock_sort_by,
             expected_client,
             criteria=core.reddit.has_urls,
+            cache=None,
+            manifest=None,
         )
 
         self.assertEqual(result, mock_from_source.return_value)
@@ -254,6 +420,8 @@ class TestFromSubreddit(unittest.IsolatedAsyncioTestCase):
             amount=expected_amount,
             dry=True,
             criteria=core.reddit.has_urls,
+            cache=None,
+            manifest=None,
         )
 
         self.assertEqual(result, mock_from_source.return_value)
@@ -1,10 +1,21 @@
+import hashlib
 import os
+import tempfile
 import unittest
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
-from unittest.mock import AsyncMock, MagicMock, mock_open, patch
+from unittest.mock import MagicMock, patch
+
+import httpx
+from praw.endpoints import API_PATH
 
 from core import SubmissionWrapper
+from core.executor import CPUExecutor
+from core.filenames import FilenameIndex
+from core.manifest import DownloadRecord, Manifest
+from core.reddit.submission_wrapper import DownloadInterrupted
+from core.retry import Backoff
 from tests import SubmissionWrapperFactory
 
 
@@ -28,6 +39,7 @@ class TestConstructor(unittest.TestCase):
 
         # Assert that the wrapper has the correct values
         self.assertEqual(wrapper.title, submission_mock.title)
+        self.assertEqual(wrapper.fullname, submission_mock.fullname)
         self.assertEqual(wrapper.subreddit, str(submission_mock.subreddit))
         self.assertEqual(wrapper.url, submission_mock.url)
         self.assertEqual(wrapper.author, submission_mock.author)
@@ -37,9 +49,13 @@ class TestConstructor(unittest.TestCase):
         self.assertEqual(wrapper.can_unsave, not dry)
         # Assert that the file title has the special characters removed
         self.assertEqual(wrapper.base_file_title, "mock title")
-        # Assert values like responses and urls are not set
-        self.assertIsNone(wrapper.response)
+        # Assert urls are not set
         self.assertEqual(wrapper.urls, set())
+        # Assert that the wrapper doesn't keep the submission itself
+        self.assertFalse(hasattr(wrapper, "__dict__"))
+        self.assertNotIn(
+            submission_mock, [getattr(wrapper, name) for name in wrapper.__slots__]
+        )
         # Assert that the submission is has not been unsaved
         submission_mock.unsave.assert_not_called()
 
@@ -49,22 +65,56 @@ class TestUnsave(unittest.TestCase):
         # Assert SubmissionWrappers do not unsave posts when dry = True
         wrapper = SubmissionWrapperFactory()
         self.assertFalse(wrapper.unsave())
-        wrapper._submission.unsave.assert_not_called()
+        wrapper._reddit.post.assert_not_called()
 
         # Assert SubmissionWrappers do unsave posts when dry = False
         wrapper = SubmissionWrapperFactory(dry=False)
         self.assertTrue(wrapper.unsave())
-        wrapper._submission.unsave.assert_called_once()
+        self.assert_unsaved(wrapper)
 
         # Assert SubmissionWrappers do unsave posts force = True
         wrapper = SubmissionWrapperFactory()
         self.assertTrue(wrapper.unsave(force=True))
-        wrapper._submission.unsave.assert_called_once()
+        self.assert_unsaved(wrapper)
 
         # Assert SubmissionWrappers do unsave posts force = True
         wrapper = SubmissionWrapperFactory(dry=False)
         self.assertTrue(wrapper.unsave(force=True))
-        wrapper._submission.unsave.assert_called_once()
+        self.assert_unsaved(wrapper)
+
+    def assert_unsaved(self, wrapper):
+        # posts are unsaved by their fullname, without the submission
+        wrapper._reddit.post.assert_called_once_with(
+            API_PATH["unsave"], data={"id": wrapper.fullname}
+        )
+
+
+class MockStreamResponse:
+    def __init__(self, status_code=200, content=b"mock content", error=None):
+        self.status_code = status_code
+        self.headers = {"Content-type": "image/jpeg"}
+        self.content = content
+        self.error = error
+        self.chunk_sizes = []
+
+    async def aiter_bytes(self, chunk_size=None):
+        self.chunk_sizes.append(chunk_size)
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:][:chunk_size]
+        if self.error:
+            raise self.error
+
+
+def MockStreamClient(responses):
+    """Creates a mock httpx.AsyncClient whose stream() serves the given responses by url"""
+    client = MagicMock()
+
+    @asynccontextmanager
+    async def stream(method, url, **kwargs):
+        yield responses[url]
+
+    client.stream = MagicMock(side_effect=stream)
+    return client
 
 
 class TestDownloadAll(unittest.IsolatedAsyncioTestCase):
@@ -77,147 +127,420 @@ class TestDownloadAll(unittest.IsolatedAsyncioTestCase):
         mock_path = "mock path"
         self.assertEqual(await wrapper.download_all(mock_path, mock_client), dict())
 
-    @patch("os.makedirs")
-    @patch("core.get_extension")
-    @patch("builtins.open", new_callable=mock_open)
-    async def test_download_all_unorganized(
-        self,
-        file_mock,
-        get_extension_mock,
-        os_makedirs_mock,
-    ):
-        directory = "mock directory"
-        httpx_client_mock = AsyncMock()
+    async def test_download_all_unorganized(self):
+        responses = {
+            url: MockStreamResponse(content=url.encode())
+            for url in ["url1", "url2", "url3", "url4"]
+        }
+        client = MockStreamClient(responses)
 
-        class MockResponse:
-            status_code = 200
-            content = "mock content"
+        wrapper = SubmissionWrapperFactory()
+        wrapper.subreddit = "mock subreddit"
+        wrapper.title = "mock title"
+        wrapper.urls = ["url1", "url2", "url3", "url4"]
 
-        httpx_client_mock.get.return_value = MockResponse()
+        with tempfile.TemporaryDirectory() as directory:
+            result = await wrapper.download_all(
+                directory=directory, client=client, organize=False
+            )
+
+            # organized is False, so the subreddit subdirectory should not be created
+            expected = {
+                "url1": os.path.join(directory, "mock title.jpeg"),
+                "url2": os.path.join(directory, "mock title (1).jpeg"),
+                "url3": os.path.join(directory, "mock title (2).jpeg"),
+                "url4": os.path.join(directory, "mock title (3).jpeg"),
+            }
+            self.assertDictEqual(result, expected)
+            self.assertCountEqual(
+                os.listdir(directory), map(os.path.basename, expected.values())
+            )
+            for url, path in expected.items():
+                client.stream.assert_any_call("GET", url, headers={}, timeout=10)
+                with open(path, "rb") as file:
+                    self.assertEqual(file.read(), url.encode())
+
+    async def test_download_all_organized(self):
+        client = MockStreamClient({"url1": MockStreamResponse()})
 
         wrapper = SubmissionWrapperFactory()
         wrapper.subreddit = "mock subreddit"
         wrapper.title = "mock title"
-        wrapper.urls = ["url1", "url2", "url3", "url4"]
-        get_extension_mock.return_value = ".jpg"
-
-        # organized is False, so the subreddit subdirectory should not be created
-        expected = {
-            "url1": os.path.join(directory, "mock title.jpg"),
-            "url2": os.path.join(directory, "mock title (1).jpg"),
-            "url3": os.path.join(directory, "mock title (2).jpg"),
-            "url4": os.path.join(directory, "mock title (3).jpg"),
-        }
+        wrapper.urls = ["url1"]
 
-        listdir_mock_side_effect = [
-            [],
-            ["mock title.jpg"],
-            ["mock title.jpg"],
-            ["mock title.jpg", "mock title (1).jpg"],
-            ["mock title.jpg", "mock title (1).jpg"],
-            [
-                "mock title.jpg",
-                "mock title (1).jpg",
-                "mock title (2).jpg",
-            ],
-            [
-                "mock title.jpg",
-                "mock title (1).jpg",
-                "mock title (2).jpg",
-            ],
-        ]
-
-        with patch(
-            "os.listdir", side_effect=listdir_mock_side_effect
-        ) as os_listdir_mock:
+        with tempfile.TemporaryDirectory() as directory:
             result = await wrapper.download_all(
-                directory=directory, client=httpx_client_mock, organize=False
+                directory=directory, client=client, organize=True
+            )
+            self.assertDictEqual(
+                result,
+                {"url1": os.path.join(directory, wrapper.subreddit, "mock title.jpeg")},
+            )
+            self.assertEqual(os.listdir(directory), [wrapper.subreddit])
+            self.assertEqual(
+                os.listdir(os.path.join(directory, wrapper.subreddit)),
+                ["mock title.jpeg"],
             )
 
-        os_listdir_mock.assert_called_with(directory)
+    async def test_download_all_streams_in_chunks(self):
+        response = MockStreamResponse(content=b"0123456789")
+        client = MockStreamClient({"url1": response})
 
-        for key in expected.keys():
-            httpx_client_mock.get.assert_any_call(key, timeout=10)
+        wrapper = SubmissionWrapperFactory()
+        wrapper.title = "mock title"
+        wrapper.urls = ["url1"]
 
-        # organized is False, so the subreddit subdirectory should not be created
-        os_makedirs_mock.assert_called_with(directory, exist_ok=True)
+        with tempfile.TemporaryDirectory() as directory:
+            result = await wrapper.download_all(directory, client, chunk_size=3)
+            with open(result["url1"], "rb") as file:
+                self.assertEqual(file.read(), b"0123456789")
+        self.assertEqual(response.chunk_sizes, [3])
 
-        for value in expected.values():
-            file_mock.assert_any_call(value, "wb")
-        self.assertDictEqual(result, expected)
+    async def test_download_all_failed_download(self):
+        client = MockStreamClient({"url1": MockStreamResponse(status_code=404)})
 
-    @patch("os.makedirs")
-    @patch("core.get_extension")
-    @patch("builtins.open", new_callable=mock_open)
-    async def test_download_all_organized(
-        self,
-        file_mock,
-        get_extension_mock,
-        os_makedirs_mock,
-    ):
-        directory = "mock directory"
-        httpx_client_mock = AsyncMock()
+        wrapper = SubmissionWrapperFactory()
+        wrapper.title = "mock title"
+        wrapper.urls = ["url1"]
 
-        class MockResponse:
-            status_code = 200
-            content = "mock content"
+        with tempfile.TemporaryDirectory() as directory:
+            result = await wrapper.download_all(directory, client)
+            self.assertDictEqual(result, {"url1": None})
+            self.assertEqual(os.listdir(directory), [])
 
-        httpx_client_mock.get.return_value = MockResponse()
+    async def test_download_all_interrupted_download(self):
+        # Assert that a partial download never appears under its final name
+        client = MockStreamClient(
+            {"url1": MockStreamResponse(error=httpx.ReadTimeout("mock timeout"))}
+        )
 
         wrapper = SubmissionWrapperFactory()
-        wrapper.subreddit = "mock subreddit"
         wrapper.title = "mock title"
-        wrapper.urls = ["url1", "url2", "url3", "url4"]
-        get_extension_mock.return_value = ".jpg"
+        wrapper.urls = ["url1"]
 
-        expected = {
-            "url1": os.path.join(directory, wrapper.subreddit, "mock title.jpg"),
-            "url2": os.path.join(directory, wrapper.subreddit, "mock title (1).jpg"),
-            "url3": os.path.join(directory, wrapper.subreddit, "mock title (2).jpg"),
-            "url4": os.path.join(directory, wrapper.subreddit, "mock title (3).jpg"),
-        }
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(DownloadInterrupted):
+                await wrapper.download_all(
+                    directory, client, backoff=Backoff(attempts=2, base=0)
+                )
+            self.assertEqual(os.listdir(directory), [])
+        self.assertEqual(client.stream.call_count, 2)
 
-        listdir_mock_side_effect = [
-            [],
-            ["mock title.jpg"],
-            ["mock title.jpg"],
-            ["mock title.jpg", "mock title (1).jpg"],
-            ["mock title.jpg", "mock title (1).jpg"],
-            [
-                "mock title.jpg",
-                "mock title (1).jpg",
-                "mock title (2).jpg",
-            ],
+    async def test_download_all_does_not_retry_failed_requests(self):
+        # the client already retried the request, so it isn't sent again here
+        client = MagicMock()
+
+        @asynccontextmanager
+        async def stream(method, url, **kwargs):
+            raise httpx.ConnectError("mock error")
+            yield
+
+        client.stream = MagicMock(side_effect=stream)
+
+        wrapper = SubmissionWrapperFactory()
+        wrapper.title = "mock title"
+        wrapper.urls = ["url1"]
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(httpx.ConnectError):
+                await wrapper.download_all(
+                    directory, client, backoff=Backoff(attempts=4, base=0)
+                )
+        client.stream.assert_called_once()
+
+    async def test_download_all_retries_interrupted_download(self):
+        responses = iter(
             [
-                "mock title.jpg",
-                "mock title (1).jpg",
-                "mock title (2).jpg",
-            ],
-        ]
-
-        with patch(
-            "os.listdir", side_effect=listdir_mock_side_effect
-        ) as os_listdir_mock:
+                MockStreamResponse(error=httpx.ReadTimeout("mock timeout")),
+                MockStreamResponse(content=b"complete"),
+            ]
+        )
+        client = MagicMock()
+
+        @asynccontextmanager
+        async def stream(method, url, **kwargs):
+            yield next(responses)
+
+        client.stream = MagicMock(side_effect=stream)
+
+        wrapper = SubmissionWrapperFactory()
+        wrapper.title = "mock title"
+        wrapper.urls = ["url1"]
+
+        with tempfile.TemporaryDirectory() as directory:
             result = await wrapper.download_all(
-                directory=directory, client=httpx_client_mock, organize=True
+                directory, client, backoff=Backoff(base=0)
             )
+            with open(result["url1"], "rb") as file:
+                self.assertEqual(file.read(), b"complete")
+            self.assertEqual(os.listdir(directory), ["mock title.jpeg"])
+
+    async def test_download_all_records_to_manifest(self):
+        client = MockStreamClient(
+            {
+                "url1": MockStreamResponse(content=b"url1"),
+                "url2": MockStreamResponse(status_code=404),
+            }
+        )
 
-        os_listdir_mock.assert_called_with(os.path.join(directory, wrapper.subreddit))
+        wrapper = SubmissionWrapperFactory()
+        wrapper.title = "mock title"
+        wrapper.urls = ["url1", "url2"]
+        manifest = MagicMock()
+        manifest.get.return_value = None
+        manifest.find_url.return_value = None
+        manifest.find_content.return_value = None
+
+        with tempfile.TemporaryDirectory() as directory:
+            result = await wrapper.download_all(directory, client, manifest=manifest)
+
+        manifest.record.assert_called_once_with(
+            wrapper.id,
+            "url1",
+            DownloadRecord(result["url1"], 4, hashlib.sha256(b"url1").hexdigest()),
+        )
+        # url2 failed, so the submission isn't complete
+        manifest.complete.assert_not_called()
 
-        for key in expected.keys():
-            httpx_client_mock.get.assert_any_call(key, timeout=10)
+    async def test_download_all_skips_downloads_in_manifest(self):
+        client = MockStreamClient({"url2": MockStreamResponse()})
 
-        os_makedirs_mock.assert_called_with(
-            os.path.join(directory, wrapper.subreddit), exist_ok=True
+        wrapper = SubmissionWrapperFactory()
+        wrapper.title = "mock title"
+        wrapper.urls = ["url1", "url2"]
+
+        with tempfile.TemporaryDirectory() as directory:
+            previous = os.path.join(directory, "previous.jpeg")
+            with open(previous, "wb") as file:
+                file.write(b"previous")
+            manifest = MagicMock()
+            manifest.find_url.return_value = None
+            manifest.find_content.return_value = None
+            manifest.get.side_effect = lambda _, url: (
+                DownloadRecord(previous, 8, "mock hash") if url == "url1" else None
+            )
+
+            result = await wrapper.download_all(directory, client, manifest=manifest)
+
+        self.assertEqual(result["url1"], previous)
+        client.stream.assert_called_once_with("GET", "url2", headers={}, timeout=10)
+        manifest.complete.assert_called_once_with(wrapper.id)
+
+
+class TestDeduplication(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manifest = Manifest(os.path.join(self.directory.name, "manifest.sqlite3"))
+        self.output = os.path.join(self.directory.name, "output")
+
+    def tearDown(self):
+        self.manifest.close()
+        self.directory.cleanup()
+
+    async def download(self, urls_contents, link_duplicates=True):
+        client = MockStreamClient(
+            {url: MockStreamResponse(content=content) for url, content in urls_contents}
         )
+        wrapper = SubmissionWrapperFactory(id=str(uuid.uuid4()))
+        wrapper.title = "mock title"
+        wrapper.urls = [url for url, _ in urls_contents]
+        result = await wrapper.download_all(
+            self.output,
+            client,
+            manifest=self.manifest,
+            link_duplicates=link_duplicates,
+        )
+        return result, client
+
+    async def test_same_url_is_linked_without_downloading(self):
+        first, _ = await self.download([("url1", b"content")])
+        second, client = await self.download([("url1", b"content")])
+
+        client.stream.assert_not_called()
+        self.assertNotEqual(first["url1"], second["url1"])
+        self.assertTrue(os.path.samefile(first["url1"], second["url1"]))
+
+    async def test_same_content_is_linked(self):
+        first, _ = await self.download([("url1", b"content")])
+        second, client = await self.download([("url2", b"content")])
 
-        for value in expected.values():
-            file_mock.assert_any_call(value, "wb")
-        self.assertDictEqual(result, expected)
+        client.stream.assert_called_once_with("GET", "url2", headers={}, timeout=10)
+        self.assertTrue(os.path.samefile(first["url1"], second["url2"]))
+        self.assertEqual(len(os.listdir(self.output)), 2)
 
+    async def test_different_content_is_not_linked(self):
+        first, _ = await self.download([("url1", b"content")])
+        second, _ = await self.download([("url2", b"other content")])
+        self.assertFalse(os.path.samefile(first["url1"], second["url2"]))
 
-"""
+    async def test_duplicates_can_be_skipped(self):
+        first, _ = await self.download([("url1", b"content")])
+        second, _ = await self.download([("url2", b"content")], link_duplicates=False)
 
+        self.assertEqual(first["url1"], second["url2"])
+        self.assertEqual(os.listdir(self.output), ["mock title.jpeg"])
 
 
-"""
+class InterruptedStream(httpx.AsyncByteStream):
+    """A response body that's cut off after the given content"""
+
+    def __init__(self, content):
+        self.content = content
+
+    async def __aiter__(self):
+        yield self.content
+        raise httpx.ReadTimeout("mock timeout")
+
+
+class RangeServer:
+    """MockTransport handler for a file server that supports ranges"""
+
+    def __init__(self, content=b"0123456789", etag='"v1"', cut_off=None):
+        self.content = content
+        self.etag = etag
+        # number of bytes to send before the first response is interrupted
+        self.cut_off = cut_off
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        headers = {"Content-Type": "image/jpeg", "ETag": self.etag}
+        start = 0
+        if "Range" in request.headers and request.headers["If-Range"] == self.etag:
+            start = int(request.headers["Range"].removeprefix("bytes=").rstrip("-"))
+            headers["Content-Range"] = (
+                f"bytes {start}-{len(self.content) - 1}/{len(self.content)}"
+            )
+        content = self.content[start:]
+        headers["Content-Length"] = str(len(content))
+        status_code = 206 if start else 200
+        if self.cut_off is not None:
+            cut_off, self.cut_off = self.cut_off, None
+            return httpx.Response(
+                status_code,
+                headers=headers,
+                stream=InterruptedStream(content[:cut_off]),
+            )
+        return httpx.Response(status_code, headers=headers, content=content)
+
+
+class TestResume(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def download(self, server, attempts=2, **kwargs):
+        wrapper = SubmissionWrapperFactory()
+        wrapper.title = "mock title"
+        wrapper.urls = ["https://example.com/mock.jpg"]
+        async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as client:
+            # chunks are only written once they're full, so keep them small enough
+            #  for the interrupted part to be written
+            return await wrapper.download_all(
+                self.directory.name,
+                client,
+                chunk_size=2,
+                backoff=Backoff(attempts, base=0),
+                **kwargs,
+            )
+
+    async def test_retry_resumes_interrupted_download(self):
+        server = RangeServer(cut_off=4)
+        result = await self.download(server)
+
+        with open(result["https://example.com/mock.jpg"], "rb") as file:
+            self.assertEqual(file.read(), b"0123456789")
+        self.assertEqual(os.listdir(self.directory.name), ["mock title.jpeg"])
+        self.assertNotIn("Range", server.requests[0].headers)
+        self.assertEqual(server.requests[1].headers["Range"], "bytes=4-")
+        self.assertEqual(server.requests[1].headers["If-Range"], '"v1"')
+
+    async def test_next_run_resumes_interrupted_download(self):
+        with self.assertRaises(DownloadInterrupted):
+            await self.download(RangeServer(cut_off=4), attempts=1)
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+        server = RangeServer()
+        result = await self.download(server)
+        with open(result["https://example.com/mock.jpg"], "rb") as file:
+            self.assertEqual(file.read(), b"0123456789")
+        self.assertEqual(server.requests[0].headers["Range"], "bytes=4-")
+        self.assertEqual(os.listdir(self.directory.name), ["mock title.jpeg"])
+
+    async def test_resumed_download_is_hashed_in_worker_process(self):
+        manifest = MagicMock()
+        manifest.get.return_value = None
+        manifest.find_url.return_value = None
+        manifest.find_content.return_value = None
+        with CPUExecutor(workers=1) as executor:
+            result = await self.download(
+                RangeServer(cut_off=4), manifest=manifest, executor=executor
+            )
+        manifest.record.assert_called_once()
+        self.assertEqual(
+            manifest.record.call_args.args[1:],
+            (
+                "https://example.com/mock.jpg",
+                DownloadRecord(
+                    result["https://example.com/mock.jpg"],
+                    10,
+                    hashlib.sha256(b"0123456789").hexdigest(),
+                ),
+            ),
+        )
+
+    async def test_files_made_by_other_processes_are_not_overwritten(self):
+        filenames = FilenameIndex()
+        # the directory is listed before another process saves a file with the same name
+        filenames.allocate(self.directory.name, "other", ".jpeg")
+        with open(os.path.join(self.directory.name, "mock title.jpeg"), "wb") as file:
+            file.write(b"another process's file")
+
+        result = await self.download(RangeServer(), filenames=filenames)
+
+        with open(os.path.join(self.directory.name, "mock title.jpeg"), "rb") as file:
+            self.assertEqual(file.read(), b"another process's file")
+        self.assertEqual(
+            result["https://example.com/mock.jpg"],
+            os.path.join(self.directory.name, "mock title (1).jpeg"),
+        )
+        with open(result["https://example.com/mock.jpg"], "rb") as file:
+            self.assertEqual(file.read(), b"0123456789")
+
+    async def test_failed_move_leaves_nothing_under_final_name(self):
+        with patch("os.link", side_effect=OSError("mock error")), patch(
+            "os.replace", side_effect=OSError("mock error")
+        ):
+            with self.assertRaises(OSError):
+                await self.download(RangeServer())
+        self.assertNotIn("mock title.jpeg", os.listdir(self.directory.name))
+
+    async def test_wrong_range_is_downloaded_again(self):
+        with self.assertRaises(DownloadInterrupted):
+            await self.download(RangeServer(cut_off=4), attempts=1)
+
+        server = RangeServer()
+
+        def wrong_range(request):
+            response = server(request)
+            if response.status_code == 206:
+                # the server sends the range from the start of the file instead
+                response.headers["Content-Range"] = "bytes 0-9/10"
+            return response
+
+        result = await self.download(wrong_range)
+        with open(result["https://example.com/mock.jpg"], "rb") as file:
+            self.assertEqual(file.read(), b"0123456789")
+        self.assertEqual(server.requests[0].headers["Range"], "bytes=4-")
+        self.assertNotIn("Range", server.requests[1].headers)
+        self.assertEqual(os.listdir(self.directory.name), ["mock title.jpeg"])
+
+    async def test_changed_file_is_downloaded_again(self):
+        with self.assertRaises(DownloadInterrupted):
+            await self.download(RangeServer(cut_off=4), attempts=1)
+
+        result = await self.download(RangeServer(content=b"abcdefghij", etag='"v2"'))
+        with open(result["https://example.com/mock.jpg"], "rb") as file:
+            self.assertEqual(file.read(), b"abcdefghij")
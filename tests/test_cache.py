@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+
+from core import Cache
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_and_set(self):
+        with Cache(self.path) as cache:
+            self.assertIsNone(cache.get("mock key"))
+            cache.set("mock key", ["url1", "url2"])
+            self.assertEqual(cache.get("mock key"), ["url1", "url2"])
+            cache.set("mock key", ["url3"])
+            self.assertEqual(cache.get("mock key"), ["url3"])
+
+    def test_persists_between_instances(self):
+        with Cache(self.path) as cache:
+            cache.set("mock key", {"link": "mock link"})
+        with Cache(self.path) as cache:
+            self.assertEqual(cache.get("mock key"), {"link": "mock link"})
+
+    def test_tables_are_separate(self):
+        with Cache(self.path, table="first") as first, Cache(
+            self.path, table="second"
+        ) as second:
+            first.set("mock key", 1)
+            self.assertIsNone(second.get("mock key"))
+
+    def test_expired_entries_are_ignored(self):
+        with Cache(self.path, ttl=timedelta(seconds=-1)) as cache:
+            cache.set("mock key", 1)
+            self.assertIsNone(cache.get("mock key"))
+            cache.set("mock key", 1, ttl=timedelta(days=1))
+            self.assertEqual(cache.get("mock key"), 1)
+
+    def test_evict(self):
+        with Cache(self.path, max_entries=2) as cache:
+            cache.set("expired", 0, ttl=timedelta(seconds=-1))
+            for key in ["first", "second", "third"]:
+                cache.set(key, key)
+            # reading an entry makes it the most recently used
+            cache.get("first")
+            cache.evict()
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(cache.get("first"), "first")
+            self.assertIsNone(cache.get("second"))
+            self.assertEqual(cache.get("third"), "third")
+
+    def test_reads_do_not_write(self):
+        with Cache(self.path) as cache:
+            cache.set("mock key", 1)
+            changes = cache._connection.total_changes
+            for _ in range(10):
+                cache.get("mock key")
+            self.assertEqual(cache._connection.total_changes, changes)
+            self.assertFalse(cache._connection.in_transaction)
+
+    def test_reads_are_recorded_on_close(self):
+        with Cache(self.path) as cache:
+            for key in ["first", "second", "third"]:
+                cache.set(key, key)
+            cache.get("first")
+        with Cache(self.path, max_entries=2) as cache:
+            cache.evict()
+            self.assertEqual(cache.get("first"), "first")
+            self.assertIsNone(cache.get("second"))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            Cache(self.path, table="mock; table")
+        with self.assertRaises(ValueError):
+            Cache(self.path, max_entries=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
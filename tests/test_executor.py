@@ -0,0 +1,79 @@
+import asyncio
+import concurrent.futures
+import os
+import unittest
+from unittest.mock import patch
+
+from core.executor import CPUExecutor
+
+PARENT = os.getpid()
+
+
+def square(x):
+    return x * x
+
+
+def pid(_):
+    return os.getpid()
+
+
+def crash(x, parent):
+    # only crash in a worker process, so the serial fallback can still run it. Workers
+    #  are spawned, so they import this module again with their own PARENT
+    if os.getpid() != parent:
+        os._exit(1)
+    return x
+
+
+class TestCPUExecutor(unittest.IsolatedAsyncioTestCase):
+    async def test_serial(self):
+        executor = CPUExecutor(workers=0)
+        self.assertFalse(executor.parallel)
+        self.assertEqual(await executor.run(square, 3), 9)
+        self.assertEqual(await executor.run(pid, 0), PARENT)
+
+    async def test_runs_in_worker_processes(self):
+        with CPUExecutor(workers=2) as executor:
+            self.assertEqual(
+                await asyncio.gather(*(executor.run(square, i) for i in range(50))),
+                [i * i for i in range(50)],
+            )
+            pids = await asyncio.gather(*(executor.run(pid, i) for i in range(4)))
+        self.assertNotIn(PARENT, pids)
+
+    async def test_spawns_workers(self):
+        with patch(
+            "concurrent.futures.ProcessPoolExecutor",
+            wraps=concurrent.futures.ProcessPoolExecutor,
+        ) as pool_mock:
+            with CPUExecutor(workers=1) as executor:
+                await executor.run(square, 2)
+        self.assertEqual(
+            pool_mock.call_args.kwargs["mp_context"].get_start_method(), "spawn"
+        )
+
+    async def test_defaults_to_one_worker_per_cpu(self):
+        self.assertEqual(CPUExecutor().workers, os.cpu_count() or 1)
+
+    async def test_falls_back_to_serial_if_pool_cannot_start(self):
+        with patch(
+            "concurrent.futures.ProcessPoolExecutor", side_effect=NotImplementedError
+        ):
+            executor = CPUExecutor(workers=2)
+            self.assertEqual(await executor.run(pid, 0), PARENT)
+        self.assertFalse(executor.parallel)
+
+    async def test_falls_back_to_serial_if_pool_breaks(self):
+        executor = CPUExecutor(workers=1)
+        self.assertEqual(
+            await asyncio.gather(
+                executor.run(crash, 1, PARENT), executor.run(crash, 2, PARENT)
+            ),
+            [1, 2],
+        )
+        self.assertFalse(executor.parallel)
+        self.assertEqual(await executor.run(pid, 0), PARENT)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            CPUExecutor(workers=-1)
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from core.filenames import FilenameIndex
+
+
+class TestFilenameIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_allocates_unique_names(self):
+        index = FilenameIndex()
+        self.assertEqual(index.allocate(self.path, "title", ".jpg"), "title.jpg")
+        self.assertEqual(index.allocate(self.path, "title", ".jpg"), "title (1).jpg")
+        self.assertEqual(index.allocate(self.path, "title", ".jpg"), "title (2).jpg")
+        self.assertEqual(index.allocate(self.path, "title", ".png"), "title.png")
+        self.assertEqual(index.allocate(self.path, "other", ".jpg"), "other.jpg")
+
+    def test_skips_existing_files(self):
+        for filename in ["title.jpg", "title (1).jpg", "title (3).jpg"]:
+            open(os.path.join(self.path, filename), "w").close()
+        index = FilenameIndex()
+        self.assertEqual(index.allocate(self.path, "title", ".jpg"), "title (2).jpg")
+        self.assertEqual(index.allocate(self.path, "title", ".jpg"), "title (4).jpg")
+
+    def test_lists_each_directory_once(self):
+        index = FilenameIndex()
+        with patch("os.listdir", wraps=os.listdir) as listdir_mock:
+            for _ in range(5):
+                index.allocate(self.path, "title", ".jpg")
+        listdir_mock.assert_called_once()
+
+    def test_directories_are_separate(self):
+        other = os.path.join(self.path, "other")
+        os.makedirs(other)
+        index = FilenameIndex()
+        self.assertEqual(index.allocate(self.path, "title", ".jpg"), "title.jpg")
+        self.assertEqual(index.allocate(other, "title", ".jpg"), "title.jpg")
+
+    def test_released_names_are_reused(self):
+        index = FilenameIndex()
+        for _ in range(3):
+            index.allocate(self.path, "title", ".jpg")
+        index.release(self.path, "title (1).jpg")
+        self.assertEqual(index.allocate(self.path, "title", ".jpg"), "title (1).jpg")
+        self.assertEqual(index.allocate(self.path, "title", ".jpg"), "title (3).jpg")
+        index.release(self.path, "title.jpg")
+        self.assertEqual(index.allocate(self.path, "title", ".jpg"), "title.jpg")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import asyncio
+import time
+import unittest
+
+import httpx
+
+from core.governor import Governor, RateLimit, TokenBucket
+
+IMGUR_LIKE = RateLimit(
+    rate=1000,
+    burst=10,
+    remaining_headers=("X-Client-Remaining", "X-User-Remaining"),
+    reset_header="X-Reset",
+    default_reset=0.05,
+    reserve=2,
+)
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def test_paces_requests(self):
+        bucket = TokenBucket(RateLimit(rate=100, burst=1))
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        # the first request is sent straight away, then one every 0.01 seconds
+        self.assertGreaterEqual(time.monotonic() - start, 0.045)
+
+    async def test_allows_bursts(self):
+        bucket = TokenBucket(RateLimit(rate=1, burst=5))
+        await asyncio.wait_for(
+            asyncio.gather(*(bucket.acquire() for _ in range(5))), 0.1
+        )
+
+    def test_reads_smallest_remaining(self):
+        bucket = TokenBucket(IMGUR_LIKE)
+        bucket.update(
+            httpx.Response(
+                200, headers={"X-Client-Remaining": "500", "X-User-Remaining": "40"}
+            )
+        )
+        self.assertEqual(bucket.remaining, 40)
+        self.assertEqual(bucket.paused_until, 0)
+
+    def test_pauses_until_reset_when_quota_runs_out(self):
+        bucket = TokenBucket(IMGUR_LIKE)
+        before = time.monotonic()
+        bucket.update(
+            httpx.Response(200, headers={"X-Client-Remaining": "2", "X-Reset": "30"})
+        )
+        self.assertAlmostEqual(bucket.paused_until - before, 30, delta=1)
+
+    def test_reset_timestamp(self):
+        bucket = TokenBucket(
+            RateLimit(
+                rate=1,
+                remaining_headers=("X-Remaining",),
+                reset_header="X-Reset",
+                reset_is_timestamp=True,
+            )
+        )
+        before = time.monotonic()
+        bucket.update(
+            httpx.Response(
+                200,
+                headers={"X-Remaining": "0", "X-Reset": str(int(time.time()) + 100)},
+            )
+        )
+        self.assertAlmostEqual(bucket.paused_until - before, 100, delta=2)
+
+    def test_pauses_on_too_many_requests(self):
+        bucket = TokenBucket(IMGUR_LIKE)
+        before = time.monotonic()
+        bucket.update(httpx.Response(429, headers={"Retry-After": "7"}))
+        self.assertAlmostEqual(bucket.paused_until - before, 7, delta=1)
+
+    async def test_resumes_after_pause(self):
+        bucket = TokenBucket(IMGUR_LIKE)
+        bucket.update(httpx.Response(200, headers={"X-Client-Remaining": "0"}))
+        start = time.monotonic()
+        await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    async def test_counts_down_remaining_quota(self):
+        bucket = TokenBucket(IMGUR_LIKE)
+        bucket.update(httpx.Response(200, headers={"X-Client-Remaining": "4"}))
+        await bucket.acquire()
+        await bucket.acquire()
+        # two requests left, but they're held in reserve
+        start = time.monotonic()
+        await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    async def test_counted_down_quota_waits_for_reported_reset(self):
+        bucket = TokenBucket(
+            RateLimit(
+                rate=1000,
+                burst=10,
+                remaining_headers=("X-Remaining",),
+                reset_header="X-Reset",
+                default_reset=3600,
+                reserve=10,
+            )
+        )
+        bucket.update(
+            httpx.Response(200, headers={"X-Remaining": "12", "X-Reset": "5"})
+        )
+        await bucket.acquire()
+        await bucket.acquire()
+        # by the bucket's count, only the reserve is left
+        third = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0.01)
+        self.assertFalse(third.done())
+        self.assertLessEqual(bucket.paused_until - time.monotonic(), 5)
+
+        # a request that was in flight says there's plenty of quota left after all
+        bucket.update(
+            httpx.Response(200, headers={"X-Remaining": "50", "X-Reset": "5"})
+        )
+        await asyncio.wait_for(third, 0.1)
+        self.assertEqual(bucket.remaining, 49)
+
+    async def test_reported_pause_is_not_called_off(self):
+        bucket = TokenBucket(IMGUR_LIKE)
+        bucket.update(httpx.Response(429, headers={"Retry-After": "30"}))
+        bucket.update(httpx.Response(200, headers={"X-Client-Remaining": "50"}))
+        self.assertGreater(bucket.paused_until - time.monotonic(), 25)
+
+
+class TestGovernor(unittest.IsolatedAsyncioTestCase):
+    async def test_only_limits_listed_hosts(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request.url.host)
+            return httpx.Response(
+                200, headers={"X-Client-Remaining": "0", "X-Reset": "30"}
+            )
+
+        governor = Governor(httpx.MockTransport(handler), {"api.mock.com": IMGUR_LIKE})
+        async with httpx.AsyncClient(transport=governor) as client:
+            await client.get("https://api.mock.com")
+            # the quota for api.mock.com is used up, but other hosts are unaffected
+            for _ in range(3):
+                await asyncio.wait_for(client.get("https://other.com"), 0.1)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.get("https://api.mock.com"), 0.1)
+        self.assertEqual(requests, ["api.mock.com"] + 3 * ["other.com"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+
+from core.journal import DOWNLOADED, FINISHED, RESOLVED, SKIPPED, UNSAVED, Journal
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "journal.sqlite3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_cursor_is_last_submission_seen(self):
+        with Journal(self.path) as journal:
+            journal.begin("saved")
+            self.assertIsNone(journal.cursor())
+            journal.seen("t3_a")
+            journal.seen("t3_b")
+            # seeing a submission again doesn't move the cursor back
+            journal.seen("t3_a")
+            self.assertEqual(journal.cursor(), "t3_b")
+
+    def test_record_and_reached(self):
+        with Journal(self.path) as journal:
+            journal.begin("saved")
+            journal.seen("t3_a")
+            self.assertFalse(journal.reached("t3_a", RESOLVED))
+            journal.record("t3_a", DOWNLOADED)
+            self.assertTrue(journal.reached("t3_a", RESOLVED))
+            self.assertTrue(journal.reached("t3_a", DOWNLOADED))
+            self.assertFalse(journal.reached("t3_a", UNSAVED))
+            # stages never go backwards
+            journal.record("t3_a", RESOLVED)
+            self.assertTrue(journal.reached("t3_a", DOWNLOADED))
+            self.assertFalse(journal.reached("t3_b", RESOLVED))
+            with self.assertRaises(ValueError):
+                journal.record("t3_a", "mock stage")
+
+    def test_unfinished(self):
+        with Journal(self.path) as journal:
+            journal.begin("saved")
+            for fullname in ["t3_a", "t3_b", "t3_c"]:
+                journal.seen(fullname)
+            journal.record("t3_a", UNSAVED)
+            journal.record("t3_b", FINISHED)
+            self.assertEqual(journal.unfinished(), ["t3_a", "t3_c"])
+
+    def test_skipped(self):
+        with Journal(self.path) as journal:
+            journal.begin("saved")
+            for fullname in ["t3_a", "t3_b"]:
+                journal.seen(fullname)
+            journal.record("t3_a", SKIPPED)
+            self.assertTrue(journal.reached("t3_a", FINISHED))
+            self.assertEqual(journal.unfinished(), ["t3_b"])
+
+    def test_count(self):
+        with Journal(self.path) as journal:
+            journal.begin("saved,r/pics/hot")
+            for fullname in ["t3_a", "t3_b", "t3_c", "t3_d"]:
+                journal.seen(fullname, "saved")
+            journal.seen("t3_e", "r/pics/hot")
+            journal.record("t3_a", RESOLVED)
+            journal.record("t3_b", FINISHED)
+            journal.record("t3_c", SKIPPED)
+            journal.record("t3_e", DOWNLOADED)
+            self.assertEqual(journal.count(RESOLVED, "saved"), 2)
+            self.assertEqual(journal.count(FINISHED, "saved"), 1)
+            self.assertEqual(journal.count(RESOLVED), 3)
+            with self.assertRaises(ValueError):
+                journal.count("mock stage")
+
+    def test_cursor_and_unfinished_per_listing(self):
+        with Journal(self.path) as journal:
+            journal.begin("saved,r/pics/hot")
+            journal.seen("t3_a", "saved")
+            journal.seen("t3_b", "r/pics/hot")
+            journal.seen("t3_c", "saved")
+            journal.record("t3_c", FINISHED)
+            self.assertEqual(journal.cursor("saved"), "t3_c")
+            self.assertEqual(journal.cursor("r/pics/hot"), "t3_b")
+            self.assertIsNone(journal.cursor("r/aww/hot"))
+            self.assertEqual(journal.cursor(), "t3_c")
+            self.assertEqual(journal.unfinished("saved"), ["t3_a"])
+            self.assertEqual(journal.unfinished(), ["t3_a", "t3_b"])
+
+    def test_resumes_same_source(self):
+        with Journal(self.path) as journal:
+            self.assertFalse(journal.begin("saved"))
+            journal.seen("t3_a")
+        with Journal(self.path) as journal:
+            self.assertTrue(journal.begin("saved", resume=True))
+            self.assertEqual(journal.source, "saved")
+            self.assertEqual(journal.cursor(), "t3_a")
+
+    def test_starts_over_without_resume_or_with_other_source(self):
+        with Journal(self.path) as journal:
+            journal.begin("saved")
+            journal.seen("t3_a")
+            self.assertFalse(journal.begin("r/pics", resume=True))
+            self.assertIsNone(journal.cursor())
+            self.assertEqual(journal.source, "r/pics")
+            journal.seen("t3_b")
+            self.assertFalse(journal.begin("r/pics"))
+            self.assertIsNone(journal.cursor())
+
+
+if __name__ == "__main__":
+    unittest.main()
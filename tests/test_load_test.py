@@ -0,0 +1,39 @@
+import unittest
+
+from benchmarks.fakes import FakeListing, ServiceConfig
+from benchmarks.load_test import run, run_in_process
+
+
+class TestLoadTest(unittest.IsolatedAsyncioTestCase):
+    config = ServiceConfig(latency=0, page_latency=0)
+
+    async def test_saved(self):
+        report = await run(20, self.config)
+        self.assertEqual(report["posts"], 20)
+        # every post except the ones linking to unsupported pages resolves
+        self.assertEqual(
+            report["resolved_posts"],
+            sum(
+                not post.url.endswith(".html") for post in FakeListing(20, self.config)
+            ),
+        )
+        self.assertGreaterEqual(report["files"], report["resolved_posts"])
+        self.assertGreater(report["bytes"], 0)
+        self.assertGreater(report["peak_rss_bytes"], 0)
+
+    async def test_subreddit(self):
+        report = await run(20, self.config, source="subreddit")
+        self.assertGreater(report["resolved_posts"], 0)
+
+    async def test_errors_are_retried(self):
+        config = ServiceConfig(latency=0, page_latency=0, error_rate=0.2)
+        report = await run(20, config, attempts=10)
+        self.assertGreater(report["requests"], (await run(20, self.config))["requests"])
+        self.assertGreater(report["files"], 0)
+
+
+class TestRunInProcess(unittest.TestCase):
+    def test_run_in_process(self):
+        report = run_in_process(20, ServiceConfig(latency=0, page_latency=0))
+        self.assertEqual(report["posts"], 20)
+        self.assertGreater(report["peak_rss_bytes"], 0)
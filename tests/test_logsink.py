@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from core.logsink import LogSink
+
+
+class TestLogSink(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "Logs", "log.txt")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, path):
+        with open(path, encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+
+    async def test_writes_json_lines(self):
+        async with LogSink(self.path) as sink:
+            await sink.log({"id": "a", "recognized_urls": ["url1"]})
+            await sink.log({"id": "b", "exception": "mock exception"})
+        self.assertEqual(
+            self.read(self.path),
+            [
+                {"id": "a", "recognized_urls": ["url1"]},
+                {"id": "b", "exception": "mock exception"},
+            ],
+        )
+
+    async def test_writes_in_batches(self):
+        sink = LogSink(self.path, batch_size=4)
+        with patch.object(sink, "_write", wraps=sink._write) as mock_write:
+            sink.start()
+            # the queue never fills, so every record is queued before the writer runs
+            for i in range(10):
+                await sink.log({"id": i})
+            await sink.close()
+        self.assertEqual(
+            [record["id"] for record in self.read(self.path)], list(range(10))
+        )
+        self.assertEqual(
+            [len(call.args[0]) for call in mock_write.call_args_list], [4, 4, 2]
+        )
+
+    async def test_flushes_on_close(self):
+        sink = LogSink(self.path)
+        sink.start()
+        for i in range(100):
+            await sink.log({"id": i})
+        await sink.close()
+        self.assertEqual(len(self.read(self.path)), 100)
+        with self.assertRaises(RuntimeError):
+            await sink.log({"id": "late"})
+
+    async def test_rotates_by_size(self):
+        async with LogSink(self.path, max_bytes=30, backups=2, batch_size=1) as sink:
+            for i in range(5):
+                await sink.log({"id": f"record {i}"})
+        self.assertEqual(self.read(self.path), [{"id": "record 4"}])
+        self.assertEqual(self.read(self.path + ".1"), [{"id": "record 3"}])
+        self.assertEqual(self.read(self.path + ".2"), [{"id": "record 2"}])
+        self.assertFalse(os.path.exists(self.path + ".3"))
+
+    async def test_requires_start(self):
+        with self.assertRaises(RuntimeError):
+            await LogSink(self.path).log({"id": "a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
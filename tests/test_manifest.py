@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from core.manifest import DownloadRecord, Manifest
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "manifest.sqlite3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_record_and_get(self):
+        download = DownloadRecord("mock path", 10, "mock hash")
+        with Manifest(self.path) as manifest:
+            self.assertIsNone(manifest.get("mock id", "mock url"))
+            manifest.record("mock id", "mock url", download)
+            self.assertEqual(manifest.get("mock id", "mock url"), download)
+            self.assertIsNone(manifest.get("other id", "mock url"))
+            self.assertIsNone(manifest.get("mock id", "other url"))
+
+    def test_complete(self):
+        with Manifest(self.path) as manifest:
+            self.assertFalse(manifest.is_complete("mock id"))
+            manifest.complete("mock id")
+            self.assertTrue(manifest.is_complete("mock id"))
+        with Manifest(self.path) as manifest:
+            self.assertTrue(manifest.is_complete("mock id"))
+            self.assertFalse(manifest.is_complete("other id"))
+
+
+class TestDownloadRecord(unittest.TestCase):
+    def test_exists(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "mock file")
+            self.assertFalse(DownloadRecord(path, 4, "mock hash").exists())
+            with open(path, "wb") as file:
+                file.write(b"1234")
+            self.assertTrue(DownloadRecord(path, 4, "mock hash").exists())
+            self.assertFalse(DownloadRecord(path, 5, "mock hash").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
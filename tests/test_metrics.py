@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from core.metrics import Histogram, Metrics, Recorder
+
+
+class TestHistogram(unittest.TestCase):
+    def test_cumulative_buckets(self):
+        histogram = Histogram([1, 5])
+        for value in [0.5, 1, 3, 10]:
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [("1", 2), ("5", 3), ("+Inf", 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 14.5)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counters_and_gauges(self):
+        metrics = Metrics()
+        metrics.increment("requests_total", host="a.com")
+        metrics.increment("requests_total", 2, host="a.com")
+        metrics.increment("requests_total", host="b.com")
+        metrics.maximum("queue_depth_peak", 3, stage="download")
+        metrics.maximum("queue_depth_peak", 1, stage="download")
+        self.assertEqual(
+            metrics.counters["requests_total"],
+            {(("host", "a.com"),): 3, (("host", "b.com"),): 1},
+        )
+        self.assertEqual(
+            metrics.gauges["queue_depth_peak"], {(("stage", "download"),): 3}
+        )
+
+    def test_time(self):
+        metrics = Metrics()
+        with metrics.time("download", host="a.com"):
+            pass
+        with self.assertRaises(httpx.ReadTimeout):
+            with metrics.time("download", host="a.com"):
+                raise httpx.ReadTimeout("mock timeout")
+        self.assertEqual(
+            metrics.histograms["download_seconds"][(("host", "a.com"),)].count, 1
+        )
+        self.assertEqual(
+            metrics.counters["download_errors_total"],
+            {(("error", "ReadTimeout"), ("host", "a.com")): 1},
+        )
+
+    def test_to_prometheus(self):
+        metrics = Metrics(buckets=[1])
+        metrics.increment("requests_total", host='a"b.com')
+        metrics.observe("request_seconds", 0.5, host="a.com")
+        self.assertEqual(
+            metrics.to_prometheus().splitlines(),
+            [
+                "# TYPE paperscraper_requests_total counter",
+                'paperscraper_requests_total{host="a\\"b.com"} 1',
+                "# TYPE paperscraper_request_seconds histogram",
+                'paperscraper_request_seconds_bucket{host="a.com",le="1"} 1',
+                'paperscraper_request_seconds_bucket{host="a.com",le="+Inf"} 1',
+                'paperscraper_request_seconds_sum{host="a.com"} 0.5',
+                'paperscraper_request_seconds_count{host="a.com"} 1',
+            ],
+        )
+
+    def test_write(self):
+        metrics = Metrics()
+        metrics.increment("requests_total", host="a.com")
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = os.path.join(directory, "Logs", "metrics.json")
+            prometheus_path = os.path.join(directory, "Logs", "metrics.prom")
+            metrics.write(json_path, prometheus_path)
+            with open(json_path, encoding="utf-8") as file:
+                report = json.load(file)
+            self.assertEqual(
+                report["counters"]["requests_total"],
+                [{"labels": {"host": "a.com"}, "value": 1}],
+            )
+            with open(prometheus_path, encoding="utf-8") as file:
+                self.assertIn(
+                    'paperscraper_requests_total{host="a.com"} 1', file.read()
+                )
+            self.assertCountEqual(
+                os.listdir(os.path.join(directory, "Logs")),
+                ["metrics.json", "metrics.prom"],
+            )
+
+
+class TestRecorder(unittest.IsolatedAsyncioTestCase):
+    async def test_records_requests(self):
+        metrics = Metrics()
+        transport = Recorder(
+            httpx.MockTransport(lambda request: httpx.Response(200, content=b"12345")),
+            metrics,
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get("https://a.com/1")
+            await client.get("https://a.com/2")
+
+        self.assertEqual(metrics.counters["requests_total"], {(("host", "a.com"),): 2})
+        self.assertEqual(
+            metrics.counters["responses_total"],
+            {(("host", "a.com"), ("status", "200")): 2},
+        )
+        self.assertEqual(
+            metrics.counters["response_bytes_total"], {(("host", "a.com"),): 10}
+        )
+        self.assertEqual(
+            metrics.histograms["request_seconds"][(("host", "a.com"),)].count, 2
+        )
+
+    async def test_records_errors(self):
+        def handler(request):
+            raise httpx.ConnectError("mock error")
+
+        metrics = Metrics()
+        async with httpx.AsyncClient(
+            transport=Recorder(httpx.MockTransport(handler), metrics)
+        ) as client:
+            with self.assertRaises(httpx.ConnectError):
+                await client.get("https://a.com/")
+        self.assertEqual(
+            metrics.counters["request_errors_total"],
+            {(("error", "ConnectError"), ("host", "a.com")): 1},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
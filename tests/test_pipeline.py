@@ -0,0 +1,302 @@
+import asyncio
+import time
+import unittest
+
+from core.metrics import Metrics
+from core.pipeline import Pipeline, Stage, interleave, prefetch
+
+
+async def double(x):
+    return 2 * x
+
+
+async def odd_only(x):
+    return x if x % 2 else None
+
+
+class TestPipeline(unittest.IsolatedAsyncioTestCase):
+    async def test_runs_every_stage(self):
+        result = await Pipeline(Stage(double), Stage(double, workers=3)).run(range(5))
+        self.assertCountEqual(result, [0, 4, 8, 12, 16])
+
+    async def test_none_drops_item(self):
+        result = await Pipeline(Stage(odd_only), Stage(double)).run(range(6))
+        self.assertCountEqual(result, [2, 6, 10])
+
+    async def test_accepts_async_source(self):
+        async def source():
+            for i in range(3):
+                yield i
+
+        self.assertCountEqual(await Pipeline(Stage(double)).run(source()), [0, 2, 4])
+
+    async def test_limit_stops_reading_source(self):
+        taken = []
+
+        def source():
+            for i in range(100):
+                taken.append(i)
+                yield i
+
+        result = await Pipeline(Stage(odd_only, limit=3), Stage(double)).run(source())
+        self.assertCountEqual(result, [2, 6, 10])
+        self.assertLess(len(taken), 100)
+
+    async def test_stages_overlap(self):
+        # the first item reaches the last stage before the source is exhausted
+        events = []
+
+        async def source():
+            for i in range(10):
+                events.append(("read", i))
+                await asyncio.sleep(0.001)
+                yield i
+
+        async def finish(x):
+            events.append(("finished", x))
+            return x
+
+        await Pipeline(Stage(double), Stage(finish)).run(source())
+        self.assertLess(events.index(("finished", 0)), events.index(("read", 9)))
+
+    async def test_backpressure(self):
+        most_waiting = 0
+        queue_size = 0
+
+        async def produce(x):
+            nonlocal queue_size, most_waiting
+            queue_size += 1
+            most_waiting = max(most_waiting, queue_size)
+            return x
+
+        async def consume(x):
+            nonlocal queue_size
+            await asyncio.sleep(0.001)
+            queue_size -= 1
+            return x
+
+        await Pipeline(Stage(produce), Stage(consume, buffer=2)).run(range(20))
+        # 2 waiting in the queue, 1 being consumed, and 1 waiting to be put in the queue
+        self.assertLessEqual(most_waiting, 4)
+
+    async def test_raises_stage_exceptions(self):
+        async def fail(x):
+            raise KeyError("mock error")
+
+        with self.assertRaises(KeyError):
+            await Pipeline(Stage(double), Stage(fail)).run(range(5))
+
+    async def test_errors_are_handled_per_item(self):
+        async def fail_on_three(x):
+            if x == 3:
+                raise KeyError("mock error")
+            return x
+
+        metrics = Metrics()
+        results = await Pipeline(
+            Stage(fail_on_three, errors=lambda item, e: f"{item}: {e!r}", name="mock"),
+            Stage(double),
+            metrics=metrics,
+        ).run(range(5))
+
+        self.assertCountEqual(results, [0, 2, 4, "3: KeyError('mock error')" * 2, 8])
+        self.assertEqual(
+            metrics.counters["stage_items_total"][
+                (("outcome", "failed"), ("stage", "mock"))
+            ],
+            1,
+        )
+
+    async def test_records_metrics(self):
+        metrics = Metrics()
+        await Pipeline(Stage(odd_only, name="odd"), Stage(double), metrics=metrics).run(
+            range(6)
+        )
+        self.assertEqual(
+            metrics.counters["stage_items_total"],
+            {
+                (("outcome", "dropped"), ("stage", "odd")): 3,
+                (("outcome", "passed"), ("stage", "odd")): 3,
+                (("outcome", "passed"), ("stage", "1")): 3,
+            },
+        )
+        self.assertEqual(
+            metrics.histograms["stage_seconds"][(("stage", "odd"),)].count, 6
+        )
+        self.assertIn((("stage", "1"),), metrics.gauges["queue_depth_peak"])
+
+    async def test_stream_yields_before_source_is_exhausted(self):
+        read = []
+
+        async def source():
+            for i in range(10):
+                read.append(i)
+                await asyncio.sleep(0.001)
+                yield i
+
+        results = []
+        async for result in Pipeline(Stage(double)).stream(source()):
+            results.append((result, len(read)))
+        self.assertCountEqual([result for result, _ in results], range(0, 20, 2))
+        self.assertLess(results[0][1], 10)
+
+    async def test_stream_stops_when_closed(self):
+        taken = []
+
+        def source():
+            for i in range(100):
+                taken.append(i)
+                yield i
+
+        stream = Pipeline(Stage(double)).stream(source())
+        self.assertEqual(await anext(stream), 0)
+        await stream.aclose()
+        # the source is only read as far as the stage's buffer
+        self.assertLess(len(taken), 10)
+        self.assertEqual(len(asyncio.all_tasks()), 1)
+
+    async def test_stream_waits_for_caller(self):
+        taken = []
+
+        def source():
+            for i in range(100):
+                taken.append(i)
+                yield i
+
+        stream = Pipeline(Stage(double, buffer=1)).stream(source())
+        await anext(stream)
+        await asyncio.sleep(0.01)
+        self.assertLess(len(taken), 10)
+        await stream.aclose()
+
+    async def test_stream_raises_stage_exceptions(self):
+        async def fail(x):
+            raise KeyError("mock error")
+
+        with self.assertRaises(KeyError):
+            async for _ in Pipeline(Stage(double), Stage(fail)).stream(range(5)):
+                pass
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            Pipeline()
+        with self.assertRaises(ValueError):
+            Stage(double, workers=0)
+        with self.assertRaises(ValueError):
+            Stage(double, limit=0)
+
+
+class TestPrefetch(unittest.IsolatedAsyncioTestCase):
+    async def test_yields_every_item(self):
+        self.assertEqual(
+            [item async for item in prefetch(range(250))], list(range(250))
+        )
+
+    async def test_does_not_block_event_loop(self):
+        ticks = 0
+
+        def slow_source():
+            for i in range(3):
+                time.sleep(0.02)
+                yield i
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        ticker = asyncio.create_task(tick())
+        items = [item async for item in prefetch(slow_source())]
+        ticker.cancel()
+        self.assertEqual(items, [0, 1, 2])
+        self.assertGreater(ticks, 3)
+
+    async def test_reads_ahead(self):
+        read = []
+
+        def source():
+            for i in range(10):
+                read.append(i)
+                yield i
+
+        items = prefetch(source(), buffer=5)
+        self.assertEqual(await anext(items), 0)
+        await asyncio.sleep(0.05)
+        # one item taken, five waiting in the buffer, and one waiting for room
+        self.assertEqual(read, list(range(7)))
+        await items.aclose()
+
+    async def test_stops_reading_when_closed(self):
+        read = []
+
+        def source():
+            for i in range(1000):
+                read.append(i)
+                yield i
+
+        items = prefetch(source(), buffer=2)
+        await anext(items)
+        await items.aclose()
+        await asyncio.sleep(0.05)
+        self.assertLess(len(read), 10)
+
+    async def test_raises_source_exceptions(self):
+        def source():
+            yield 1
+            raise KeyError("mock error")
+
+        with self.assertRaises(KeyError):
+            [item async for item in prefetch(source())]
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+async def count(name, amount, delay=0):
+    for i in range(amount):
+        await asyncio.sleep(delay)
+        yield f"{name}{i}"
+
+
+class TestInterleave(unittest.IsolatedAsyncioTestCase):
+    async def test_takes_turns(self):
+        result = [item async for item in interleave(count("a", 3), count("b", 3))]
+        self.assertEqual(result, ["a0", "b0", "a1", "b1", "a2", "b2"])
+
+    async def test_continues_after_a_source_runs_out(self):
+        result = [item async for item in interleave(count("a", 1), count("b", 3))]
+        self.assertEqual(result, ["a0", "b0", "b1", "b2"])
+
+    async def test_slow_source_does_not_hold_back_others(self):
+        result = [
+            item async for item in interleave(count("a", 2, delay=0.05), count("b", 5))
+        ]
+        self.assertCountEqual(result, ["a0", "a1", "b0", "b1", "b2", "b3", "b4"])
+        self.assertLess(result.index("b4"), result.index("a0"))
+
+    async def test_closes_sources(self):
+        closed = []
+
+        async def source(name):
+            try:
+                while True:
+                    await asyncio.sleep(0)
+                    yield name
+            finally:
+                closed.append(name)
+
+        stream = interleave(source("a"), source("b"))
+        self.assertEqual([await anext(stream) for _ in range(4)], ["a", "b", "a", "b"])
+        await stream.aclose()
+        self.assertCountEqual(closed, ["a", "b"])
+
+    async def test_raises_source_exceptions(self):
+        async def fail():
+            raise KeyError("mock error")
+            yield
+
+        with self.assertRaises(KeyError):
+            async for _ in interleave(count("a", 3), fail()):
+                pass
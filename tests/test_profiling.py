@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from core.metrics import Metrics
+from core.profiling import StallMonitor
+
+
+def block(seconds):
+    time.sleep(seconds)
+
+
+async def blocking_coroutine():
+    await asyncio.sleep(0)
+    block(0.2)
+
+
+class TestStallMonitor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.monitor = StallMonitor(0.05, metrics=self.metrics)
+
+    async def test_finds_blocking_call(self):
+        async with self.monitor:
+            await blocking_coroutine()
+            # give the watchdog time to see the loop tick again
+            await asyncio.sleep(0.1)
+        report = self.monitor.report()
+        self.assertEqual(len(report["stalls"]), 1)
+        stall = report["stalls"][0]
+        self.assertEqual(stall["count"], 1)
+        self.assertGreater(stall["seconds"], 0.1)
+        # the innermost frames are the ones that were blocking
+        self.assertIn("in block", stall["stack"][0])
+        self.assertTrue(any("in blocking_coroutine" in line for line in stall["stack"]))
+        self.assertIn("loop_stall_seconds", self.metrics.histograms)
+
+    async def test_finds_slow_callback(self):
+        async with self.monitor:
+            await asyncio.create_task(blocking_coroutine())
+        callbacks = self.monitor.report()["slow_callbacks"]
+        self.assertTrue(any("blocking_coroutine" in c["callback"] for c in callbacks))
+        self.assertGreater(callbacks[0]["longest"], 0.1)
+        self.assertIn("slow_callback_seconds", self.metrics.histograms)
+
+    async def test_ignores_cooperative_code(self):
+        async with self.monitor:
+            for _ in range(5):
+                await asyncio.sleep(0.02)
+        report = self.monitor.report()
+        self.assertEqual(report["stalls"], [])
+        self.assertEqual(report["slow_callbacks"], [])
+
+    async def test_stop_restores_loop(self):
+        loop = asyncio.get_running_loop()
+        loop.set_debug(False)
+        async with self.monitor:
+            self.assertTrue(loop.get_debug())
+            self.assertEqual(loop.slow_callback_duration, 0.05)
+        self.assertFalse(loop.get_debug())
+        self.assertEqual(loop.slow_callback_duration, 0.1)
+
+    async def test_write(self):
+        async with self.monitor:
+            await blocking_coroutine()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "Logs", "stalls.json")
+            self.monitor.write(path)
+            with open(path, encoding="utf-8") as file:
+                self.assertEqual(json.load(file), self.monitor.report())
+
+    def test_threshold_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            StallMonitor(0)
@@ -0,0 +1,154 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+
+from core.retry import Backoff, Retrier, retry, retry_after
+
+NO_WAIT = Backoff(attempts=3, base=0)
+
+
+def sequence_handler(*outcomes):
+    """MockTransport handler that returns (or raises) each of the given outcomes in turn"""
+    outcomes = iter(outcomes)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return handler, requests
+
+
+class TestBackoff(unittest.TestCase):
+    def test_delay_grows_and_is_capped(self):
+        backoff = Backoff(base=1, cap=5)
+        for _ in range(100):
+            self.assertLessEqual(backoff.delay(0), 1)
+            self.assertLessEqual(backoff.delay(2), 4)
+            self.assertLessEqual(backoff.delay(10), 5)
+
+    def test_invalid_attempts(self):
+        with self.assertRaises(ValueError):
+            Backoff(attempts=0)
+
+
+class TestRetryAfter(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(
+            retry_after(httpx.Response(429, headers={"Retry-After": "12"})), 12
+        )
+
+    def test_date(self):
+        when = datetime.now(timezone.utc) + timedelta(seconds=60)
+        seconds = retry_after(
+            httpx.Response(503, headers={"Retry-After": format_datetime(when)})
+        )
+        self.assertAlmostEqual(seconds, 60, delta=2)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(retry_after(httpx.Response(429)))
+        self.assertIsNone(
+            retry_after(httpx.Response(429, headers={"Retry-After": "soon"}))
+        )
+
+
+class TestRetry(unittest.IsolatedAsyncioTestCase):
+    async def test_retries_transient_errors(self):
+        calls = []
+
+        async def flaky():
+            calls.append(None)
+            if len(calls) < 3:
+                raise httpx.ReadTimeout("mock timeout")
+            return "mock result"
+
+        self.assertEqual(await retry(flaky, NO_WAIT), "mock result")
+        self.assertEqual(len(calls), 3)
+
+    async def test_gives_up(self):
+        async def broken():
+            raise httpx.ConnectError("mock error")
+
+        with self.assertRaises(httpx.ConnectError):
+            await retry(broken, NO_WAIT)
+
+    async def test_does_not_retry_other_errors(self):
+        calls = []
+
+        async def broken():
+            calls.append(None)
+            raise KeyError("mock error")
+
+        with self.assertRaises(KeyError):
+            await retry(broken, NO_WAIT)
+        self.assertEqual(len(calls), 1)
+
+    async def test_retries_only_given_errors(self):
+        calls = []
+
+        async def broken():
+            calls.append(None)
+            raise httpx.ConnectError("mock error")
+
+        with self.assertRaises(httpx.ConnectError):
+            await retry(broken, NO_WAIT, exceptions=(httpx.ReadTimeout,))
+        self.assertEqual(len(calls), 1)
+
+
+class TestRetrier(unittest.IsolatedAsyncioTestCase):
+    async def test_retries_transient_failures(self):
+        handler, requests = sequence_handler(
+            httpx.ConnectError("mock error"),
+            httpx.Response(503),
+            httpx.Response(200, content=b"mock content"),
+        )
+        async with httpx.AsyncClient(
+            transport=Retrier(httpx.MockTransport(handler), NO_WAIT)
+        ) as client:
+            response = await client.get("https://mock.com")
+        self.assertEqual(response.content, b"mock content")
+        self.assertEqual(len(requests), 3)
+
+    async def test_returns_last_failure(self):
+        handler, requests = sequence_handler(*(3 * [httpx.Response(500)]))
+        async with httpx.AsyncClient(
+            transport=Retrier(httpx.MockTransport(handler), NO_WAIT)
+        ) as client:
+            response = await client.get("https://mock.com")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(len(requests), 3)
+
+    async def test_does_not_retry_permanent_failures(self):
+        handler, requests = sequence_handler(httpx.Response(404))
+        async with httpx.AsyncClient(
+            transport=Retrier(httpx.MockTransport(handler), NO_WAIT)
+        ) as client:
+            self.assertEqual((await client.get("https://mock.com")).status_code, 404)
+        self.assertEqual(len(requests), 1)
+
+    async def test_does_not_retry_non_idempotent_requests(self):
+        handler, requests = sequence_handler(httpx.Response(503))
+        async with httpx.AsyncClient(
+            transport=Retrier(httpx.MockTransport(handler), NO_WAIT)
+        ) as client:
+            self.assertEqual((await client.post("https://mock.com")).status_code, 503)
+        self.assertEqual(len(requests), 1)
+
+    async def test_gives_up_when_retry_after_is_too_long(self):
+        handler, requests = sequence_handler(
+            httpx.Response(429, headers={"Retry-After": "3600"})
+        )
+        async with httpx.AsyncClient(
+            transport=Retrier(httpx.MockTransport(handler), NO_WAIT)
+        ) as client:
+            self.assertEqual((await client.get("https://mock.com")).status_code, 429)
+        self.assertEqual(len(requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+
+import httpx
+
+from core.scheduler import Scheduler
+
+
+class ConcurrencyCounter:
+    """Async MockTransport handler that tracks how many requests are in flight"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.hosts_in_flight = dict()
+        self.most_hosts_in_flight = dict()
+
+    async def __call__(self, request):
+        host = request.url.host
+        self.in_flight += 1
+        self.hosts_in_flight[host] = self.hosts_in_flight.get(host, 0) + 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        self.most_hosts_in_flight[host] = max(
+            self.most_hosts_in_flight.get(host, 0), self.hosts_in_flight[host]
+        )
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        self.hosts_in_flight[host] -= 1
+        return httpx.Response(200, content=b"mock content")
+
+
+class TestScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_limits_total_requests(self):
+        counter = ConcurrencyCounter()
+        scheduler = Scheduler(httpx.MockTransport(counter), limit=3, host_limit=10)
+        async with httpx.AsyncClient(transport=scheduler) as client:
+            responses = await asyncio.gather(
+                *(client.get(f"https://host{i}.com") for i in range(10))
+            )
+        self.assertTrue(
+            all(response.content == b"mock content" for response in responses)
+        )
+        self.assertEqual(counter.most_in_flight, 3)
+
+    async def test_limits_requests_per_host(self):
+        counter = ConcurrencyCounter()
+        scheduler = Scheduler(
+            httpx.MockTransport(counter),
+            limit=10,
+            host_limit=2,
+            host_limits={"slow.com": 1},
+        )
+        async with httpx.AsyncClient(transport=scheduler) as client:
+            await asyncio.gather(
+                *(
+                    client.get(f"https://{host}/{i}")
+                    for i in range(5)
+                    for host in ["fast.com", "slow.com"]
+                )
+            )
+        self.assertEqual(counter.most_hosts_in_flight, {"fast.com": 2, "slow.com": 1})
+
+    async def test_streams_hold_their_slot_until_closed(self):
+        scheduler = Scheduler(
+            httpx.MockTransport(lambda request: httpx.Response(200, content=b"mock")),
+            limit=1,
+        )
+        async with httpx.AsyncClient(transport=scheduler) as client:
+            async with client.stream("GET", "https://host.com/1"):
+                waiting = asyncio.create_task(client.get("https://host.com/2"))
+                await asyncio.sleep(0.01)
+                self.assertFalse(waiting.done())
+            self.assertEqual((await waiting).content, b"mock")
+
+    async def test_releases_slot_on_error(self):
+        def handler(request):
+            raise httpx.ConnectError("mock error")
+
+        scheduler = Scheduler(httpx.MockTransport(handler), limit=1)
+        async with httpx.AsyncClient(transport=scheduler) as client:
+            for _ in range(2):
+                with self.assertRaises(httpx.ConnectError):
+                    await asyncio.wait_for(client.get("https://host.com"), 1)
+
+    def test_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            Scheduler(limit=0)
+        with self.assertRaises(ValueError):
+            Scheduler(host_limit=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
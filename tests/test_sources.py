@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from core.sources import (
+    SAVED,
+    Source,
+    check_unique,
+    parse_source,
+    parse_sources,
+    read_sources,
+)
+
+
+class TestSource(unittest.TestCase):
+    def test_key(self):
+        self.assertEqual(Source(SAVED, sortby="top").key, "saved")
+        self.assertEqual(Source("r/pics", sortby="top").key, "r/pics/top")
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Source("pics")
+        with self.assertRaises(ValueError):
+            Source("r/pics", sortby="mock sort")
+        with self.assertRaises(ValueError):
+            Source("r/pics", limit=0)
+
+
+class TestParseSources(unittest.TestCase):
+    def test_options_override_defaults(self):
+        defaults = Source(SAVED, sortby="new", limit=10, karma=5)
+        self.assertEqual(
+            parse_source("R/Pics sortby=top_week karma=100", defaults),
+            Source("r/pics", sortby="top_week", limit=10, karma=100),
+        )
+        self.assertEqual(parse_source("saved", defaults), defaults)
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            parse_source("r/pics limit")
+        with self.assertRaises(ValueError):
+            parse_source("r/pics color=red")
+        with self.assertRaises(ValueError):
+            parse_source("r/pics limit=many")
+
+    def test_skips_blank_lines_and_comments(self):
+        self.assertEqual(
+            parse_sources(["# mock comment", "", "r/pics limit=5", "  saved  "]),
+            [Source("r/pics", limit=5), Source(SAVED)],
+        )
+
+    def test_reports_line_number(self):
+        with self.assertRaisesRegex(ValueError, "Line 2"):
+            parse_sources(["r/pics", "pics"])
+
+    def test_rejects_duplicates(self):
+        with self.assertRaises(ValueError):
+            parse_sources(["r/pics", "r/pics limit=5"])
+        # the same subreddit sorted another way is another listing
+        check_unique([Source("r/pics"), Source("r/pics", sortby="new")])
+
+    def test_read_sources(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sources.txt")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("saved limit=3\nr/aww\n")
+            self.assertEqual(
+                read_sources(path), [Source(SAVED, limit=3), Source("r/aww")]
+            )
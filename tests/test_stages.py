@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from core import SubmissionWrapper
+from core.journal import FINISHED, RESOLVED, SKIPPED, Journal
+from core.sources import Source
+from core.stages import journaled, report, resolve_post, resolved_counts
+from tests import SubmissionMockFactory, SubmissionWrapperFactory
+
+
+def mock_submission(name, score=10):
+    return SubmissionMockFactory(id=name, fullname=f"t3_{name}", score=score)
+
+
+async def mock_resolve(submission, client, dry=True, cache=None, manifest=None):
+    wrapped = SubmissionWrapper(submission, client, dry=dry)
+    wrapped.urls = {"mock url"}
+    return wrapped
+
+
+async def listing(submissions):
+    for submission in submissions:
+        yield submission
+
+
+class TestStages(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = Journal(os.path.join(self.directory.name, "journal.sqlite3"))
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    async def resolve_all(self, submissions, source, resolved):
+        """:return: the names of the submissions that were resolved, in order"""
+        names = []
+        with patch("core.stages.resolve", mock_resolve):
+            async for item in journaled(
+                listing(submissions), self.journal, source, resolved
+            ):
+                result = await resolve_post(
+                    item, "mock client", resolved, None, None, self.journal
+                )
+                if result is not None:
+                    names.append(result[0].id)
+        return names
+
+    async def test_stops_at_limit(self):
+        source = Source("r/pics", limit=3)
+        self.journal.begin(source.key)
+        resolved = resolved_counts(self.journal, [source])
+        names = await self.resolve_all(
+            [mock_submission(str(i)) for i in range(10)], source, resolved
+        )
+        self.assertEqual(names, ["0", "1", "2"])
+        self.assertEqual(resolved[source.key], 3)
+        self.assertEqual(self.journal.count(RESOLVED, source.key), 3)
+
+    async def test_resume_only_takes_the_rest_of_the_limit(self):
+        source = Source("r/pics", limit=4)
+        self.journal.begin(source.key)
+        # the last run finished one post and resolved another before it stopped
+        for name in ["0", "1"]:
+            self.journal.seen(f"t3_{name}", source.key)
+        self.journal.record("t3_0", FINISHED)
+        self.journal.record("t3_1", RESOLVED)
+
+        self.assertTrue(self.journal.begin(source.key, resume=True))
+        resolved = resolved_counts(self.journal, [source], resuming=True)
+        self.assertEqual(resolved[source.key], 2)
+        # the unfinished post comes first, then the listing after the cursor
+        names = await self.resolve_all(
+            [mock_submission(str(i)) for i in [1, *range(2, 10)]], source, resolved
+        )
+        self.assertEqual(names, ["1", "2", "3"])
+        self.assertEqual(resolved[source.key], 4)
+
+    async def test_resume_finishes_resolved_posts_past_a_full_limit(self):
+        source = Source("r/pics", limit=1)
+        self.journal.begin(source.key)
+        self.journal.seen("t3_0", source.key)
+        self.journal.record("t3_0", RESOLVED)
+
+        self.journal.begin(source.key, resume=True)
+        resolved = resolved_counts(self.journal, [source], resuming=True)
+        names = await self.resolve_all(
+            [mock_submission("0"), mock_submission("1")], source, resolved
+        )
+        self.assertEqual(names, ["0"])
+        self.assertEqual(resolved[source.key], 1)
+
+    async def test_takes_each_submission_once(self):
+        source = Source("saved")
+        self.journal.begin(source.key)
+        resolved = resolved_counts(self.journal, [source])
+        names = await self.resolve_all(
+            [mock_submission(name) for name in ["a", "b", "a", "c", "b"]],
+            source,
+            resolved,
+        )
+        self.assertEqual(names, ["a", "b", "c"])
+
+    async def test_skipped_posts_do_not_count_towards_limit(self):
+        source = Source("r/pics", limit=2, karma=5)
+        self.journal.begin(source.key)
+        resolved = resolved_counts(self.journal, [source])
+        names = await self.resolve_all(
+            [
+                mock_submission("low", score=1),
+                mock_submission("a"),
+                mock_submission("b"),
+            ],
+            source,
+            resolved,
+        )
+        self.assertEqual(names, ["a", "b"])
+        self.assertTrue(self.journal.reached("t3_low", SKIPPED))
+        self.assertEqual(
+            resolved_counts(self.journal, [source], resuming=True)[source.key], 2
+        )
+
+    async def test_report_only_finishes_successful_posts(self):
+        self.journal.begin("saved")
+        succeeded = SubmissionWrapperFactory(fullname="t3_succeeded")
+        failed = SubmissionWrapperFactory(fullname="t3_failed")
+        for wrapped in [succeeded, failed]:
+            self.journal.seen(wrapped.fullname)
+            self.journal.record(wrapped.fullname, RESOLVED)
+
+        await report((succeeded, ""), journal=self.journal)
+        summary = await report((failed, "mock exception"), journal=self.journal)
+
+        self.assertIn("mock exception", summary)
+        self.assertTrue(self.journal.reached("t3_succeeded", FINISHED))
+        self.assertFalse(self.journal.reached("t3_failed", FINISHED))
+        self.assertEqual(self.journal.unfinished(), ["t3_failed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
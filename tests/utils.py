@@ -30,7 +30,7 @@ def SubmissionMockFactory(
     submission_mock.unsave = Mock()
 
     for arg, value in kwargs.items():
-        setattr(Mock, arg, value)
+        setattr(submission_mock, arg, value)
 
     return submission_mock
 